@@ -0,0 +1,150 @@
+import bisect
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+from typing import Callable, List, Optional
+
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+EVENT_HEADER = struct.Struct("iIII")
+WATCH_MASK = IN_CREATE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM | IN_DELETE_SELF | IN_MOVE_SELF
+
+try:
+  libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+  libc.inotify_init1.argtypes = [ctypes.c_int]
+  libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+except (OSError, AttributeError):
+  libc = None
+
+
+def inotify_init(path, mask):
+  """Returns a non-blocking inotify fd watching path, None when inotify isn't available"""
+  if libc is None:
+    return None
+
+  fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+  if fd < 0:
+    return None
+  if libc.inotify_add_watch(fd, path.encode(), mask) < 0:
+    os.close(fd)
+    return None
+  return fd
+
+
+class DirectoryWatcher:
+  """
+  Sorted names of the files in a directory, kept up to date from inotify events.
+  The directory is listed again every reconcile_interval seconds, when the event
+  queue overflowed, and on every update while it can't be watched, for example
+  before it's created.
+  """
+  def __init__(self, path: str, name_filter: Optional[Callable[[str], bool]] = None, reconcile_interval: float = 60.):
+    self.path = path
+    self.name_filter = name_filter
+    self.reconcile_interval = reconcile_interval
+    self.fd = inotify_init(path, WATCH_MASK)
+
+    self.names: List[str] = []
+    # changes since the last call to pop_added/pop_removed
+    self.added: List[str] = []
+    self.removed: List[str] = []
+    self.last_reconcile = 0.
+    self.reconcile()
+
+  def close(self):
+    if self.fd is not None:
+      os.close(self.fd)
+      self.fd = None
+
+  def _keep(self, name):
+    return self.name_filter is None or self.name_filter(name)
+
+  def _add(self, name):
+    i = bisect.bisect_left(self.names, name)
+    if i == len(self.names) or self.names[i] != name:
+      self.names.insert(i, name)
+      self.added.append(name)
+
+  def _remove(self, name):
+    i = bisect.bisect_left(self.names, name)
+    if i < len(self.names) and self.names[i] == name:
+      del self.names[i]
+      self.removed.append(name)
+
+  def reconcile(self):
+    try:
+      names = {name for name in os.listdir(self.path) if self._keep(name)}
+    except OSError:
+      names = set()
+
+    for name in set(self.names) - names:
+      self._remove(name)
+    for name in sorted(names - set(self.names)):
+      self._add(name)
+    self.last_reconcile = time.monotonic()
+
+  def update(self, timeout: float = 0.) -> bool:
+    """Apply pending changes, waiting up to timeout seconds for one. Returns whether anything changed."""
+    n_changes = len(self.added) + len(self.removed)
+    if self.fd is None:
+      self.fd = inotify_init(self.path, WATCH_MASK)
+      if self.fd is None:
+        if timeout > 0:
+          time.sleep(timeout)
+        self.reconcile()
+        return len(self.added) + len(self.removed) != n_changes
+      self.reconcile()
+
+    if timeout > 0:
+      select.select([self.fd], [], [], timeout)
+    self._read_events()
+    if self.fd is not None and time.monotonic() - self.last_reconcile > self.reconcile_interval:
+      self.reconcile()
+    return len(self.added) + len(self.removed) != n_changes
+
+  def _read_events(self):
+    while True:
+      try:
+        buf = os.read(self.fd, 64 * 1024)
+      except BlockingIOError:
+        return
+
+      offset = 0
+      while offset < len(buf):
+        _, mask, _, name_len = EVENT_HEADER.unpack_from(buf, offset)
+        name = buf[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + name_len].rstrip(b"\0").decode()
+        offset += EVENT_HEADER.size + name_len
+
+        if mask & (IN_Q_OVERFLOW | IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+          # missed events, or the directory itself went away
+          self.reconcile()
+          if mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+            self.close()
+            return
+        elif mask & IN_ISDIR or not self._keep(name):
+          continue
+        elif mask & (IN_CREATE | IN_MOVED_TO):
+          self._add(name)
+        elif mask & (IN_DELETE | IN_MOVED_FROM):
+          self._remove(name)
+
+  def pop_added(self) -> List[str]:
+    added, self.added = self.added, []
+    return added
+
+  def pop_removed(self) -> List[str]:
+    removed, self.removed = self.removed, []
+    return removed
@@ -1,7 +1,10 @@
+from bisect import bisect_left
+
+
 def clip(x, lo, hi):
   return max(lo, min(hi, x))
 
-def interp(x, xp, fp):
+def _interp(x, xp, fp):
   N = len(xp)
 
   def get_interp(xv):
@@ -15,5 +18,36 @@ def interp(x, xp, fp):
 
   return [get_interp(v) for v in x] if hasattr(x, '__iter__') else get_interp(x)
 
+class _Interpolator:
+  """Interpolator over fixed breakpoints, searched with bisection.
+  Calling it is equivalent to interp(x, xp, fp), breakpoints must be non-decreasing.
+  Values between the end points are returned as python floats, also for numpy fp."""
+  def __init__(self, xp, fp):
+    self.xp = [float(v) for v in xp]
+    self.fp = [float(v) for v in fp]
+    if not len(self.xp) or len(self.xp) != len(self.fp):
+      raise ValueError("breakpoints and values must be non-empty and have the same length")
+    if any(b < a for a, b in zip(self.xp, self.xp[1:])):
+      raise ValueError("breakpoints must be non-decreasing")
+    self.fp_first, self.fp_last = fp[0], fp[len(fp) - 1]
+
+  def _eval(self, xv):
+    xp, fp = self.xp, self.fp
+    hi = bisect_left(xp, xv) if xv == xv else 0
+    if hi == len(xp):
+      return self.fp_last
+    elif hi == 0:
+      return self.fp_first
+    return (xv - xp[hi - 1]) * (fp[hi] - fp[hi - 1]) / (xp[hi] - xp[hi - 1]) + fp[hi - 1]
+
+  def __call__(self, x):
+    return [self._eval(v) for v in x] if hasattr(x, '__iter__') else self._eval(x)
+
 def mean(x):
   return sum(x) / len(x)
+
+# use the compiled versions when built
+try:
+  from common.numpy_fast_pyx import interp, Interpolator  # type: ignore # pylint: disable=no-name-in-module, import-error
+except ImportError:
+  interp, Interpolator = _interp, _Interpolator
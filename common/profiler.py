@@ -1,4 +1,6 @@
+import math
 import time
+from bisect import bisect_left
 
 class Profiler():
   def __init__(self, enabled=False):
@@ -43,3 +45,85 @@ class Profiler():
       else:
         print("%30s: %9.2f  avg: %7.2f  percent: %3.0f" % (n, ms*1000.0, ms*1000.0/self.iter, ms/self.tot*100))
     print(f"Iter clock: {self.tot / self.iter:2.6f}   TOTAL: {self.tot:2.2f}")
+
+
+class StageTimer():
+  """Low overhead per-stage latency histograms for realtime loops.
+
+  Stage durations are measured with the monotonic clock between lap() calls and
+  counted into fixed, logarithmically spaced buckets kept in preallocated lists.
+  export() periodically reports p50/p99/max per stage and resets the histograms.
+  """
+  def __init__(self, stages, min_ms=0.01, max_ms=100., buckets_per_octave=4):
+    self.stages = list(stages)
+    self.stage_idx = {name: i for i, name in enumerate(self.stages)}
+
+    # upper bucket edges in ns, the last bucket counts everything above max_ms
+    n_buckets = int(math.ceil(math.log2(max_ms / min_ms) * buckets_per_octave)) + 1
+    self.edges = [int(min_ms * 1e6 * 2 ** (i / buckets_per_octave)) for i in range(n_buckets)]
+    self.counts = [[0] * (n_buckets + 1) for _ in self.stages]
+    self.max_ns = [0] * len(self.stages)
+    self.last_ns = time.monotonic_ns()
+    self.lap_overhead_ns = self.calibrate()
+
+  def start(self):
+    self.last_ns = time.monotonic_ns()
+
+  def lap(self, name):
+    t = time.monotonic_ns()
+    dt = t - self.last_ns
+    self.last_ns = t
+
+    i = self.stage_idx[name]
+    self.counts[i][bisect_left(self.edges, dt)] += 1
+    if dt > self.max_ns[i]:
+      self.max_ns[i] = dt
+
+  def calibrate(self, n=1000):
+    """Returns the cost of a lap() call in ns, measured on a scratch copy of the histograms"""
+    counts, max_ns = self.counts, self.max_ns
+    self.counts, self.max_ns = [[0] * len(counts[0]) for _ in counts], [0] * len(max_ns)
+    name = self.stages[0]
+    t = time.monotonic_ns()
+    for _ in range(n):
+      self.lap(name)
+    overhead = (time.monotonic_ns() - t) / n
+    self.counts, self.max_ns = counts, max_ns
+    return overhead
+
+  def percentile(self, name, q):
+    """Returns the upper edge in ms of the bucket containing the q-th percentile"""
+    i = self.stage_idx[name]
+    counts = self.counts[i]
+    target = q / 100. * sum(counts)
+    if target == 0:
+      return 0.
+
+    cum = 0
+    for b, c in enumerate(counts):
+      cum += c
+      if cum >= target:
+        # the overflow bucket has no upper edge, fall back to the max
+        return (self.edges[b] if b < len(self.edges) else self.max_ns[i]) / 1e6
+    return self.max_ns[i] / 1e6
+
+  def stats(self):
+    return {name: {'p50': self.percentile(name, 50), 'p99': self.percentile(name, 99), 'max': self.max_ns[i] / 1e6,
+                   'count': sum(self.counts[i])}
+            for i, name in enumerate(self.stages)}
+
+  def reset(self):
+    for counts in self.counts:
+      counts[:] = [0] * len(counts)
+    self.max_ns[:] = [0] * len(self.max_ns)
+
+  def export(self, statlog, prefix):
+    """Sends p50/p99/max in ms per stage as gauges and resets the histograms"""
+    for name, s in self.stats().items():
+      if s['count'] == 0:
+        continue
+      statlog.gauge(f"{prefix}_{name}_p50_ms", s['p50'])
+      statlog.gauge(f"{prefix}_{name}_p99_ms", s['p99'])
+      statlog.gauge(f"{prefix}_{name}_max_ms", s['max'])
+    statlog.gauge(f"{prefix}_stage_timer_overhead_us", self.lap_overhead_ns * len(self.stages) / 1e3)
+    self.reset()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from common.dir_watcher import DirectoryWatcher
+
+N_FILES = 2000
+
+
+def write_files(path, n, period, created):
+  # like statsd, write to a temporary name and move it into place
+  for i in range(n):
+    tmp_path = os.path.join(path, f"{tempfile.gettempprefix()}{i}")
+    with open(tmp_path, "w") as f:
+      f.write("x")
+    created[f"{i:06}"] = time.monotonic()
+    os.rename(tmp_path, os.path.join(path, f"{i:06}"))
+    time.sleep(period)
+
+
+def name_filter(name):
+  return not name.startswith(tempfile.gettempprefix())
+
+
+class TestDirectoryWatcher(unittest.TestCase):
+
+  def setUp(self):
+    self.path = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.path, ignore_errors=True)
+
+  def touch(self, name):
+    open(os.path.join(self.path, name), "w").close()
+
+  def test_changes(self):
+    self.touch("b")
+    watcher = DirectoryWatcher(self.path, name_filter=name_filter)
+    self.assertIsNotNone(watcher.fd)
+    self.assertEqual(watcher.names, ["b"])
+
+    self.touch("c")
+    self.touch("a")
+    self.touch(f"{tempfile.gettempprefix()}x")
+    os.mkdir(os.path.join(self.path, "d"))
+    os.remove(os.path.join(self.path, "b"))
+    self.assertTrue(watcher.update())
+    self.assertEqual(watcher.names, ["a", "c"])
+    self.assertEqual(watcher.pop_added(), ["b", "c", "a"])
+    self.assertEqual(watcher.pop_removed(), ["b"])
+    self.assertFalse(watcher.update())
+
+    os.rename(os.path.join(self.path, "a"), os.path.join(self.path, "e"))
+    watcher.update(timeout=1)
+    self.assertEqual(watcher.names, ["c", "e"])
+    watcher.close()
+
+  def test_fallback(self):
+    path = os.path.join(self.path, "later")
+    watcher = DirectoryWatcher(path)
+    self.assertIsNone(watcher.fd)
+    self.assertFalse(watcher.update())
+
+    # watched once it exists
+    os.mkdir(path)
+    open(os.path.join(path, "a"), "w").close()
+    self.assertTrue(watcher.update())
+    self.assertIsNotNone(watcher.fd)
+    self.assertEqual(watcher.names, ["a"])
+
+    # directory going away ends the watch, but names stay right
+    shutil.rmtree(path)
+    watcher.update()
+    self.assertIsNone(watcher.fd)
+    self.assertEqual(watcher.names, [])
+
+  def dispatch(self, wait_for_files):
+    """Sends and removes files as they show up, like athenad's stat_handler"""
+    created, latencies = {}, []
+    writer = threading.Thread(target=write_files, args=(self.path, N_FILES, 0.001, created))
+
+    listdir = os.listdir
+    n_listdir = 0
+    def counting_listdir(path):
+      nonlocal n_listdir
+      n_listdir += 1
+      return listdir(path)
+
+    with mock.patch("os.listdir", counting_listdir):
+      start = time.monotonic()
+      writer.start()
+      while len(latencies) < N_FILES and time.monotonic() - start < 60:
+        for name in wait_for_files():
+          latencies.append(time.monotonic() - created[name])
+          os.remove(os.path.join(self.path, name))
+      duration = time.monotonic() - start
+      writer.join()
+
+    latencies.sort()
+    self.assertEqual(len(latencies), N_FILES)
+    return n_listdir / duration * 60, latencies[len(latencies) // 2], latencies[-1]
+
+  def test_dispatch_latency(self):
+    watcher = DirectoryWatcher(self.path, name_filter=name_filter)
+    def watched():
+      watcher.update(timeout=1.)
+      return list(watcher.names)
+
+    def polled():
+      time.sleep(0.1)
+      return sorted(filter(name_filter, os.listdir(self.path)))
+
+    for name, wait_for_files in (("polling", polled), ("inotify", watched)):
+      listdir_per_min, median, worst = self.dispatch(wait_for_files)
+      print(f"{name}: {listdir_per_min:.0f} directory listings per minute, "
+            f"creation to dispatch {median * 1000:.2f} ms median, {worst * 1000:.2f} ms max")
+    watcher.close()
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+import math
+import random
+import timeit
+import unittest
+
+import numpy as np
+
+from common import numpy_fast
+from common.numpy_fast import _interp, _Interpolator
+
+try:
+  from common import numpy_fast_pyx  # type: ignore # pylint: disable=no-name-in-module
+except ImportError:
+  numpy_fast_pyx = None
+
+# breakpoint tables shaped like the ones used across controls
+T_IDXS = [10.0 * (i / 32)**2 for i in range(33)]
+TABLES = [
+  ([0., 10.], [0.3, 1.]),
+  ([0., 5., 35.], [3.6, 2.4, 1.5]),
+  ([0., 10., 20., 30., 40.], [1, 2, 3, 4, 5]),
+  (T_IDXS[:17], [math.sin(t) for t in T_IDXS[:17]]),
+  (T_IDXS, [t**0.5 for t in T_IDXS]),
+  ([0., 1., 1., 2.], [0., 1., 2., 3.]),
+]
+
+
+class TestInterp(unittest.TestCase):
+  def setUp(self):
+    rng = random.Random(0)
+    self.xs = [rng.uniform(-5., 45.) for _ in range(200)] + [0., 1., 2., 5., 10., 40., -1e9, 1e9, float('nan')]
+
+  def assertSameResult(self, a, b):
+    if isinstance(b, float) and math.isnan(b):
+      self.assertTrue(math.isnan(a))
+    else:
+      self.assertEqual(a, b)
+      self.assertEqual(type(a), type(b))
+
+  @unittest.skipIf(numpy_fast_pyx is None, "numpy_fast_pyx isn't built")
+  def test_interp_parity(self):
+    self.assertIs(numpy_fast.interp, numpy_fast_pyx.interp)
+    for xp, fp in TABLES:
+      for x in self.xs + [int(x) for x in self.xs[:-1]]:
+        self.assertSameResult(numpy_fast.interp(x, xp, fp), _interp(x, xp, fp))
+      self.assertEqual(numpy_fast.interp(self.xs[:-1], xp, fp), _interp(self.xs[:-1], xp, fp))
+
+      # numpy inputs keep numpy scalar results
+      xs_np, xp_np, fp_np = np.array(self.xs), np.array(xp), np.array(fp)
+      for x in xs_np:
+        self.assertSameResult(numpy_fast.interp(x, xp_np, fp_np), _interp(x, xp_np, fp_np))
+      for a, b in zip(numpy_fast.interp(xs_np[:-1], xp_np, fp_np), _interp(xs_np[:-1], xp_np, fp_np)):
+        self.assertSameResult(a, b)
+
+  @unittest.skipIf(numpy_fast_pyx is None, "numpy_fast_pyx isn't built")
+  def test_interp_short_fp(self):
+    xp, fp = [0., 1., 2.], [0., 1.]
+    for x in (-1., 0.5, 3.):
+      self.assertSameResult(numpy_fast.interp(x, xp, fp), _interp(x, xp, fp))
+    with self.assertRaises(IndexError):
+      _interp(1.5, xp, fp)
+    with self.assertRaises(IndexError):
+      numpy_fast.interp(1.5, xp, fp)
+    with self.assertRaises(IndexError):
+      numpy_fast.interp(0., [], [])
+
+  def test_interpolator_parity(self):
+    for cls in (numpy_fast.Interpolator, _Interpolator):
+      for xp, fp in TABLES:
+        f = cls(xp, fp)
+        for x in self.xs:
+          self.assertSameResult(f(x), _interp(x, xp, fp))
+        self.assertEqual(f(self.xs[:-1]), _interp(self.xs[:-1], xp, fp))
+
+  def test_interpolator_numpy_values(self):
+    for cls in (numpy_fast.Interpolator, _Interpolator):
+      f = cls(np.array([0., 10.]), np.array([0.3, 1.]))
+      self.assertIs(type(f(5.)), float)
+      self.assertIs(type(f(20.)), np.float64)
+
+  def test_interpolator_matches_numpy(self):
+    for xp, fp in TABLES[:-1]:
+      f = numpy_fast.Interpolator(xp, fp)
+      np.testing.assert_allclose(f(self.xs[:-1]), np.interp(self.xs[:-1], xp, fp))
+
+  def test_interpolator_invalid(self):
+    for cls in (numpy_fast.Interpolator, _Interpolator):
+      with self.assertRaises(ValueError):
+        cls([], [])
+      with self.assertRaises(ValueError):
+        cls([0., 1.], [0.])
+      with self.assertRaises(ValueError):
+        cls([1., 0.], [0., 1.])
+
+  def test_benchmark(self):
+    n = 20000
+    for xp, fp in TABLES:
+      f = numpy_fast.Interpolator(xp, fp)
+      x = (xp[0] + xp[-1]) * 0.6
+      ref = timeit.timeit(lambda: _interp(x, xp, fp), number=n) / n
+      new = timeit.timeit(lambda: numpy_fast.interp(x, xp, fp), number=n) / n
+      cached = timeit.timeit(lambda: f(x), number=n) / n
+      print(f"{len(xp):2d} breakpoints: python {ref * 1e6:.2f} us, interp {new * 1e6:.2f} us, Interpolator {cached * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+  unittest.main()
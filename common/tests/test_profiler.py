@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+import time
+import unittest
+
+from common.profiler import StageTimer
+
+STAGES = ["data_sample", "update_events", "state_transition", "state_control", "publish_logs"]
+
+
+class FakeStatLog:
+  def __init__(self):
+    self.gauges = {}
+
+  def gauge(self, name, value):
+    self.gauges[name] = value
+
+
+def busy_wait(ms):
+  end = time.monotonic() + ms / 1e3
+  while time.monotonic() < end:
+    pass
+
+
+class TestStageTimer(unittest.TestCase):
+  def test_percentiles(self):
+    timer = StageTimer(["fast", "slow"])
+    for i in range(200):
+      timer.start()
+      busy_wait(0.05)
+      timer.lap("fast")
+      busy_wait(5 if i == 0 else 1)
+      timer.lap("slow")
+
+    stats = timer.stats()
+    self.assertEqual(stats["fast"]["count"], 200)
+    self.assertLess(stats["fast"]["p50"], stats["slow"]["p50"])
+    self.assertGreaterEqual(stats["slow"]["p50"], 1.)
+    self.assertLess(stats["slow"]["p50"], 1.5)
+    self.assertGreaterEqual(stats["slow"]["max"], 5.)
+    self.assertLessEqual(stats["slow"]["p99"], stats["slow"]["max"] * 1.2)
+
+  def test_overflow_bucket(self):
+    timer = StageTimer(["stage"], max_ms=1.)
+    timer.start()
+    busy_wait(3)
+    timer.lap("stage")
+    self.assertEqual(timer.percentile("stage", 50), timer.stats()["stage"]["max"])
+
+  def test_export_resets(self):
+    timer = StageTimer(STAGES)
+    timer.start()
+    for name in STAGES:
+      timer.lap(name)
+
+    statlog = FakeStatLog()
+    timer.export(statlog, "controlsd")
+    for name in STAGES:
+      for stat in ("p50", "p99", "max"):
+        self.assertIn(f"controlsd_{name}_{stat}_ms", statlog.gauges)
+    self.assertIn("controlsd_stage_timer_overhead_us", statlog.gauges)
+    self.assertTrue(all(s["count"] == 0 for s in timer.stats().values()))
+
+  def test_overhead(self):
+    # instrumentation cost of one 100Hz step, compared to its 10ms budget
+    timer = StageTimer(STAGES)
+    n = 10000
+    t = time.monotonic()
+    for _ in range(n):
+      timer.start()
+      for name in STAGES:
+        timer.lap(name)
+    per_step_us = (time.monotonic() - t) / n * 1e6
+    print(f"stage timer overhead: {per_step_us:.2f} us per step ({per_step_us / 100:.3f}% of 10ms), "
+          f"calibrated lap {timer.lap_overhead_ns:.0f} ns")
+    self.assertLess(per_step_us, 100.)
+
+
+if __name__ == "__main__":
+  unittest.main()
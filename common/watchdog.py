@@ -0,0 +1,64 @@
+import mmap
+import os
+import struct
+import time
+from typing import Optional
+
+# keep in sync with selfdrive/common/watchdog.cc
+WATCHDOG_FN = "/dev/shm/wd_"  # + <pid>
+WATCHDOG_TABLE_FN = "/dev/shm/wd_table"
+WATCHDOG_SLOTS = 64
+SLOT = struct.Struct("QQ")  # pid, nanos since boot of the last kick
+
+
+class WatchdogTable:
+  """
+  Heartbeats of the processes manager watches, one slot each, in shared memory.
+  A process writes its kick time and then its pid, so a slot with the
+  expected pid holds a kick from that process.
+  """
+  def __init__(self, path: str = WATCHDOG_TABLE_FN):
+    self.path = path
+    self.mem: Optional[mmap.mmap] = None
+
+  def open(self) -> mmap.mmap:
+    if self.mem is None:
+      fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o664)
+      try:
+        if os.fstat(fd).st_size < WATCHDOG_SLOTS * SLOT.size:
+          os.ftruncate(fd, WATCHDOG_SLOTS * SLOT.size)
+        self.mem = mmap.mmap(fd, WATCHDOG_SLOTS * SLOT.size)
+      finally:
+        os.close(fd)
+    return self.mem
+
+  def clear(self, slot: int) -> None:
+    SLOT.pack_into(self.open(), slot * SLOT.size, 0, 0)
+
+  def get(self, slot: int, pid: int) -> Optional[int]:
+    """Last kick of pid in nanoseconds since boot, None before its first kick"""
+    kick_pid, ts = SLOT.unpack_from(self.open(), slot * SLOT.size)
+    return ts if kick_pid == pid else None
+
+  def kick(self, slot: int, pid: int) -> None:
+    mem = self.open()
+    struct.pack_into("Q", mem, slot * SLOT.size + 8, time.clock_gettime_ns(time.CLOCK_BOOTTIME))
+    struct.pack_into("Q", mem, slot * SLOT.size, pid)
+
+
+_table = WatchdogTable()
+
+
+def kick() -> bool:
+  """Like watchdog_kick() in selfdrive/common/watchdog.h, for python processes"""
+  slot = os.getenv("WATCHDOG_SLOT")
+  try:
+    if slot is not None:
+      _table.kick(int(slot), os.getpid())
+    else:
+      # not started by manager with a slot
+      with open(WATCHDOG_FN + str(os.getpid()), "wb") as f:
+        f.write(struct.pack("Q", time.clock_gettime_ns(time.CLOCK_BOOTTIME)))
+  except (OSError, ValueError):
+    return False
+  return True
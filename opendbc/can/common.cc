@@ -66,6 +66,8 @@ unsigned int chrysler_checksum(uint32_t address, const std::vector<uint8_t> &d)
 
 // Static lookup table for fast computation of CRC8 poly 0x2F, aka 8H2F/AUTOSAR
 uint8_t crc8_lut_8h2f[256];
+// CRC8 poly 0x1D, used by Hyundai LKAS11
+uint8_t crc8_lut_1d[256];
 
 void gen_crc_lookup_table(uint8_t poly, uint8_t crc_lut[]) {
   uint8_t crc;
@@ -87,6 +89,7 @@ void init_crc_lookup_tables() {
   // At init time, set up static lookup tables for fast CRC computation.
 
   gen_crc_lookup_table(0x2F, crc8_lut_8h2f);    // CRC-8 8H2F/AUTOSAR for Volkswagen
+  gen_crc_lookup_table(0x1D, crc8_lut_1d);      // CRC-8 poly 0x1D for Hyundai
 }
 
 unsigned int volkswagen_crc(uint32_t address, const std::vector<uint8_t> &d) {
@@ -187,3 +190,32 @@ unsigned int pedal_checksum(const std::vector<uint8_t> &d) {
   }
   return crc;
 }
+
+unsigned int hyundai_checksum(SignalType type, const std::vector<uint8_t> &d) {
+  unsigned int s = 0;
+  switch (type) {
+    case SignalType::HYUNDAI_CRC8_CHECKSUM: {
+      // over bytes 0-5 and 7, init 0xFD and final XOR 0xDF (crcmod pre-XORs the init value)
+      uint8_t crc = 0xFD ^ 0xDF;
+      for (int i = 0; i < 6; i++) {
+        crc = crc8_lut_1d[crc ^ d[i]];
+      }
+      crc = crc8_lut_1d[crc ^ d[7]];
+      return crc ^ 0xDF;
+    }
+    case SignalType::HYUNDAI_6B_CHECKSUM:
+      for (int i = 0; i < 6; i++) s += d[i];
+      return s & 0xFF;
+    case SignalType::HYUNDAI_7B_CHECKSUM:
+      for (int i = 0; i < 6; i++) s += d[i];
+      return (s + d[7]) & 0xFF;
+    case SignalType::HYUNDAI_SUM_CHECKSUM:
+      for (auto b : d) s += b;
+      return s & 0xFF;
+    case SignalType::HYUNDAI_NIBBLE_CHECKSUM:
+      for (auto b : d) s += (b >> 4) + (b & 0xF);
+      return (16 - (s % 16)) & 0xF;
+    default:
+      return 0;
+  }
+}
@@ -27,6 +27,7 @@ unsigned int chrysler_checksum(uint32_t address, const std::vector<uint8_t> &d);
 void init_crc_lookup_tables();
 unsigned int volkswagen_crc(uint32_t address, const std::vector<uint8_t> &d);
 unsigned int pedal_checksum(const std::vector<uint8_t> &d);
+unsigned int hyundai_checksum(SignalType type, const std::vector<uint8_t> &d);
 
 class MessageState {
 public:
@@ -83,9 +84,16 @@ private:
   const DBC *dbc = NULL;
   std::map<std::pair<uint32_t, std::string>, Signal> signal_lookup;
   std::map<uint32_t, Msg> message_lookup;
+  // checksum signals that are not named CHECKSUM in the DBC, keyed by address
+  std::map<uint32_t, Signal> checksum_lookup;
+
+  void set_counter_and_checksum(uint32_t address, std::vector<uint8_t> &ret, int counter);
 
 public:
   CANPacker(const std::string& dbc_name);
   std::vector<uint8_t> pack(uint32_t address, const std::vector<SignalPackValue> &values, int counter);
+  std::vector<uint8_t> pack(uint32_t address, const std::vector<Signal> &sigs, const std::vector<double> &values, int counter);
+  const Signal *lookup_signal(uint32_t address, const std::string &name);
+  bool set_checksum(uint32_t address, const std::string &sig_name, SignalType type);
   Msg* lookup_message(uint32_t address);
 };
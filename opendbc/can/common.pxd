@@ -20,7 +20,12 @@ cdef extern from "common_dbc.h":
     VOLKSWAGEN_CHECKSUM,
     VOLKSWAGEN_COUNTER,
     SUBARU_CHECKSUM,
-    CHRYSLER_CHECKSUM
+    CHRYSLER_CHECKSUM,
+    HYUNDAI_CRC8_CHECKSUM,
+    HYUNDAI_6B_CHECKSUM,
+    HYUNDAI_7B_CHECKSUM,
+    HYUNDAI_SUM_CHECKSUM,
+    HYUNDAI_NIBBLE_CHECKSUM
 
   cdef struct Signal:
     const char* name
@@ -82,3 +87,6 @@ cdef extern from "common.h":
   cdef cppclass CANPacker:
    CANPacker(string)
    vector[uint8_t] pack(uint32_t, vector[SignalPackValue], int counter)
+   vector[uint8_t] pack(uint32_t, vector[Signal], vector[double], int counter)
+   const Signal *lookup_signal(uint32_t, string)
+   bool set_checksum(uint32_t, string, SignalType)
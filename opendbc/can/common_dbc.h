@@ -40,6 +40,11 @@ enum SignalType {
   VOLKSWAGEN_COUNTER,
   SUBARU_CHECKSUM,
   CHRYSLER_CHECKSUM,
+  HYUNDAI_CRC8_CHECKSUM,
+  HYUNDAI_6B_CHECKSUM,
+  HYUNDAI_7B_CHECKSUM,
+  HYUNDAI_SUM_CHECKSUM,
+  HYUNDAI_NIBBLE_CHECKSUM,
 };
 
 struct Signal {
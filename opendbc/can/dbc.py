@@ -2,9 +2,17 @@
 import re
 import os
 import sys
+import pickle
+import hashlib
 import numbers
+import tempfile
 from collections import namedtuple, defaultdict
 
+# parsed DBCs are cached by content hash, bump the version when the parsed structures change
+DBC_CACHE_VERSION = 1
+# the cache is pickled, so it's only read from a directory nobody else can write to
+DBC_CACHE_DIR = os.environ.get("DBC_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "opendbc"))
+
 def int_or_float(s):
   # return number, trying to maintain int format
   if s.isdigit():
@@ -17,13 +25,62 @@ DBCSignal = namedtuple("DBCSignal", ["name", "start_bit", "msb", "lsb", "size",
                                      "factor", "offset", "tmin", "tmax", "units"])
 
 
+def cache_dir_is_private():
+  try:
+    st = os.stat(DBC_CACHE_DIR)
+  except OSError:
+    return False
+  return st.st_uid == os.getuid() and not (st.st_mode & 0o022)
+
+
+def cache_path(dat):
+  h = hashlib.sha256(dat)
+  h.update(str(DBC_CACHE_VERSION).encode())
+  return os.path.join(DBC_CACHE_DIR, h.hexdigest() + ".pkl")
+
+
 class dbc():
-  def __init__(self, fn):
+  def __init__(self, fn, use_cache=True):
     self.name, _ = os.path.splitext(os.path.basename(fn))
-    with open(fn, encoding="utf-8") as f:
-      self.txt = f.readlines()
+    with open(fn, "rb") as f:
+      dat = f.read()
+    self.txt = dat.decode("utf-8").splitlines(keepends=True)
     self._warned_addresses = set()
 
+    if use_cache and self._load_cache(cache_path(dat)):
+      return
+
+    self._parse()
+    if use_cache:
+      self._write_cache(cache_path(dat))
+
+  def _load_cache(self, path):
+    if not cache_dir_is_private():
+      return False
+
+    try:
+      with open(path, "rb") as f:
+        self.msgs, def_vals, self.dv = pickle.load(f)
+    except Exception:
+      # missing, corrupt or from an incompatible version, reparsing rewrites it
+      return False
+
+    self.def_vals = defaultdict(list, def_vals)
+    self._build_name_lookup()
+    return True
+
+  def _write_cache(self, path):
+    try:
+      os.makedirs(DBC_CACHE_DIR, mode=0o700, exist_ok=True)
+      if not cache_dir_is_private():
+        return
+      with tempfile.NamedTemporaryFile(dir=DBC_CACHE_DIR, delete=False) as f:
+        pickle.dump((self.msgs, dict(self.def_vals), self.dv), f, protocol=pickle.HIGHEST_PROTOCOL)
+      os.replace(f.name, path)
+    except OSError:
+      pass
+
+  def _parse(self):
     # regexps from https://github.com/ebroecker/canmatrix/blob/master/canmatrix/importdbc.py
     bo_regexp = re.compile(r"^BO\_ (\w+) (\w+) *: (\w+) (\w+)")
     sg_regexp = re.compile(r"^SG\_ (\w+) : (\d+)\|(\d+)@(\d+)([\+|\-]) \(([0-9.+\-eE]+),([0-9.+\-eE]+)\) \[([0-9.+\-eE]+)\|([0-9.+\-eE]+)\] \"(.*)\" (.*)")
@@ -119,6 +176,20 @@ class dbc():
     for msg in self.msgs.values():
       msg[1].sort(key=lambda x: x.start_bit)
 
+    # value tables in the form CANDefine exposes them, looked up by address or msg name
+    self.dv = defaultdict(dict)
+    for address, vals in self.def_vals.items():
+      for sgname, def_val in vals:
+        def_val = def_val[1:-1].replace(r"\?", "?").split()
+        values = [int(v) for v in def_val[::2]]
+        self.dv[address][sgname] = dict(zip(values, def_val[1::2]))
+        if address in self.msgs:
+          self.dv[self.msgs[address][0][0]][sgname] = self.dv[address][sgname]
+    self.dv = dict(self.dv)
+
+    self._build_name_lookup()
+
+  def _build_name_lookup(self):
     self.msg_name_to_address = {}
     for address, m in self.msgs.items():
       name = m[0][0]
@@ -42,6 +42,15 @@ CANPacker::CANPacker(const std::string& dbc_name) {
   init_crc_lookup_tables();
 }
 
+void set_signal_value(std::vector<uint8_t> &msg, const Signal &sig, double value) {
+  int64_t ival = (int64_t)(round((value - sig.offset) / sig.factor));
+  if (ival < 0) {
+    ival = (1ULL << sig.size) + ival;
+  }
+
+  set_value(msg, sig, ival);
+}
+
 std::vector<uint8_t> CANPacker::pack(uint32_t address, const std::vector<SignalPackValue> &signals, int counter) {
   std::vector<uint8_t> ret(message_lookup[address].size, 0);
 
@@ -53,22 +62,33 @@ std::vector<uint8_t> CANPacker::pack(uint32_t address, const std::vector<SignalP
       WARN("undefined signal %s - %d\n", sigval.name.c_str(), address);
       continue;
     }
-    const auto &sig = sig_it->second;
+    set_signal_value(ret, sig_it->second, sigval.value);
+  }
 
-    int64_t ival = (int64_t)(round((sigval.value - sig.offset) / sig.factor));
-    if (ival < 0) {
-      ival = (1ULL << sig.size) + ival;
-    }
+  set_counter_and_checksum(address, ret, counter);
+  return ret;
+}
 
-    set_value(ret, sig, ival);
+std::vector<uint8_t> CANPacker::pack(uint32_t address, const std::vector<Signal> &sigs, const std::vector<double> &values, int counter) {
+  std::vector<uint8_t> ret(message_lookup[address].size, 0);
+
+  // signals were resolved by the caller with lookup_signal, values are in the same order
+  size_t n = std::min(sigs.size(), values.size());
+  for (size_t i = 0; i < n; i++) {
+    set_signal_value(ret, sigs[i], values[i]);
   }
 
+  set_counter_and_checksum(address, ret, counter);
+  return ret;
+}
+
+void CANPacker::set_counter_and_checksum(uint32_t address, std::vector<uint8_t> &ret, int counter) {
   // set message counter
   if (counter >= 0){
     auto sig_it = signal_lookup.find(std::make_pair(address, "COUNTER"));
     if (sig_it == signal_lookup.end()) {
       WARN("COUNTER not defined\n");
-      return ret;
+      return;
     }
     const auto& sig = sig_it->second;
 
@@ -106,7 +126,34 @@ std::vector<uint8_t> CANPacker::pack(uint32_t address, const std::vector<SignalP
     }
   }
 
-  return ret;
+  // set checksum registered with set_checksum, computed over the message with the field cleared
+  auto chk_it = checksum_lookup.find(address);
+  if (chk_it != checksum_lookup.end()) {
+    const auto &sig = chk_it->second;
+    set_value(ret, sig, 0);
+    set_value(ret, sig, hyundai_checksum(sig.type, ret));
+  }
+}
+
+bool CANPacker::set_checksum(uint32_t address, const std::string &sig_name, SignalType type) {
+  auto sig_it = signal_lookup.find(std::make_pair(address, sig_name));
+  auto msg_it = message_lookup.find(address);
+  if (sig_it == signal_lookup.end() || msg_it == message_lookup.end()) {
+    return false;
+  }
+  if ((type == SignalType::HYUNDAI_CRC8_CHECKSUM || type == SignalType::HYUNDAI_7B_CHECKSUM) && msg_it->second.size < 8) {
+    return false;
+  }
+
+  Signal sig = sig_it->second;
+  sig.type = type;
+  checksum_lookup[address] = sig;
+  return true;
+}
+
+const Signal *CANPacker::lookup_signal(uint32_t address, const std::string &name) {
+  auto sig_it = signal_lookup.find(std::make_pair(address, name));
+  return sig_it == signal_lookup.end() ? nullptr : &sig_it->second;
 }
 
 // This function has a definition in common.h and is used in PlotJuggler
@@ -9,7 +9,25 @@ from libcpp cimport bool
 from posix.dlfcn cimport dlopen, dlsym, RTLD_LAZY
 
 from .common cimport CANPacker as cpp_CANPacker
-from .common cimport dbc_lookup, SignalPackValue, DBC
+from .common cimport dbc_lookup, SignalPackValue, DBC, Msg, Signal, SignalType
+from .common cimport HYUNDAI_CRC8_CHECKSUM, HYUNDAI_6B_CHECKSUM, HYUNDAI_7B_CHECKSUM, HYUNDAI_SUM_CHECKSUM, HYUNDAI_NIBBLE_CHECKSUM
+
+CHECKSUM_TYPES = {
+  "crc8": HYUNDAI_CRC8_CHECKSUM,
+  "6B": HYUNDAI_6B_CHECKSUM,
+  "7B": HYUNDAI_7B_CHECKSUM,
+  "sum": HYUNDAI_SUM_CHECKSUM,
+  "nibble": HYUNDAI_NIBBLE_CHECKSUM,
+}
+
+
+cdef class CANMessageTemplate:
+  """Message with its signals resolved once by CANPacker.compile, packed from values in signal_names order"""
+  cdef:
+    readonly uint32_t address
+    readonly int size
+    readonly tuple signal_names
+    vector[Signal] sigs
 
 
 cdef class CANPacker:
@@ -18,6 +36,7 @@ cdef class CANPacker:
     const DBC *dbc
     map[string, (int, int)] name_to_address_and_size
     map[int, int] address_to_size
+    dict templates
 
   def __init__(self, dbc_name):
     self.dbc = dbc_lookup(dbc_name)
@@ -25,12 +44,75 @@ cdef class CANPacker:
       raise RuntimeError(f"Can't lookup {dbc_name}")
 
     self.packer = new cpp_CANPacker(dbc_name)
+    self.templates = {}
     num_msgs = self.dbc[0].num_msgs
     for i in range(num_msgs):
       msg = self.dbc[0].msgs[i]
       self.name_to_address_and_size[string(msg.name)] = (msg.address, msg.size)
       self.address_to_size[msg.address] = msg.size
 
+  def set_checksum(self, name_or_addr, sig_name, checksum_type):
+    """Fill in sig_name on every pack of this message with one of CHECKSUM_TYPES,
+    so callers no longer pack twice to compute it."""
+    cdef int addr
+    if type(name_or_addr) == int:
+      addr = name_or_addr
+    else:
+      addr = self.name_to_address_and_size[name_or_addr.encode('utf8')][0]
+
+    if not self.packer.set_checksum(addr, sig_name.encode('utf8'), <SignalType>CHECKSUM_TYPES[checksum_type]):
+      raise ValueError(f"Can't set {checksum_type} checksum on {name_or_addr} {sig_name}")
+
+  def compile(self, name_or_addr, signal_names=None):
+    """Returns a CANMessageTemplate for signal_names, all signals of the message by default.
+    Templates are cached, so this is cheap to call with the same arguments every cycle."""
+    key = (name_or_addr, signal_names)
+    tmpl = self.templates.get(key)
+    if tmpl is not None:
+      return tmpl
+
+    cdef int addr, size
+    if type(name_or_addr) == int:
+      addr = name_or_addr
+      size = self.address_to_size[name_or_addr]
+    else:
+      addr, size = self.name_to_address_and_size[name_or_addr.encode('utf8')]
+
+    cdef const Signal *sig
+    cdef const Msg *msg
+    if signal_names is None:
+      signal_names = []
+      for i in range(self.dbc[0].num_msgs):
+        msg = &self.dbc[0].msgs[i]
+        if msg.address == addr:
+          signal_names = [msg.sigs[j].name.decode('utf8') for j in range(msg.num_sigs)]
+
+    cdef CANMessageTemplate t = CANMessageTemplate()
+    t.address = addr
+    t.size = size
+    t.signal_names = tuple(signal_names)
+    t.sigs.reserve(len(t.signal_names))
+    for name in t.signal_names:
+      sig = self.packer.lookup_signal(addr, name.encode('utf8'))
+      if sig == NULL:
+        raise KeyError(f"undefined signal {name} - {name_or_addr}")
+      t.sigs.push_back(sig[0])
+
+    self.templates[key] = t
+    return t
+
+  cpdef make_can_msg_compiled(self, CANMessageTemplate tmpl, bus, values, counter=-1):
+    """Same as make_can_msg, values is a sequence ordered like tmpl.signal_names"""
+    cdef vector[double] vals
+    vals.reserve(tmpl.sigs.size())
+    for v in values:
+      vals.push_back(v)
+    if vals.size() != tmpl.sigs.size():
+      raise ValueError(f"expected {tmpl.sigs.size()} values, got {vals.size()}")
+
+    cdef vector[uint8_t] val = self.packer.pack(tmpl.address, tmpl.sigs, vals, counter)
+    return [tmpl.address, 0, (<char *>&val[0])[:tmpl.size], bus]
+
   cdef vector[uint8_t] pack(self, addr, values, counter):
     cdef vector[SignalPackValue] values_thing
     values_thing.reserve(len(values))
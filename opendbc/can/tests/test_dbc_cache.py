@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+import glob
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from opendbc import DBC_PATH
+import opendbc.can.dbc as dbc_module
+from opendbc.can.dbc import dbc
+
+
+class TestDBCCache(unittest.TestCase):
+
+  def setUp(self):
+    self.cache_dir = tempfile.mkdtemp()
+    self._orig_cache_dir = dbc_module.DBC_CACHE_DIR
+    dbc_module.DBC_CACHE_DIR = self.cache_dir
+    self.dbcs = sorted(glob.glob(os.path.join(DBC_PATH, "*.dbc")))
+    self.assertGreater(len(self.dbcs), 0)
+
+  def tearDown(self):
+    dbc_module.DBC_CACHE_DIR = self._orig_cache_dir
+    shutil.rmtree(self.cache_dir)
+
+  def test_cached_matches_parsed(self):
+    for fn in self.dbcs:
+      parsed = dbc(fn, use_cache=False)
+      dbc(fn)  # populate cache
+      cached = dbc(fn)
+
+      self.assertEqual(cached.name, parsed.name)
+      self.assertEqual(cached.msgs, parsed.msgs)
+      self.assertEqual(cached.def_vals, parsed.def_vals)
+      self.assertEqual(cached.dv, parsed.dv)
+      self.assertEqual(cached.msg_name_to_address, parsed.msg_name_to_address)
+
+  def test_cache_invalidated_on_change(self):
+    with tempfile.TemporaryDirectory() as tmp:
+      fn = os.path.join(tmp, "test.dbc")
+      shutil.copy(self.dbcs[0], fn)
+      before = dbc(fn)
+
+      with open(fn, "a") as f:
+        f.write('\nBO_ 2047 NEW_MSG: 8 XXX\n SG_ NEW_SIG : 0|8@1+ (1,0) [0|255] "" XXX\n')
+      after = dbc(fn)
+
+      self.assertNotIn(2047, before.msgs)
+      self.assertIn(2047, after.msgs)
+      self.assertEqual(len(os.listdir(self.cache_dir)), 2)
+
+  def test_corrupt_cache(self):
+    fn = self.dbcs[0]
+    dbc(fn)
+    for f in os.listdir(self.cache_dir):
+      with open(os.path.join(self.cache_dir, f), "wb") as cache_f:
+        cache_f.write(b"\x00garbage")
+    self.assertEqual(dbc(fn).msgs, dbc(fn, use_cache=False).msgs)
+
+  def test_stale_cache(self):
+    fn = self.dbcs[0]
+    dbc(fn)
+    # pickled by some older version, refers to a class that's gone
+    for f in os.listdir(self.cache_dir):
+      with open(os.path.join(self.cache_dir, f), "wb") as cache_f:
+        cache_f.write(b"copendbc.can.dbc\nRemovedClass\n.")
+    self.assertEqual(dbc(fn).msgs, dbc(fn, use_cache=False).msgs)
+
+  def test_warm_load_skips_parsing(self):
+    for fn in self.dbcs:
+      dbc(fn)
+      with mock.patch.object(dbc, "_parse") as parse:
+        dbc(fn)
+      parse.assert_not_called()
+
+  def test_shared_cache_dir_not_used(self):
+    fn = self.dbcs[0]
+    dbc(fn)
+    os.chmod(self.cache_dir, 0o777)
+    with mock.patch.object(dbc, "_parse", wraps=dbc._parse, autospec=True) as parse:
+      dbc(fn)
+    parse.assert_called_once()
+
+  def test_new_cache_dir(self):
+    dbc_module.DBC_CACHE_DIR = os.path.join(self.cache_dir, "new")
+    dbc(self.dbcs[0])
+    self.assertEqual(os.stat(dbc_module.DBC_CACHE_DIR).st_mode & 0o777, 0o700)
+    self.assertEqual(len(os.listdir(dbc_module.DBC_CACHE_DIR)), 1)
+
+  def test_load_times(self):
+    # benchmark only, timing depends on the machine
+    for fn in self.dbcs:
+      t = time.monotonic()
+      dbc(fn)
+      cold = time.monotonic() - t
+
+      t = time.monotonic()
+      dbc(fn)
+      warm = time.monotonic() - t
+
+      print(f"{os.path.basename(fn)}: cold {cold * 1000:.2f} ms, warm {warm * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,4 +1,5 @@
 # python library to interface with panda
+import bisect
 import datetime
 import struct
 import hashlib
@@ -8,6 +9,12 @@ import time
 import traceback
 import sys
 from functools import wraps
+
+try:
+  import numpy as np
+except ImportError:
+  np = None
+
 from .dfu import PandaDFU, MCU_TYPE_F2, MCU_TYPE_F4, MCU_TYPE_H7  # pylint: disable=import-error
 from .flash_release import flash_release  # noqa pylint: disable=import-error
 from .update import ensure_st_up_to_date  # noqa pylint: disable=import-error
@@ -24,12 +31,15 @@ DEBUG = os.getenv("PANDADEBUG") is not None
 CANPACKET_HEAD_SIZE = 0x5
 DLC_TO_LEN = [0, 1, 2, 3, 4, 5, 6, 7, 8, 12, 16, 20, 24, 32, 48, 64]
 LEN_TO_DLC = {length: dlc for (dlc, length) in enumerate(DLC_TO_LEN)}
+MAX_CAN_BUS = 7
 
-def pack_can_buffer(arr):
+def _pack_can_buffer(arr):
   snds = [b'']
   idx = 0
   for address, _, dat, bus in arr:
     assert len(dat) in LEN_TO_DLC
+    if not 0 <= bus <= MAX_CAN_BUS:
+      raise ValueError(f"invalid CAN bus {bus}")
     if DEBUG:
       print(f"  W 0x{address:x}: 0x{dat.hex()}")
     extended = 1 if address >= 0x800 else 0
@@ -56,7 +66,7 @@ def pack_can_buffer(arr):
     snds[idx] = tx
   return snds
 
-def unpack_can_buffer(dat):
+def _unpack_can_buffer(dat):
   ret = []
   counter = 0
   tail = bytearray()
@@ -94,6 +104,103 @@ def unpack_can_buffer(dat):
         break
   return ret
 
+# Whole-buffer numpy versions of the above, they produce the same chunks and frames.
+# Frame boundaries still need a sequential scan, everything else is done on arrays.
+def _pack_can_buffer_np(arr):
+  if DEBUG or len(arr) == 0:
+    return _pack_can_buffer(arr)
+
+  n = len(arr)
+  address, _, dats, bus = zip(*arr)
+  lens = np.fromiter(map(len, dats), dtype=np.int64, count=n)
+  dlc = _LEN_TO_DLC_NP[np.minimum(lens, len(_LEN_TO_DLC_NP) - 1)]
+  assert np.all(dlc >= 0)
+
+  bus = np.array(bus, dtype=np.int64)
+  if np.any((bus < 0) | (bus > MAX_CAN_BUS)):
+    # the header only has 3 bits for it, it would wrap into the length code
+    raise ValueError(f"invalid CAN bus {bus[(bus < 0) | (bus > MAX_CAN_BUS)][0]}")
+
+  address = np.array(address, dtype=np.uint32)
+  word_4b = (address << 3) | ((address >= 0x800).astype(np.uint32) << 2)
+  headers = np.empty((n, CANPACKET_HEAD_SIZE), dtype=np.uint8)
+  headers[:, 0] = (dlc << 4) | (bus << 1)
+  headers[:, 1:] = word_4b.astype('<u4').view(np.uint8).reshape(n, 4)
+
+  # all frames back to back, frame i starts at offsets[i]
+  offsets = np.zeros(n + 1, dtype=np.int64)
+  np.cumsum(lens + CANPACKET_HEAD_SIZE, out=offsets[1:])
+  header_idx = offsets[:-1, None] + np.arange(CANPACKET_HEAD_SIZE)
+  stream = np.empty(offsets[-1], dtype=np.uint8)
+  is_payload = np.ones(offsets[-1], dtype=bool)
+  is_payload[header_idx] = False
+  stream[header_idx] = headers
+  stream[is_payload] = np.frombuffer(b''.join(dats), dtype=np.uint8)
+
+  # a chunk is closed by the first frame that takes it over 256 bytes
+  frame_offsets = offsets.tolist()
+  bounds = [0]
+  while True:
+    k = bisect.bisect_right(frame_offsets, frame_offsets[bounds[-1]] + 256)
+    if k > n:
+      break
+    bounds.append(k)
+  chunk_offsets = np.append(offsets[bounds], offsets[-1])
+
+  # prefix every 63 bytes of each chunk with a counter, starting at 0 per chunk
+  pieces = (np.diff(chunk_offsets) + 62) // 63
+  piece_offsets = np.zeros(len(pieces) + 1, dtype=np.int64)
+  np.cumsum(pieces, out=piece_offsets[1:])
+  piece_chunk = np.repeat(np.arange(len(pieces)), pieces)
+  counter = np.arange(piece_offsets[-1]) - piece_offsets[piece_chunk]
+  out = np.insert(stream, chunk_offsets[piece_chunk] + 63 * counter, counter.astype(np.uint8))
+
+  out_offsets = (chunk_offsets + piece_offsets).tolist()
+  return [out[out_offsets[i]:out_offsets[i + 1]].tobytes() for i in range(len(pieces))]
+
+def _unpack_can_buffer_np(dat):
+  if DEBUG:
+    return _unpack_can_buffer(dat)
+
+  dat = np.frombuffer(dat, dtype=np.uint8)
+  n_packets = (len(dat) + 63) // 64
+  lost = np.flatnonzero(dat[::64] != np.arange(n_packets))
+  if len(lost):
+    print("CAN: LOST RECV PACKET COUNTER")
+    dat = dat[:lost[0] * 64]
+
+  # drop the counters, frames continue across 64 byte packets
+  keep = np.ones(len(dat), dtype=bool)
+  keep[::64] = False
+  chunk = bytearray(dat[keep].tobytes())
+
+  starts = []
+  pos = 0
+  while pos < len(chunk):
+    end = pos + CANPACKET_HEAD_SIZE + DLC_TO_LEN[chunk[pos] >> 4]
+    if end > len(chunk):
+      break
+    starts.append(pos)
+    pos = end
+  if not starts:
+    return []
+
+  header = np.frombuffer(chunk, dtype=np.uint8)[np.array(starts)[:, None] + np.arange(CANPACKET_HEAD_SIZE)]
+  address = np.ascontiguousarray(header[:, 1:]).view('<u4').ravel() >> 3
+  bus = ((header[:, 0] >> 1) & 0x7).astype(np.int64)
+  bus = bus + 128 * ((header[:, 1] >> 1) & 0x1) + 192 * (header[:, 1] & 0x1)
+  data_start = np.array(starts) + CANPACKET_HEAD_SIZE
+  data_end = data_start + _DLC_TO_LEN_NP[header[:, 0] >> 4]
+
+  return [(a, 0, chunk[s:e], b) for a, s, e, b in zip(address.tolist(), data_start.tolist(), data_end.tolist(), bus.tolist())]
+
+if np is not None:
+  _DLC_TO_LEN_NP = np.array(DLC_TO_LEN, dtype=np.int64)
+  _LEN_TO_DLC_NP = np.array([LEN_TO_DLC.get(length, -1) for length in range(DLC_TO_LEN[-1] + 2)], dtype=np.int64)
+  pack_can_buffer, unpack_can_buffer = _pack_can_buffer_np, _unpack_can_buffer_np
+else:
+  pack_can_buffer, unpack_can_buffer = _pack_can_buffer, _unpack_can_buffer
+
 def ensure_health_packet_version(fn):
   @wraps(fn)
   def wrapper(self, *args, **kwargs):
@@ -16,6 +16,7 @@ import time
 from collections import namedtuple
 from datetime import datetime
 from functools import partial
+from pathlib import Path
 from typing import Any, Dict
 
 import requests
@@ -28,9 +29,13 @@ from cereal import log
 from cereal.services import service_list
 from common.api import Api
 from common.basedir import PERSIST
+from common.dir_watcher import DirectoryWatcher
 from common.file_helpers import CallbackReader
 from common.params import Params
 from common.realtime import sec_since_boot
+from selfdrive.athena.data_directory import list_data_directory, scan_dir
+from selfdrive.athena.upload_queue_journal import UploadQueueJournal
+from selfdrive.athena.upload_scheduler import TokenBucket, UploadQueue
 from selfdrive.hardware import HARDWARE, PC, TICI
 from selfdrive.loggerd.config import ROOT
 from selfdrive.loggerd.xattr_cache import getxattr, setxattr
@@ -40,6 +45,8 @@ from selfdrive.version import get_commit, get_origin, get_short_branch, get_vers
 
 ATHENA_HOST = os.getenv('ATHENA_HOST', 'wss://athena.comma.ai')
 HANDLER_THREADS = int(os.getenv('HANDLER_THREADS', "4"))
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', "2"))
+UPLOAD_RATE_LIMIT = int(os.getenv('UPLOAD_RATE_LIMIT', "0"))  # bytes/s shared by all uploads, 0 is unlimited
 LOCAL_PORT_WHITELIST = {8022}
 
 LOG_ATTR_NAME = 'user.upload'
@@ -50,13 +57,21 @@ RETRY_DELAY = 10  # seconds
 MAX_RETRY_COUNT = 30  # Try for at most 5 minutes if upload fails immediately
 MAX_AGE = 31 * 24 * 3600  # seconds
 WS_FRAME_SIZE = 4096
+UPLOAD_TIMEOUT = 60  # seconds, plus the time a file takes at UPLOAD_MIN_SPEED
+UPLOAD_MIN_SPEED = 20 * 1024  # bytes/s
+
+if PC:
+  UPLOAD_QUEUE_JOURNAL = os.path.join(str(Path.home()), ".comma", "athena", "upload_queue")
+else:
+  UPLOAD_QUEUE_JOURNAL = "/data/athena/upload_queue"
 
 NetworkType = log.DeviceState.NetworkType
 
 dispatcher["echo"] = lambda s: s
 recv_queue: Any = queue.Queue()
 send_queue: Any = queue.Queue()
-upload_queue: Any = queue.Queue()
+upload_queue: Any = UploadQueue()
+upload_bandwidth = TokenBucket(UPLOAD_RATE_LIMIT)
 low_priority_send_queue: Any = queue.Queue()
 log_recv_queue: Any = queue.Queue()
 cancelled_uploads: Any = set()
@@ -68,26 +83,45 @@ class AbortTransferException(Exception):
   pass
 
 
+class UploadTimeoutException(Exception):
+  pass
+
+
 class UploadQueueCache():
   params = Params()
+  journal = UploadQueueJournal(UPLOAD_QUEUE_JOURNAL)
 
   @staticmethod
   def initialize(upload_queue):
     try:
+      items = UploadQueueCache.journal.load()
+
+      # queue saved as a single param by older versions
       upload_queue_json = UploadQueueCache.params.get("AthenadUploadQueue")
       if upload_queue_json is not None:
-        for item in json.loads(upload_queue_json):
-          upload_queue.put(UploadItem(**item))
+        if not items:
+          items = json.loads(upload_queue_json)
+          UploadQueueCache.journal.compact(items)
+        UploadQueueCache.params.delete("AthenadUploadQueue")
+
+      for item in items:
+        upload_queue.put(UploadItem(**item))
     except Exception:
       cloudlog.exception("athena.UploadQueueCache.initialize.exception")
 
   @staticmethod
-  def cache(upload_queue):
+  def put(item):
     try:
-      items = [i._asdict() for i in upload_queue.queue if i.id not in cancelled_uploads]
-      UploadQueueCache.params.put("AthenadUploadQueue", json.dumps(items))
+      UploadQueueCache.journal.put(item._asdict())
     except Exception:
-      cloudlog.exception("athena.UploadQueueCache.cache.exception")
+      cloudlog.exception("athena.UploadQueueCache.put.exception")
+
+  @staticmethod
+  def remove(upload_id):
+    try:
+      UploadQueueCache.journal.remove(upload_id)
+    except Exception:
+      cloudlog.exception("athena.UploadQueueCache.remove.exception")
 
 
 def handle_long_poll(ws):
@@ -96,9 +130,11 @@ def handle_long_poll(ws):
   threads = [
     threading.Thread(target=ws_recv, args=(ws, end_event), name='ws_recv'),
     threading.Thread(target=ws_send, args=(ws, end_event), name='ws_send'),
-    threading.Thread(target=upload_handler, args=(end_event,), name='upload_handler'),
     threading.Thread(target=log_handler, args=(end_event,), name='log_handler'),
     threading.Thread(target=stat_handler, args=(end_event,), name='stat_handler'),
+  ] + [
+    threading.Thread(target=upload_handler, args=(end_event,), name=f'upload_handler_{x}')
+    for x in range(UPLOAD_WORKERS)
   ] + [
     threading.Thread(target=jsonrpc_handler, args=(end_event,), name=f'worker_{x}')
     for x in range(HANDLER_THREADS)
@@ -149,7 +185,7 @@ def retry_upload(tid: int, end_event: threading.Event, increase_count: bool = Tr
       current=False
     )
     upload_queue.put_nowait(item)
-    UploadQueueCache.cache(upload_queue)
+    UploadQueueCache.put(item)
 
     cur_upload_items[tid] = None
 
@@ -157,6 +193,16 @@ def retry_upload(tid: int, end_event: threading.Event, increase_count: bool = Tr
       time.sleep(1)
       if end_event.is_set():
         break
+  else:
+    UploadQueueCache.remove(cur_upload_items[tid].id)
+
+
+def upload_timeout(sz: int) -> float:
+  # a rate limit shared by all workers can make every upload slower than the minimum speed
+  min_speed = UPLOAD_MIN_SPEED
+  if upload_bandwidth.rate > 0:
+    min_speed = min(min_speed, upload_bandwidth.rate / UPLOAD_WORKERS)
+  return UPLOAD_TIMEOUT + max(sz, 0) / min_speed
 
 
 def upload_handler(end_event: threading.Event) -> None:
@@ -171,12 +217,14 @@ def upload_handler(end_event: threading.Event) -> None:
 
       if cur_upload_items[tid].id in cancelled_uploads:
         cancelled_uploads.remove(cur_upload_items[tid].id)
+        UploadQueueCache.remove(cur_upload_items[tid].id)
         continue
 
       # Remove item if too old
       age = datetime.now() - datetime.fromtimestamp(cur_upload_items[tid].created_at / 1000)
       if age.total_seconds() > MAX_AGE:
         cloudlog.event("athena.upload_handler.expired", item=cur_upload_items[tid], error=True)
+        UploadQueueCache.remove(cur_upload_items[tid].id)
         continue
 
       # Check if uploading over metered connection is allowed
@@ -188,21 +236,32 @@ def upload_handler(end_event: threading.Event) -> None:
         continue
 
       try:
+        fn = cur_upload_items[tid].path
+        try:
+          sz = os.path.getsize(fn)
+        except OSError:
+          sz = -1
+
+        # The deadline is only checked when requests reads the next block of the file. A send
+        # blocked on a stalled connection, or the wait for the response, is bounded by the 30s
+        # socket timeout of the request instead, so an upload can run up to that much longer.
+        deadline = time.monotonic() + upload_timeout(sz)
+        sent = 0
+
         def cb(sz, cur):
+          nonlocal sent
           # Abort transfer if connection changed to metered after starting upload
           sm.update(0)
           metered = sm['deviceState'].networkMetered
           if metered and (not cur_upload_items[tid].allow_cellular):
             raise AbortTransferException
+          if time.monotonic() > deadline:
+            raise UploadTimeoutException
 
+          upload_bandwidth.consume(cur - sent, end_event)
+          sent = cur
           cur_upload_items[tid] = cur_upload_items[tid]._replace(progress=cur / sz if sz else 1)
 
-        fn = cur_upload_items[tid].path
-        try:
-          sz = os.path.getsize(fn)
-        except OSError:
-          sz = -1
-
         cloudlog.event("athena.upload_handler.upload_start", fn=fn, sz=sz, network_type=network_type, metered=metered, retry_count=cur_upload_items[tid].retry_count)
         response = _do_upload(cur_upload_items[tid], cb)
 
@@ -211,9 +270,8 @@ def upload_handler(end_event: threading.Event) -> None:
           retry_upload(tid, end_event)
         else:
           cloudlog.event("athena.upload_handler.success", fn=fn, sz=sz, network_type=network_type, metered=metered)
-
-        UploadQueueCache.cache(upload_queue)
-      except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.SSLError):
+          UploadQueueCache.remove(cur_upload_items[tid].id)
+      except (requests.exceptions.Timeout, requests.exceptions.ConnectionError, requests.exceptions.SSLError, UploadTimeoutException):
         cloudlog.event("athena.upload_handler.timeout", fn=fn, sz=sz, network_type=network_type, metered=metered)
         retry_upload(tid, end_event)
       except AbortTransferException:
@@ -224,6 +282,8 @@ def upload_handler(end_event: threading.Event) -> None:
       pass
     except Exception:
       cloudlog.exception("athena.upload_handler.exception")
+      if cur_upload_items[tid] is not None:
+        UploadQueueCache.remove(cur_upload_items[tid].id)
 
 
 def _do_upload(upload_item, callback=None):
@@ -277,28 +337,14 @@ def setNavDestination(latitude=0, longitude=0, place_name=None, place_details=No
   return {"success": 1}
 
 
-def scan_dir(path, prefix):
-  files = list()
-  # only walk directories that match the prefix
-  # (glob and friends traverse entire dir tree)
-  with os.scandir(path) as i:
-    for e in i:
-      rel_path = os.path.relpath(e.path, ROOT)
-      if e.is_dir(follow_symlinks=False):
-        # add trailing slash
-        rel_path = os.path.join(rel_path, '')
-        # if prefix is a partial dir name, current dir will start with prefix
-        # if prefix is a partial file name, prefix with start with dir name
-        if rel_path.startswith(prefix) or prefix.startswith(rel_path):
-          files.extend(scan_dir(e.path, prefix))
-      else:
-        if rel_path.startswith(prefix):
-          files.append(rel_path)
-  return files
-
 @dispatcher.add_method
-def listDataDirectory(prefix=''):
-  return scan_dir(ROOT, prefix)
+def listDataDirectory(prefix='', cursor=None, limit=None, metadata=False):
+  # without paging arguments, reply with every file like older clients expect
+  if cursor is None and limit is None and not metadata:
+    return [rel_path for rel_path, _ in scan_dir(ROOT, ROOT, prefix)]
+
+  files, next_cursor = list_data_directory(ROOT, prefix, cursor, limit, metadata)
+  return {"files": files, "cursor": next_cursor}
 
 
 @dispatcher.add_method
@@ -351,10 +397,9 @@ def uploadFilesToUrls(files_data):
     upload_id = hashlib.sha1(str(item).encode()).hexdigest()
     item = item._replace(id=upload_id)
     upload_queue.put_nowait(item)
+    UploadQueueCache.put(item)
     items.append(item._asdict())
 
-  UploadQueueCache.cache(upload_queue)
-
   resp = {"enqueued": len(items), "items": items}
   if failed:
     resp["failed"] = failed
@@ -379,6 +424,8 @@ def cancelUpload(upload_id):
     return 404
 
   cancelled_uploads.update(cancelled_ids)
+  for cancelled_id in cancelled_ids:
+    UploadQueueCache.remove(cancelled_id)
   return {"success": 1}
 
 
@@ -485,34 +532,52 @@ def takeSnapshot():
     raise Exception("not available while camerad is started")
 
 
-def get_logs_to_send_sorted():
-  # TODO: scan once then use inotify to detect file creation/deletion
-  curr_time = int(time.time())
-  logs = []
-  for log_entry in os.listdir(SWAGLOG_DIR):
-    log_path = os.path.join(SWAGLOG_DIR, log_entry)
-    try:
-      time_sent = int.from_bytes(getxattr(log_path, LOG_ATTR_NAME), sys.byteorder)
-    except (ValueError, TypeError):
-      time_sent = 0
+class LogQueue:
+  """Swaglog files that still need to be sent, oldest first. The directory is watched
+  instead of listed and each file's xattr is only read when it shows up."""
+  def __init__(self, path):
+    self.path = path
+    self.watcher = DirectoryWatcher(path)
+    self.time_sent: Dict[str, int] = {}
+
+  def update(self, timeout=0.):
+    changed = self.watcher.update(timeout)
+    for log_entry in self.watcher.pop_removed():
+      self.time_sent.pop(log_entry, None)
+    for log_entry in self.watcher.pop_added():
+      try:
+        time_sent = int.from_bytes(getxattr(os.path.join(self.path, log_entry), LOG_ATTR_NAME), sys.byteorder)
+      except (ValueError, TypeError):
+        time_sent = 0
+      except OSError:
+        continue  # already rotated out
+      self.time_sent[log_entry] = time_sent
+    return changed
+
+  def logs_to_send(self):
+    curr_time = int(time.time())
     # assume send failed and we lost the response if sent more than one hour ago
-    if not time_sent or curr_time - time_sent > 3600:
-      logs.append(log_entry)
-  # excluding most recent (active) log file
-  return sorted(logs)[:-1]
+    # excluding most recent (active) log file
+    return [log_entry for log_entry in self.watcher.names[:-1]
+            if not self.time_sent.get(log_entry) or curr_time - self.time_sent[log_entry] > 3600]
+
+  def set_sent(self, log_entry, value):
+    setxattr(os.path.join(self.path, log_entry), LOG_ATTR_NAME, value)
+    self.time_sent[log_entry] = int.from_bytes(value, sys.byteorder)
 
 
 def log_handler(end_event):
   if PC:
     return
 
+  log_queue = LogQueue(SWAGLOG_DIR)
   log_files = []
   last_scan = 0
   while not end_event.is_set():
     try:
       curr_scan = sec_since_boot()
-      if curr_scan - last_scan > 10:
-        log_files = get_logs_to_send_sorted()
+      if log_queue.update() or curr_scan - last_scan > 10:
+        log_files = log_queue.logs_to_send()
         last_scan = curr_scan
 
       # send one log
@@ -523,7 +588,7 @@ def log_handler(end_event):
         try:
           curr_time = int(time.time())
           log_path = os.path.join(SWAGLOG_DIR, log_entry)
-          setxattr(log_path, LOG_ATTR_NAME, int.to_bytes(curr_time, 4, sys.byteorder))
+          log_queue.set_sent(log_entry, int.to_bytes(curr_time, 4, sys.byteorder))
           with open(log_path) as f:
             jsonrpc = {
               "method": "forwardLogs",
@@ -549,9 +614,8 @@ def log_handler(end_event):
           log_success = "result" in log_resp and log_resp["result"].get("success")
           cloudlog.debug(f"athena.log_handler.forward_response {log_entry} {log_success}")
           if log_entry and log_success:
-            log_path = os.path.join(SWAGLOG_DIR, log_entry)
             try:
-              setxattr(log_path, LOG_ATTR_NAME, LOG_ATTR_VALUE_MAX_UNIX_TIME)
+              log_queue.set_sent(log_entry, LOG_ATTR_VALUE_MAX_UNIX_TIME)
             except OSError:
               pass  # file could be deleted by log rotation
           if curr_log == log_entry:
@@ -565,29 +629,30 @@ def log_handler(end_event):
 
 
 def stat_handler(end_event):
+  # statsd writes to a temporary file first, then moves it into place
+  stats = DirectoryWatcher(STATS_DIR, name_filter=lambda name: not name.startswith(tempfile.gettempprefix()))
   while not end_event.is_set():
-    last_scan = 0
-    curr_scan = sec_since_boot()
     try:
-      if curr_scan - last_scan > 10:
-        stat_filenames = list(filter(lambda name: not name.startswith(tempfile.gettempprefix()), os.listdir(STATS_DIR)))
-        if len(stat_filenames) > 0:
-          stat_path = os.path.join(STATS_DIR, stat_filenames[0])
-          with open(stat_path) as f:
-            jsonrpc = {
-              "method": "storeStats",
-              "params": {
-                "stats": f.read()
-              },
-              "jsonrpc": "2.0",
-              "id": stat_filenames[0]
-            }
-            low_priority_send_queue.put_nowait(json.dumps(jsonrpc))
-          os.remove(stat_path)
-        last_scan = curr_scan
+      stats.update(timeout=1.)
+      stats.pop_added()
+      stats.pop_removed()
+      for stat_filename in list(stats.names):
+        stat_path = os.path.join(STATS_DIR, stat_filename)
+        with open(stat_path) as f:
+          jsonrpc = {
+            "method": "storeStats",
+            "params": {
+              "stats": f.read()
+            },
+            "jsonrpc": "2.0",
+            "id": stat_filename
+          }
+          low_priority_send_queue.put_nowait(json.dumps(jsonrpc))
+        os.remove(stat_path)
     except Exception:
       cloudlog.exception("athena.stat_handler.exception")
-    time.sleep(0.1)
+      time.sleep(0.1)
+  stats.close()
 
 
 def ws_proxy_recv(ws, local_sock, ssock, end_event, global_end_event):
@@ -0,0 +1,74 @@
+import itertools
+import os
+from typing import Iterator, Optional, Tuple
+
+from selfdrive.loggerd.uploader import UPLOAD_ATTR_NAME, UPLOAD_ATTR_VALUE
+from selfdrive.loggerd.xattr_cache import getxattr
+
+MAX_PAGE_SIZE = 10000
+
+
+def scan_dir(path: str, root: str, prefix: str = '', after: Optional[str] = None) -> Iterator[Tuple[str, os.DirEntry]]:
+  """
+  Yields (path relative to root, entry) for the files under path that start
+  with prefix, sorted by path. Directories are listed lazily, and only when
+  they can hold a match after the path given in after.
+  """
+  rel_dir = os.path.relpath(path, root)
+  rel_dir = '' if rel_dir == '.' else os.path.join(rel_dir, '')
+
+  # only entries that can match are kept, directories as their relative path and files as their entry
+  entries = []
+  with os.scandir(path) as it:
+    for e in it:
+      rel_path = rel_dir + e.name
+      if e.is_dir(follow_symlinks=False):
+        # add trailing slash, this also keeps the order of children and siblings consistent
+        rel_path = os.path.join(rel_path, '')
+        # everything in a directory sorts before after, unless after is inside it
+        if after is not None and rel_path < after and not after.startswith(rel_path):
+          continue
+        # if prefix is a partial dir name, current dir will start with prefix
+        # if prefix is a partial file name, prefix with start with dir name
+        if rel_path.startswith(prefix) or prefix.startswith(rel_path):
+          entries.append((rel_path, None))
+      elif rel_path.startswith(prefix) and (after is None or rel_path > after):
+        entries.append((rel_path, e))
+  entries.sort(key=lambda x: x[0])
+
+  for rel_path, e in entries:
+    if e is None:
+      yield from scan_dir(os.path.join(root, rel_path), root, prefix, after)
+    else:
+      yield rel_path, e
+
+
+def file_metadata(rel_path: str, entry: os.DirEntry):
+  """Metadata of a listed file, None if it was deleted since it was listed"""
+  # scandir doesn't stat on Linux, this lstat is the first. The xattr cache is shared with the uploader
+  try:
+    st = entry.stat(follow_symlinks=False)
+  except OSError:
+    return None
+  try:
+    uploaded = getxattr(entry.path, UPLOAD_ATTR_NAME) == UPLOAD_ATTR_VALUE
+  except OSError:
+    uploaded = False
+  return {'path': rel_path, 'size': st.st_size, 'mtime': st.st_mtime, 'uploaded': uploaded}
+
+
+def list_data_directory(root: str, prefix: str = '', cursor: Optional[str] = None, limit: Optional[int] = None, metadata: bool = False):
+  """
+  Files under root starting with prefix, at most limit of them after cursor.
+  Returns the next cursor, or None once all files were listed.
+  """
+  limit = MAX_PAGE_SIZE if limit is None else max(1, min(int(limit), MAX_PAGE_SIZE))
+  page = list(itertools.islice(scan_dir(root, root, prefix, cursor), limit + 1))
+
+  next_cursor = page[limit - 1][0] if len(page) > limit else None
+  page = page[:limit]
+  if metadata:
+    files = [m for m in (file_metadata(rel_path, e) for rel_path, e in page) if m is not None]
+  else:
+    files = [rel_path for rel_path, _ in page]
+  return files, next_cursor
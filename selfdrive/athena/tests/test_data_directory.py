@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+import unittest
+
+from selfdrive.athena.data_directory import file_metadata, list_data_directory, scan_dir
+from selfdrive.loggerd.uploader import UPLOAD_ATTR_NAME, UPLOAD_ATTR_VALUE
+from selfdrive.loggerd.xattr_cache import setxattr
+
+SEGMENT_FILES = ["fcamera.hevc", "ecamera.hevc", "dcamera.hevc", "qcamera.ts", "qlog.bz2", "rlog.bz2"]
+
+
+def scan_dir_recursive(path, root, prefix):
+  """Builds the whole list at once, like listDataDirectory used to"""
+  files = list()
+  with os.scandir(path) as i:
+    for e in i:
+      rel_path = os.path.relpath(e.path, root)
+      if e.is_dir(follow_symlinks=False):
+        rel_path = os.path.join(rel_path, '')
+        if rel_path.startswith(prefix) or prefix.startswith(rel_path):
+          files.extend(scan_dir_recursive(e.path, root, prefix))
+      else:
+        if rel_path.startswith(prefix):
+          files.append(rel_path)
+  return files
+
+
+class TestDataDirectory(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    # 5000 segments of 6 files each, over a few routes, and some crash logs
+    cls.root = tempfile.mkdtemp()
+    for route in range(10):
+      for segment in range(500):
+        path = os.path.join(cls.root, f"2021-01-{route + 1:02d}--12-00-00--{segment}")
+        os.mkdir(path)
+        for fn in SEGMENT_FILES:
+          open(os.path.join(path, fn), "wb").close()
+    os.mkdir(os.path.join(cls.root, "crash"))
+    for i in range(20):
+      with open(os.path.join(cls.root, "crash", f"error_{i}.txt"), "w") as f:
+        f.write("x" * i)
+
+  @classmethod
+  def tearDownClass(cls):
+    shutil.rmtree(cls.root)
+
+  def paginate(self, prefix, limit, metadata=False):
+    files, cursor = [], None
+    while True:
+      page, cursor = list_data_directory(self.root, prefix, cursor, limit, metadata)
+      self.assertLessEqual(len(page), limit)
+      files += page
+      if cursor is None:
+        return files
+
+  def test_same_files(self):
+    for prefix in ['', '2021-01-03', '2021-01-03--12-00-00--1', '2021-01-03--12-00-00--12/', '2021-01-03--12-00-00--12/q', 'crash/', 'missing']:
+      expected = sorted(scan_dir_recursive(self.root, self.root, prefix))
+      self.assertEqual([rel_path for rel_path, _ in scan_dir(self.root, self.root, prefix)], expected, prefix)
+
+  def test_pagination(self):
+    # every page lists the top directory again, keep small pages to small prefixes
+    for prefix, limits in (('', (1000, 4096)), ('2021-01-03--12-00-00--1', (1, 7, 100)), ('crash/', (1, 3))):
+      expected = sorted(scan_dir_recursive(self.root, self.root, prefix))
+      for limit in limits:
+        self.assertEqual(self.paginate(prefix, limit), expected, (prefix, limit))
+
+  def test_cursor_of_deleted_file(self):
+    # files can go away between pages, the listing continues after where they were
+    tmp_root = tempfile.mkdtemp()
+    try:
+      for segment in range(3):
+        os.mkdir(os.path.join(tmp_root, f"seg--{segment}"))
+        for fn in SEGMENT_FILES:
+          open(os.path.join(tmp_root, f"seg--{segment}", fn), "wb").close()
+
+      page, cursor = list_data_directory(tmp_root, limit=8)
+      self.assertEqual(cursor, f"seg--1/{sorted(SEGMENT_FILES)[1]}")
+      shutil.rmtree(os.path.join(tmp_root, "seg--1"))
+      page, cursor = list_data_directory(tmp_root, cursor=cursor)
+      self.assertEqual(page, [f"seg--2/{fn}" for fn in sorted(SEGMENT_FILES)])
+      self.assertIsNone(cursor)
+    finally:
+      shutil.rmtree(tmp_root)
+
+  def test_metadata(self):
+    path = os.path.join(self.root, "crash", "error_5.txt")
+    setxattr(path, UPLOAD_ATTR_NAME, UPLOAD_ATTR_VALUE)
+
+    files = self.paginate("crash/", 8, metadata=True)
+    self.assertEqual(len(files), 20)
+    for f in files:
+      i = int(f['path'].split('_')[1].split('.')[0])
+      self.assertEqual(f['size'], i)
+      self.assertEqual(f['uploaded'], i == 5)
+      self.assertAlmostEqual(f['mtime'], os.path.getmtime(os.path.join(self.root, f['path'])))
+
+  def test_metadata_of_deleted_file(self):
+    tmp_root = tempfile.mkdtemp()
+    try:
+      for fn in SEGMENT_FILES:
+        open(os.path.join(tmp_root, fn), "w").close()
+      entries = list(scan_dir(tmp_root, tmp_root))
+
+      # the deleter removed one between listing and stat
+      os.remove(os.path.join(tmp_root, "qlog.bz2"))
+      metadata = [file_metadata(rel_path, e) for rel_path, e in entries]
+      self.assertEqual([m['path'] for m in metadata if m is not None], sorted(set(SEGMENT_FILES) - {"qlog.bz2"}))
+      self.assertIsNone(metadata[[rel_path for rel_path, _ in entries].index("qlog.bz2")])
+    finally:
+      shutil.rmtree(tmp_root)
+
+  def test_benchmark(self):
+    tracemalloc.start()
+    start = time.monotonic()
+    files = scan_dir_recursive(self.root, self.root, '')
+    full_time = time.monotonic() - start
+    full_peak = tracemalloc.get_traced_memory()[1]
+    del files
+
+    tracemalloc.reset_peak()
+    start = time.monotonic()
+    page, cursor = list_data_directory(self.root, limit=100)
+    page_time = time.monotonic() - start
+    page_peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    print(f"full listing: {full_time * 1000:.1f} ms, {full_peak / 1024:.0f} kB peak")
+    print(f"first page of {len(page)}: {page_time * 1000:.1f} ms, {page_peak / 1024:.0f} kB peak")
+    self.assertIsNotNone(cursor)
+    self.assertLess(page_time, full_time)
+    self.assertLess(page_peak, full_peak / 2)
+
+
+if __name__ == "__main__":
+  unittest.main()
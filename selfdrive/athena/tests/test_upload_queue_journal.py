@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+import json
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from collections import OrderedDict
+
+from selfdrive.athena import upload_queue_journal
+from selfdrive.athena.upload_queue_journal import UploadQueueJournal
+
+
+def make_item(i, retry_count=0):
+  return {'path': f"/data/media/0/realdata/2021-01-01--00-00-00--{i}/qcamera.ts", 'url': f"https://upload.example.com/{i}?sig=abcdef",
+          'headers': {'x-ms-blob-type': 'BlockBlob'}, 'created_at': 1600000000000 + i, 'id': f"{i:040x}",
+          'retry_count': retry_count, 'current': False, 'progress': 0, 'allow_cellular': False}
+
+
+def random_ops(rng, n):
+  """Enqueues, retries and completions like athenad makes them, with the expected queue after each"""
+  expected = OrderedDict()
+  next_id = 0
+  for _ in range(n):
+    r = rng.random()
+    if r < 0.4 or not expected:
+      item = make_item(next_id)
+      next_id += 1
+    elif r < 0.7:
+      item = dict(rng.choice(list(expected.values())))
+      item['retry_count'] += 1
+    else:
+      upload_id = rng.choice(list(expected))
+      del expected[upload_id]
+      yield ('remove', upload_id), OrderedDict(expected)
+      continue
+
+    expected.pop(item['id'], None)
+    expected[item['id']] = item
+    yield ('put', item), OrderedDict(expected)
+
+
+def apply(journal, op):
+  if op[0] == 'put':
+    journal.put(op[1])
+  else:
+    journal.remove(op[1])
+
+
+class TestUploadQueueJournal(unittest.TestCase):
+
+  def setUp(self):
+    self.tmp = tempfile.mkdtemp()
+    self.path = os.path.join(self.tmp, "athena", "upload_queue")
+
+  def tearDown(self):
+    shutil.rmtree(self.tmp)
+
+  def test_replay(self):
+    journal = UploadQueueJournal(self.path)
+    self.assertEqual(journal.load(), [])
+    expected = OrderedDict()
+    for op, expected in random_ops(random.Random(0), 2000):
+      apply(journal, op)
+    journal.close()
+
+    # compacted along the way, not one record per op
+    with open(self.path) as f:
+      self.assertLessEqual(len(f.readlines()), max(upload_queue_journal.COMPACT_MIN_RECORDS, 2 * len(expected)) + 1)
+
+    journal = UploadQueueJournal(self.path)
+    self.assertEqual(journal.load(), list(expected.values()))
+
+    # and keeps going after a restart
+    journal.remove(next(iter(expected)))
+    journal.close()
+    self.assertEqual(UploadQueueJournal(self.path).load(), list(expected.values())[1:])
+
+  def test_truncated(self):
+    journal = UploadQueueJournal(self.path)
+    journal.load()
+    states = [[]]
+    for op, expected in random_ops(random.Random(1), 20):
+      apply(journal, op)
+      states.append(list(expected.values()))
+    journal.close()
+
+    with open(self.path, "rb") as f:
+      dat = f.read()
+    ends = [i + 1 for i, c in enumerate(dat) if c == ord("\n")]
+    self.assertEqual(len(ends), len(states) - 1)
+
+    # a crash can cut the file anywhere, everything up to the last whole record survives
+    for size in range(len(dat)):
+      with open(self.path, "wb") as f:
+        f.write(dat[:size])
+      journal = UploadQueueJournal(self.path)
+      n_records = sum(end <= size for end in ends)
+      self.assertEqual(journal.load(), states[n_records])
+
+      # the torn tail is gone, new records aren't appended to it
+      journal.put(make_item(1000))
+      journal.close()
+      self.assertEqual(UploadQueueJournal(self.path).load(), states[n_records] + [make_item(1000)])
+
+  def test_corrupted(self):
+    journal = UploadQueueJournal(self.path)
+    journal.load()
+    for i in range(3):
+      journal.put(make_item(i))
+    journal.close()
+
+    with open(self.path, "r+b") as f:
+      lines = f.readlines()
+      f.seek(len(lines[0]) + len(lines[1]) - 10)
+      f.write(b"X")
+    self.assertEqual(UploadQueueJournal(self.path).load(), [make_item(0)])
+
+  def test_write_amplification(self):
+    n_items = 500
+    items = [make_item(i) for i in range(n_items)]
+    journal = UploadQueueJournal(self.path)
+    journal.load()
+    journal.compact(items)
+
+    rng = random.Random(2)
+    n_ops = 1000
+    start_size = os.path.getsize(self.path)
+    blob_bytes = 0
+    journal_bytes = 0
+    for _ in range(n_ops):
+      item = dict(rng.choice(items))
+      item['retry_count'] += 1
+      journal.put(item)
+
+      # the whole queue as one param, like before
+      blob_bytes += len(json.dumps(list(journal.items.values())))
+      journal_bytes += len(UploadQueueJournal.encode({'op': 'put', 'item': item}))
+
+    journal_bytes += n_ops // (n_items + 1) * start_size  # compactions
+    print(f"{n_items} queued items, bytes written per update: full rewrite {blob_bytes / n_ops:.0f}, journal {journal_bytes / n_ops:.0f}")
+    self.assertLess(journal_bytes * 10, blob_bytes)
+    journal.close()
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from selfdrive.athena import athenad
+from selfdrive.athena.upload_queue_journal import UploadQueueJournal
+from selfdrive.athena.upload_scheduler import LOG_PRIORITY, QCAMERA_PRIORITY, VIDEO_PRIORITY, TokenBucket, UploadQueue, upload_priority
+
+Item = namedtuple('Item', ['path', 'url'])
+
+CHUNK_SIZE = 64 * 1024
+CHUNK_LATENCY = 0.01  # seconds per chunk received, a slow uplink
+RESPONSE_LATENCY = 0.02
+
+
+class SlowSink(BaseHTTPRequestHandler):
+  protocol_version = "HTTP/1.1"
+
+  def do_PUT(self):
+    sink = self.server
+    with sink.lock:
+      sink.started.append(self.path)
+      status = sink.fail.pop(self.path, 201)
+
+    left = int(self.headers['Content-Length'])
+    while left > 0:
+      dat = self.rfile.read(min(left, CHUNK_SIZE))
+      if not dat:
+        # the client gave up on the upload
+        return
+      left -= len(dat)
+      time.sleep(CHUNK_LATENCY)
+    time.sleep(RESPONSE_LATENCY)
+
+    with sink.lock:
+      if status == 201:
+        sink.done[self.path] = time.monotonic()
+    self.send_response(status)
+    self.send_header('Content-Length', '0')
+    self.end_headers()
+
+  def log_message(self, *args):
+    pass
+
+
+class TestUploadScheduler(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.server = ThreadingHTTPServer(("127.0.0.1", 0), SlowSink)
+    cls.server.daemon_threads = True
+    cls.server.lock = threading.Lock()
+    cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+    threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.shutdown()
+    cls.server.server_close()
+
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.server.started, self.server.done, self.server.fail = [], {}, {}
+
+    self.journal = UploadQueueJournal(os.path.join(self.root, "athena", "upload_queue"))
+    self.journal.load()
+    patches = [
+      mock.patch.object(athenad, "ROOT", self.root),
+      mock.patch.object(athenad, "RETRY_DELAY", 0),
+      mock.patch.object(athenad, "upload_queue", UploadQueue()),
+      mock.patch.object(athenad, "upload_bandwidth", TokenBucket()),
+      mock.patch.object(athenad.UploadQueueCache, "journal", self.journal),
+      mock.patch.dict(athenad.cur_upload_items, clear=True),
+    ]
+    for p in patches:
+      p.start()
+      self.addCleanup(p.stop)
+    athenad.cancelled_uploads.clear()
+    self.end_event = threading.Event()
+
+  def tearDown(self):
+    self.end_event.set()
+    for t in getattr(self, "workers", []):
+      t.join()
+    self.journal.close()
+    shutil.rmtree(self.root)
+
+  def start_workers(self, n):
+    self.workers = [threading.Thread(target=athenad.upload_handler, args=(self.end_event,)) for _ in range(n)]
+    for t in self.workers:
+      t.start()
+
+  def wait_for(self, condition, timeout=10, msg=None):
+    start = time.monotonic()
+    while not condition():
+      self.assertLess(time.monotonic() - start, timeout, msg)
+      time.sleep(0.01)
+
+  def make_file(self, segment, name, size):
+    fn = os.path.join(segment, name)
+    os.makedirs(os.path.join(self.root, segment), exist_ok=True)
+    with open(os.path.join(self.root, fn), "wb") as f:
+      f.write(os.urandom(size))
+    return fn
+
+  def enqueue(self, *fns):
+    resp = athenad.uploadFilesToUrls([{"fn": fn, "url": f"{self.url}/{fn}", "headers": {}} for fn in fns])
+    self.assertEqual(resp["enqueued"], len(fns))
+    return [item["id"] for item in resp["items"]]
+
+  def uploading(self):
+    return [item for item in athenad.listUploadQueue() if item["current"]]
+
+  def test_priority(self):
+    paths = {
+      "/data/media/0/realdata/2021-01-01--00-00-00--0/qlog.bz2": LOG_PRIORITY,
+      "/data/media/0/realdata/2021-01-01--00-00-00--0/rlog.bz2": LOG_PRIORITY,
+      "/data/media/0/realdata/crash/error.txt": LOG_PRIORITY,
+      "/data/media/0/realdata/2021-01-01--00-00-00--0/qcamera.ts": QCAMERA_PRIORITY,
+      "/data/media/0/realdata/2021-01-01--00-00-00--0/fcamera.hevc": VIDEO_PRIORITY,
+      "/data/media/0/realdata/2021-01-01--00-00-00--0/dcamera.hevc": VIDEO_PRIORITY,
+    }
+    for path, priority in paths.items():
+      self.assertEqual(upload_priority(path), priority, path)
+
+  def test_queue_order(self):
+    q = UploadQueue()
+    items = [Item(f"/tmp/{i}/{name}", "") for i, name in enumerate(["fcamera.hevc", "qcamera.ts", "qlog.bz2", "rlog.bz2", "qcamera.ts"])]
+    for item in items:
+      q.put_nowait(item)
+
+    expected = [items[2], items[3], items[1], items[4], items[0]]
+    self.assertEqual(q.queue, expected)
+    self.assertEqual([q.get_nowait() for _ in items], expected)
+    self.assertTrue(q.empty())
+
+  def test_logs_pass_video(self):
+    # logs requested while a large video uploads go out on the other workers
+    video = self.make_file("2021-01-01--00-00-00--0", "fcamera.hevc", 8 * 1024 * 1024)
+    logs = [self.make_file(f"2021-01-01--00-00-00--{i}", "qlog.bz2", 16 * 1024) for i in range(8)]
+    self.start_workers(athenad.UPLOAD_WORKERS)
+    self.enqueue(video)
+    self.wait_for(lambda: len(self.uploading()) == 1)
+    self.enqueue(*logs)
+
+    self.wait_for(lambda: len(self.server.done) == len(logs) + 1)
+    done = sorted(self.server.done, key=self.server.done.get)
+    self.assertEqual(done[-1], f"/{video}")
+    self.assertEqual(set(done[:-1]), {f"/{fn}" for fn in logs})
+    self.wait_for(lambda: len(athenad.listUploadQueue()) == 0)
+    self.assertEqual(self.journal.items, {})
+
+  def test_list_upload_queue(self):
+    fns = [self.make_file(f"2021-01-01--00-00-00--{i}", "qcamera.ts", 2 * 1024 * 1024) for i in range(athenad.UPLOAD_WORKERS + 1)]
+    ids = self.enqueue(*fns)
+    self.start_workers(athenad.UPLOAD_WORKERS)
+
+    # one item per worker in flight, reporting progress, and the rest waiting
+    self.wait_for(lambda: len(self.uploading()) == athenad.UPLOAD_WORKERS and all(item["progress"] > 0 for item in self.uploading()))
+    items = athenad.listUploadQueue()
+    self.assertEqual(sorted(item["id"] for item in items), sorted(ids))
+    for item in items:
+      self.assertLessEqual(item["progress"], 1)
+      if not item["current"]:
+        self.assertEqual(item["progress"], 0)
+    self.assertEqual(sum(not item["current"] for item in items), 1)
+
+    self.wait_for(lambda: len(self.server.done) == len(fns))
+    self.wait_for(lambda: len(athenad.listUploadQueue()) == 0)
+
+  def test_cancel(self):
+    video = self.make_file("2021-01-01--00-00-00--0", "fcamera.hevc", 4 * 1024 * 1024)
+    logs = [self.make_file(f"2021-01-01--00-00-00--{i}", "qlog.bz2", 16 * 1024) for i in range(3)]
+    self.start_workers(1)
+    video_id, = self.enqueue(video)
+    self.wait_for(lambda: len(self.uploading()) == 1)
+
+    # uploads in flight can't be cancelled, queued ones are dropped from the queue and the journal
+    log_ids = self.enqueue(*logs)
+    self.assertEqual(athenad.cancelUpload(video_id), 404)
+    self.assertEqual(athenad.cancelUpload(log_ids[1]), {"success": 1})
+    self.assertNotIn(log_ids[1], [item["id"] for item in athenad.listUploadQueue()])
+    self.assertNotIn(log_ids[1], self.journal.items)
+
+    self.wait_for(lambda: len(self.server.done) == 3)
+    self.wait_for(lambda: athenad.upload_queue.empty() and len(self.uploading()) == 0)
+    self.assertEqual(set(self.server.done), {f"/{video}", f"/{logs[0]}", f"/{logs[2]}"})
+    self.assertNotIn(f"/{logs[1]}", self.server.started)
+    self.assertEqual(athenad.cancelled_uploads, set())
+    self.assertEqual(self.journal.items, {})
+
+  def test_retry(self):
+    fn = self.make_file("2021-01-01--00-00-00--0", "qlog.bz2", 16 * 1024)
+    self.server.fail[f"/{fn}"] = 500
+    self.start_workers(1)
+    upload_id, = self.enqueue(fn)
+
+    self.wait_for(lambda: f"/{fn}" in self.server.done)
+    self.assertEqual(self.server.started, [f"/{fn}"] * 2)
+    self.wait_for(lambda: upload_id not in self.journal.items)
+    self.assertEqual(athenad.listUploadQueue(), [])
+
+  def test_deadline(self):
+    # reads are held back by the rate limit, so the deadline passes between two of them
+    fn = self.make_file("2021-01-01--00-00-00--0", "qcamera.ts", 1024 * 1024)
+    with mock.patch.object(athenad, "upload_bandwidth", TokenBucket(256 * 1024, burst=64 * 1024)), \
+         mock.patch.object(athenad, "upload_timeout", return_value=0.2), \
+         mock.patch.object(athenad, "MAX_RETRY_COUNT", 1), \
+         mock.patch.object(athenad.cloudlog, "event") as event:
+      self.start_workers(1)
+      upload_id, = self.enqueue(fn)
+
+      # timed out once and retried, then dropped once out of retries
+      timeouts = lambda: sum(c.args[0] == "athena.upload_handler.timeout" for c in event.call_args_list)
+      self.wait_for(lambda: timeouts() == 2 and upload_id not in self.journal.items and len(self.uploading()) == 0)
+    self.assertEqual(self.server.started, [f"/{fn}"] * 2)
+    self.assertEqual(self.server.done, {})
+    self.assertTrue(athenad.upload_queue.empty())
+
+  def test_rate_limit(self):
+    rate = 2 * 1024 * 1024
+    fns = [self.make_file(f"2021-01-01--00-00-00--{i}", "qcamera.ts", 1024 * 1024) for i in range(3)]
+    with mock.patch.object(athenad, "upload_bandwidth", TokenBucket(rate, burst=64 * 1024)):
+      self.enqueue(*fns)
+      start = time.monotonic()
+      self.start_workers(3)
+      self.wait_for(lambda: len(self.server.done) == len(fns))
+    total = max(self.server.done.values()) - start
+
+    print(f"3 MB at {rate / 1024 / 1024:.0f} MB/s drained in {total:.2f} s")
+    self.assertGreater(total, 3 * 1024 * 1024 / rate * 0.9)
+
+  def test_token_bucket_unlimited(self):
+    bucket = TokenBucket()
+    start = time.monotonic()
+    for _ in range(1000):
+      bucket.consume(1024 * 1024)
+    self.assertLess(time.monotonic() - start, 0.1)
+
+
+if __name__ == "__main__":
+  unittest.main()
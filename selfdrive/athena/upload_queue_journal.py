@@ -0,0 +1,122 @@
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+COMPACT_MIN_RECORDS = 100
+
+
+class UploadQueueJournal:
+  """
+  Append-only log of upload queue changes, one checksummed json record per line.
+  Replaying it gives back the queued items in order. A torn last record from a
+  crash is dropped on load, and the file is rewritten with only the live items
+  once it holds more than twice as many records as items.
+  """
+  def __init__(self, path: str):
+    self.path = path
+    self.items: Dict[str, Dict[str, Any]] = OrderedDict()
+    self.n_records = 0
+    self.f = None
+    self.lock = threading.Lock()
+
+  @staticmethod
+  def encode(record):
+    dat = json.dumps(record, separators=(',', ':'))
+    return f"{zlib.crc32(dat.encode()):08x} {dat}\n".encode()
+
+  @staticmethod
+  def decode(line):
+    if not line.endswith(b"\n"):
+      raise ValueError("incomplete record")
+    crc, dat = line[:8], line[9:-1]
+    if int(crc, 16) != zlib.crc32(dat):
+      raise ValueError("bad checksum")
+    return json.loads(dat)
+
+  def apply(self, record):
+    if record['op'] == 'put':
+      self.items.pop(record['item']['id'], None)
+      self.items[record['item']['id']] = record['item']
+    elif record['op'] == 'remove':
+      self.items.pop(record['id'], None)
+    self.n_records += 1
+
+  def load(self) -> List[Dict[str, Any]]:
+    """Replays the journal and opens it for appending, returns the queued items"""
+    with self.lock:
+      self.items.clear()
+      self.n_records = 0
+      good_size = 0
+      try:
+        with open(self.path, "rb") as f:
+          for line in f:
+            try:
+              self.apply(self.decode(line))
+            except (ValueError, KeyError, TypeError):
+              break
+            good_size += len(line)
+      except FileNotFoundError:
+        pass
+
+      os.makedirs(os.path.dirname(self.path), exist_ok=True)
+      self.f = open(self.path, "ab")
+      # anything after the last good record is from an interrupted write
+      if self.f.tell() != good_size:
+        self.f.truncate(good_size)
+        self.f.seek(good_size)
+      return list(self.items.values())
+
+  def _append(self, record):
+    self.apply(record)
+    self.f.write(self.encode(record))
+    self.f.flush()
+    os.fsync(self.f.fileno())
+
+    if self.n_records > max(COMPACT_MIN_RECORDS, 2 * len(self.items)):
+      self._compact()
+
+  def put(self, item: Dict[str, Any]) -> None:
+    """Adds an item to the end of the queue, or moves it there with new values"""
+    with self.lock:
+      self._append({'op': 'put', 'item': item})
+
+  def remove(self, upload_id: str) -> None:
+    with self.lock:
+      if upload_id in self.items:
+        self._append({'op': 'remove', 'id': upload_id})
+
+  def compact(self, items=None) -> None:
+    """Rewrites the journal with only the current items, or with the given ones"""
+    with self.lock:
+      if items is not None:
+        self.items = OrderedDict((item['id'], item) for item in items)
+      self._compact()
+
+  def _compact(self):
+    tmp_path = self.path + ".tmp"
+    with open(tmp_path, "wb") as f:
+      for item in self.items.values():
+        f.write(self.encode({'op': 'put', 'item': item}))
+      f.flush()
+      os.fsync(f.fileno())
+    os.replace(tmp_path, self.path)
+
+    dir_fd = os.open(os.path.dirname(self.path), os.O_RDONLY)
+    try:
+      os.fsync(dir_fd)
+    finally:
+      os.close(dir_fd)
+
+    if self.f is not None:
+      self.f.close()
+    self.f = open(self.path, "ab")
+    self.n_records = len(self.items)
+
+  def close(self):
+    with self.lock:
+      if self.f is not None:
+        self.f.close()
+        self.f = None
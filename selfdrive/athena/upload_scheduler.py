@@ -0,0 +1,84 @@
+import heapq
+import itertools
+import os
+import queue
+import threading
+import time
+from typing import Optional
+
+# lower classes go first, logs are small and are what's usually needed
+LOG_PRIORITY = 0
+QCAMERA_PRIORITY = 1
+VIDEO_PRIORITY = 2
+
+LOG_NAMES = {"qlog", "rlog", "bootlog", "crash"}
+
+
+def upload_priority(path: str) -> int:
+  name = os.path.basename(path).split(".")[0]
+  if name in LOG_NAMES or os.path.basename(os.path.dirname(path)) in ("boot", "crash"):
+    return LOG_PRIORITY
+  if name == "qcamera":
+    return QCAMERA_PRIORITY
+  return VIDEO_PRIORITY
+
+
+class UploadQueue(queue.Queue):
+  """
+  Queue of upload items that hands out lower priority classes first, and items
+  of the same class in the order they were put. queue is a list of the waiting
+  items in that order, like queue.Queue's.
+  """
+  def _init(self, maxsize):
+    self.heap = []
+    self.counter = itertools.count()
+
+  def _qsize(self):
+    return len(self.heap)
+
+  def _put(self, item):
+    heapq.heappush(self.heap, (upload_priority(item.path), next(self.counter), item))
+
+  def _get(self):
+    return heapq.heappop(self.heap)[-1]
+
+  @property
+  def queue(self):
+    with self.mutex:
+      return [entry[-1] for entry in sorted(self.heap, key=lambda e: e[:2])]
+
+
+class TokenBucket:
+  """
+  Bandwidth limit shared between threads. consume() blocks until the bytes fit
+  in the rate, a rate of 0 is unlimited. Up to burst bytes can go through at
+  once after being idle.
+  """
+  def __init__(self, rate: float = 0, burst: Optional[float] = None):
+    self.lock = threading.Lock()
+    self.set_rate(rate, burst)
+
+  def set_rate(self, rate: float, burst: Optional[float] = None) -> None:
+    with self.lock:
+      self.rate = rate
+      self.burst = rate if burst is None else burst
+      self.tokens = self.burst
+      self.last_t = time.monotonic()
+
+  def consume(self, n: int, end_event: Optional[threading.Event] = None) -> None:
+    with self.lock:
+      if self.rate <= 0:
+        return
+
+      t = time.monotonic()
+      self.tokens = min(self.burst, self.tokens + (t - self.last_t) * self.rate)
+      self.last_t = t
+      # going into debt makes later callers wait for this one too
+      self.tokens -= n
+      wait = -self.tokens / self.rate
+
+    if wait > 0:
+      if end_event is not None:
+        end_event.wait(wait)
+      else:
+        time.sleep(wait)
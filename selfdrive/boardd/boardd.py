@@ -1,9 +1,12 @@
 # pylint: skip-file
 
 # Cython, now uses scons to build
-from selfdrive.boardd.boardd_api_impl import can_list_to_can_capnp
+from selfdrive.boardd.boardd_api_impl import can_list_to_can_capnp, can_capnp_to_list, can_capnp_to_arrays
 assert can_list_to_can_capnp
+assert can_capnp_to_list
+assert can_capnp_to_arrays
 
+# for already parsed capnp lists, prefer can_capnp_to_list on the serialized events
 def can_capnp_to_can_list(can, src_filter=None):
   ret = []
   for msg in can:
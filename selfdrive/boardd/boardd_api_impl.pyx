@@ -1,7 +1,14 @@
 # distutils: language = c++
 # cython: language_level=3
+from collections import namedtuple
+
+import numpy as np
+
+from libc.stdint cimport uint8_t, uint16_t, uint32_t, uint64_t
+from libc.string cimport memcpy
 from libcpp.vector cimport vector
 from libcpp.string cimport string
+from libcpp.utility cimport pair
 from libcpp cimport bool
 
 cdef struct can_frame:
@@ -11,6 +18,12 @@ cdef struct can_frame:
   long src
 
 cdef extern void can_list_to_can_capnp_cpp(const vector[can_frame] &can_list, string &out, bool sendCan, bool valid)
+cdef extern void can_capnp_to_can_list_cpp(const vector[string] &strings, vector[can_frame] &can_list, bool sendCan,
+                                           const vector[uint8_t] &src_filter,
+                                           const vector[pair[uint32_t, uint32_t]] &addr_ranges)
+
+# dat[dat_offsets[i]:dat_offsets[i + 1]] is the payload of frame i
+CanArrays = namedtuple("CanArrays", ["address", "busTime", "src", "dat", "dat_offsets"])
 
 def can_list_to_can_capnp(can_msgs, msgtype='can', valid=True):
   cdef vector[can_frame] can_list
@@ -26,3 +39,68 @@ def can_list_to_can_capnp(can_msgs, msgtype='can', valid=True):
   cdef string out
   can_list_to_can_capnp_cpp(can_list, out, msgtype == 'sendcan', valid)
   return out
+
+cdef vector[can_frame] parse_can_capnp(strings, src_filter, addr_filter, msgtype) except *:
+  cdef vector[string] s
+  s.reserve(len(strings))
+  for x in strings:
+    s.push_back(x)
+
+  cdef vector[uint8_t] flt
+  if src_filter is not None:
+    flt.resize(256, 0)
+    for src in src_filter:
+      # src is a UInt8, anything else can't match
+      if 0 <= src < 256:
+        flt[src] = 1
+
+  # addresses or inclusive (first, last) ranges
+  cdef vector[pair[uint32_t, uint32_t]] ranges
+  if addr_filter is not None:
+    for a in addr_filter:
+      first, last = a if isinstance(a, tuple) else (a, a)
+      ranges.push_back(pair[uint32_t, uint32_t](first, last))
+    if ranges.empty():
+      return vector[can_frame]()
+
+  cdef vector[can_frame] can_list
+  can_capnp_to_can_list_cpp(s, can_list, msgtype == 'sendcan', flt, ranges)
+  return can_list
+
+def can_capnp_to_list(strings, src_filter=None, msgtype='can', addr_filter=None):
+  """Same as boardd.can_capnp_to_can_list, over serialized events such as the ones
+  from messaging.drain_sock_raw. Frames from a src not in src_filter, or with an address
+  outside addr_filter (addresses or inclusive (first, last) ranges) are skipped in C++."""
+  cdef vector[can_frame] can_list = parse_can_capnp(strings, src_filter, addr_filter, msgtype)
+  return [(f.address, f.busTime, <bytes>f.dat, f.src) for f in can_list]
+
+def can_capnp_to_arrays(strings, src_filter=None, msgtype='can', addr_filter=None):
+  """Struct-of-arrays variant of can_capnp_to_list, payloads are packed into one buffer"""
+  cdef vector[can_frame] can_list = parse_can_capnp(strings, src_filter, addr_filter, msgtype)
+  cdef size_t n = can_list.size()
+
+  address = np.empty(n, dtype=np.uint32)
+  bus_time = np.empty(n, dtype=np.uint16)
+  src = np.empty(n, dtype=np.uint8)
+  dat_offsets = np.empty(n + 1, dtype=np.uint64)
+  cdef uint32_t[::1] address_v = address
+  cdef uint16_t[::1] bus_time_v = bus_time
+  cdef uint8_t[::1] src_v = src
+  cdef uint64_t[::1] offsets_v = dat_offsets
+
+  cdef size_t i, total = 0
+  for i in range(n):
+    address_v[i] = can_list[i].address
+    bus_time_v[i] = can_list[i].busTime
+    src_v[i] = can_list[i].src
+    offsets_v[i] = total
+    total += can_list[i].dat.size()
+  offsets_v[n] = total
+
+  dat = np.empty(total, dtype=np.uint8)
+  cdef uint8_t[::1] dat_v = dat
+  for i in range(n):
+    if can_list[i].dat.size():
+      memcpy(&dat_v[offsets_v[i]], can_list[i].dat.data(), can_list[i].dat.size())
+
+  return CanArrays(address, bus_time, src, dat, dat_offsets)
@@ -1,3 +1,5 @@
+#include <algorithm>
+
 #include "cereal/messaging/messaging.h"
 #include "panda.h"
 
@@ -22,4 +24,40 @@ void can_list_to_can_capnp_cpp(const std::vector<can_frame> &can_list, std::stri
   capnp::writeMessage(output_stream, msg);
 }
 
+// src_filter is indexed by src, addr_ranges holds inclusive address ranges, an empty filter keeps every frame
+void can_capnp_to_can_list_cpp(const std::vector<std::string> &strings, std::vector<can_frame> &can_list, bool sendCan,
+                               const std::vector<uint8_t> &src_filter,
+                               const std::vector<std::pair<uint32_t, uint32_t>> &addr_ranges) {
+  AlignedBuffer aligned_buf;
+  for (const auto &s : strings) {
+    capnp::FlatArrayMessageReader cmsg(aligned_buf.align(s.data(), s.size()));
+    cereal::Event::Reader event = cmsg.getRoot<cereal::Event>();
+    if (sendCan ? !event.isSendcan() : !event.isCan()) {
+      continue;
+    }
+
+    auto cans = sendCan ? event.getSendcan() : event.getCan();
+    can_list.reserve(can_list.size() + cans.size());
+    for (auto c : cans) {
+      uint8_t src = c.getSrc();
+      if (!src_filter.empty() && (src >= src_filter.size() || !src_filter[src])) {
+        continue;
+      }
+
+      uint32_t address = c.getAddress();
+      if (!addr_ranges.empty() && std::none_of(addr_ranges.begin(), addr_ranges.end(),
+                                               [=](const auto &r) { return r.first <= address && address <= r.second; })) {
+        continue;
+      }
+
+      auto dat = c.getDat();
+      can_frame &f = can_list.emplace_back();
+      f.address = address;
+      f.dat.assign((const char *)dat.begin(), dat.size());
+      f.busTime = c.getBusTime();
+      f.src = src;
+    }
+  }
+}
+
 }
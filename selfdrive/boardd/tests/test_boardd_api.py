@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+import random
+import time
+import unittest
+
+import numpy as np
+
+from cereal import log
+from selfdrive.boardd.boardd import can_list_to_can_capnp, can_capnp_to_can_list, can_capnp_to_list, can_capnp_to_arrays
+
+BUSES = (0, 1, 2, 128)
+
+
+def synthetic_capture(rng, n_events, frames_per_event, msgtype='can'):
+  events = []
+  for i in range(n_events):
+    can_msgs = [(rng.randint(0, 0x7ff), (i * 100 + j) % 0x10000, bytes(rng.randint(0, 255) for _ in range(rng.randint(0, 8))),
+                 rng.choice(BUSES)) for j in range(frames_per_event)]
+    events.append(can_list_to_can_capnp(can_msgs, msgtype=msgtype))
+  return events
+
+
+def parse_and_convert(events, src_filter=None, msgtype='can'):
+  ret = []
+  for e in events:
+    with log.Event.from_bytes(e) as evt:
+      ret.extend(can_capnp_to_can_list(getattr(evt, msgtype), src_filter))
+  return ret
+
+
+class TestBoarddApi(unittest.TestCase):
+
+  def setUp(self):
+    self.events = synthetic_capture(random.Random(0), 200, 40)
+
+  def test_parity(self):
+    for src_filter in (None, [0], (1, 128), set(), [2, 300]):
+      expected = parse_and_convert(self.events, src_filter)
+      self.assertEqual(can_capnp_to_list(self.events, src_filter), expected)
+
+      arrays = can_capnp_to_arrays(self.events, src_filter)
+      self.assertEqual(len(arrays.address), len(expected))
+      self.assertEqual(len(arrays.dat_offsets), len(expected) + 1)
+      for i, (address, bus_time, dat, src) in enumerate(expected):
+        self.assertEqual((arrays.address[i], arrays.busTime[i], arrays.src[i]), (address, bus_time, src))
+        self.assertEqual(arrays.dat[arrays.dat_offsets[i]:arrays.dat_offsets[i + 1]].tobytes(), dat)
+
+  def test_addr_filter(self):
+    for addr_filter in ([0x100], (0x10, (0x200, 0x2ff)), [(0x7e8, 0x7ef), (0x18daf100, 0x18daf1ff)], []):
+      ranges = [a if isinstance(a, tuple) else (a, a) for a in addr_filter]
+      for src_filter in (None, [0]):
+        expected = [f for f in parse_and_convert(self.events, src_filter) if any(lo <= f[0] <= hi for lo, hi in ranges)]
+        self.assertEqual(can_capnp_to_list(self.events, src_filter, addr_filter=addr_filter), expected)
+        self.assertEqual(len(can_capnp_to_arrays(self.events, src_filter, addr_filter=addr_filter).address), len(expected))
+
+  def test_msgtype(self):
+    sendcan = synthetic_capture(random.Random(1), 10, 10, msgtype='sendcan')
+    self.assertEqual(can_capnp_to_list(sendcan, msgtype='sendcan'), parse_and_convert(sendcan, msgtype='sendcan'))
+    self.assertEqual(can_capnp_to_list(sendcan), [])
+    self.assertEqual(len(can_capnp_to_list(sendcan + self.events)), 200 * 40)
+
+    arrays = can_capnp_to_arrays([])
+    self.assertEqual(len(arrays.address), 0)
+    self.assertTrue(np.array_equal(arrays.dat_offsets, [0]))
+
+  def test_benchmark(self):
+    events = synthetic_capture(random.Random(2), 2000, 60)
+    for name, fn in (("python", parse_and_convert), ("cython list", can_capnp_to_list), ("cython arrays", can_capnp_to_arrays)):
+      for src_filter in (None, [0]):
+        t = time.monotonic()
+        fn(events, src_filter)
+        print(f"{name}, filter {src_filter}: {(time.monotonic() - t) * 1000:.1f} ms for {len(events) * 60} frames")
+
+
+if __name__ == "__main__":
+  unittest.main()
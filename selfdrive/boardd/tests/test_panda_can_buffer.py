@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+import random
+import time
+import unittest
+
+from panda.python import DLC_TO_LEN, _pack_can_buffer, _unpack_can_buffer, pack_can_buffer, unpack_can_buffer
+
+
+def random_frames(rng, n, buses=(0, 1, 2), lengths=DLC_TO_LEN):
+  frames = []
+  for _ in range(n):
+    address = rng.randint(0, 0x7ff) if rng.random() > 0.2 else rng.randint(0x800, 0x1fffffff)
+    dat = bytes(rng.randint(0, 255) for _ in range(rng.choice(lengths)))
+    frames.append((address, 0, dat, rng.choice(buses)))
+  return frames
+
+
+def usb_packets(chunks):
+  # what the panda returns for a single bulk read of at most 256 packets, counters continue across chunks
+  stream = b''.join(chunk[i + 1:i + 64] for chunk in chunks for i in range(0, len(chunk), 64))[:256 * 63]
+  return b''.join(bytes([counter]) + stream[i:i + 63] for counter, i in enumerate(range(0, len(stream), 63)))
+
+
+class TestPandaCanBuffer(unittest.TestCase):
+
+  def setUp(self):
+    self.rng = random.Random(0)
+
+  def test_pack_parity(self):
+    for n in (0, 1, 2, 10, 19, 20, 21, 100, 1000):
+      for _ in range(5):
+        frames = random_frames(self.rng, n)
+        self.assertEqual(pack_can_buffer(frames), _pack_can_buffer(frames))
+
+    # exactly filling a chunk leaves a trailing empty one
+    frames = [(0x100, 0, b'\x00' * 8, 0)] * 20
+    self.assertEqual(pack_can_buffer(frames), _pack_can_buffer(frames))
+
+    with self.assertRaises(AssertionError):
+      pack_can_buffer([(0x100, 0, b'\x00' * 9, 0)])
+
+    # the bus is 3 bits of the header, larger ones must not wrap into the length code
+    for pack in (pack_can_buffer, _pack_can_buffer):
+      for bus in (-1, 8, 128):
+        with self.assertRaises(ValueError):
+          pack([(0x100, 0, b'\x00' * 8, 0), (0x200, 0, b'\x00' * 8, bus)])
+
+  def test_round_trip(self):
+    for n in (1, 10, 200):
+      frames = random_frames(self.rng, n)
+      dat = usb_packets(pack_can_buffer(frames)[:1])
+      expected = _unpack_can_buffer(dat)
+      self.assertEqual(unpack_can_buffer(dat), expected)
+      self.assertEqual([(a, 0, bytes(d), b) for a, _, d, b in expected], frames[:len(expected)])
+
+      dat = usb_packets(pack_can_buffer(frames))
+      self.assertEqual(unpack_can_buffer(dat), _unpack_can_buffer(dat))
+
+  def test_unpack_edge_cases(self):
+    frames = random_frames(self.rng, 300)
+    dat = bytearray(usb_packets(pack_can_buffer(frames)))
+    for case in (b'', dat[:1], dat[:64], dat[:100], dat[:-7]):
+      self.assertEqual(unpack_can_buffer(bytes(case)), _unpack_can_buffer(bytes(case)))
+
+    # lost packet, returned and rejected frames
+    lost = bytearray(dat)
+    lost[64 * 3] = 99
+    self.assertEqual(unpack_can_buffer(bytes(lost)), _unpack_can_buffer(bytes(lost)))
+    flagged = bytearray(usb_packets(pack_can_buffer(frames[:5])))
+    flagged[2] |= 0x3
+    self.assertEqual(unpack_can_buffer(bytes(flagged)), _unpack_can_buffer(bytes(flagged)))
+
+  def test_benchmark(self):
+    # classic CAN traffic on 3 buses
+    frames = random_frames(self.rng, 3000, lengths=(8, 8, 8, 6, 4))
+    dat = usb_packets(pack_can_buffer(frames))
+    for name, pack, unpack in (("python", _pack_can_buffer, _unpack_can_buffer), ("numpy", pack_can_buffer, unpack_can_buffer)):
+      t = time.monotonic()
+      for _ in range(10):
+        pack(frames)
+      pack_rate = 10 * len(frames) / (time.monotonic() - t)
+
+      t = time.monotonic()
+      for _ in range(10):
+        n = len(unpack(dat))
+      unpack_rate = 10 * n / (time.monotonic() - t)
+      print(f"{name}: pack {pack_rate:.0f} frames/s, unpack {unpack_rate:.0f} frames/s")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,5 +1,6 @@
 import os
-from typing import Dict, List
+from collections.abc import Mapping
+from typing import Any, Dict, List, Tuple
 
 from cereal import car
 from common.params import Params
@@ -67,9 +68,30 @@ def _get_interface_names() -> Dict[str, List[str]]:
   return brand_names
 
 
+class LazyInterfaces(Mapping):
+  """(CarInterface, CarController, CarState) by model name. A brand's modules
+  are imported the first time one of its models is looked up."""
+  def __init__(self, brand_names: Dict[str, List[str]]):
+    self.brand_names = brand_names
+    self.model_brands = {model_name: brand_name for brand_name, model_names in brand_names.items() for model_name in model_names}
+    self.loaded: Dict[str, Tuple[Any, Any, Any]] = {}
+
+  def __getitem__(self, model_name):
+    if model_name not in self.loaded:
+      brand_name = self.model_brands[model_name]
+      self.loaded.update(load_interfaces({brand_name: self.brand_names[brand_name]}))
+    return self.loaded[model_name]
+
+  def __iter__(self):
+    return iter(self.model_brands)
+
+  def __len__(self):
+    return len(self.model_brands)
+
+
 # imports from directory selfdrive/car/<name>/
 interface_names = _get_interface_names()
-interfaces = load_interfaces(interface_names)
+interfaces = LazyInterfaces(interface_names)
 
 
 # **** for use live only ****
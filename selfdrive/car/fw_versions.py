@@ -10,7 +10,7 @@ import panda.python.uds as uds
 from cereal import car
 from selfdrive.car.interfaces import get_interface_attr
 from selfdrive.car.fingerprints import FW_VERSIONS
-from selfdrive.car.isotp_parallel_query import IsoTpParallelQuery
+from selfdrive.car.isotp_parallel_query import IsoTpParallelQuery, run_parallel_queries
 from selfdrive.swaglog import cloudlog
 
 Ecu = car.CarParams.Ecu
@@ -198,34 +198,76 @@ def build_fw_dict(fw_versions):
   return fw_versions_dict
 
 
-def match_fw_to_car_fuzzy(fw_versions_dict, log=True, exclude=None):
-  """Do a fuzzy FW match. This function will return a match, and the number of firmware version
-  that were matched uniquely to that specific car. If multiple ECUs uniquely match to different cars
-  the match is rejected."""
+ESSENTIAL_ECUS = [Ecu.engine, Ecu.eps, Ecu.esp, Ecu.fwdRadar, Ecu.fwdCamera, Ecu.vsa]
+
+# These ECUs are known to be shared between models (EPS only between hybrid/ICE version)
+# Getting this exactly right isn't crucial, but excluding camera and radar makes it almost
+# impossible to get 3 matching versions, even if two models with shared parts are released at the same
+# time and only one is in our database.
+FUZZY_EXCLUDE_ECUS = [Ecu.fwdCamera, Ecu.fwdRadar, Ecu.eps, Ecu.debug]
+
+
+class FwIndex:
+  """Inverted index of a FW_VERSIONS database, so matching doesn't have to walk every known version"""
+  def __init__(self, fw_versions):
+    self.candidates = set(fw_versions)
+    self.addr_ecus = defaultdict(set)       # (addr, sub_addr) -> ECUs at that address
+    self.ecu_cars = defaultdict(set)        # ECU -> cars that check it
+    self.fw_cars = defaultdict(set)         # (ECU, fw) -> cars accepting fw on that ECU
+    self.essential_cars = defaultdict(set)  # ECU -> cars that are invalid if it doesn't respond
+    self.fuzzy = defaultdict(list)          # (addr, sub_addr, fw) -> cars, duplicates count as ambiguous
+
+    for candidate, fws in fw_versions.items():
+      for ecu, expected_versions in fws.items():
+        ecu_type = ecu[0]
+        if ecu_type not in FUZZY_EXCLUDE_ECUS:
+          for f in expected_versions:
+            self.fuzzy[(ecu[1], ecu[2], f)].append(candidate)
+
+        # Virtual debug ecu doesn't need to match the database
+        if ecu_type == Ecu.debug:
+          continue
+
+        self.addr_ecus[ecu[1:]].add(ecu)
+        self.ecu_cars[ecu].add(candidate)
+        for f in expected_versions:
+          self.fw_cars[(ecu, f)].add(candidate)
+        if ecu_type in ESSENTIAL_ECUS and None not in expected_versions:
+          self.essential_cars[ecu].add(candidate)
+
+
+_fw_index = None
+
+
+def get_fw_index():
+  """Returns the FwIndex of the combined FW_VERSIONS, built on first use.
+  Other databases can be matched against their own FwIndex."""
+  global _fw_index
+  if _fw_index is None:
+    _fw_index = FwIndex(FW_VERSIONS)
+  return _fw_index
 
-  # These ECUs are known to be shared between models (EPS only between hybrid/ICE version)
-  # Getting this exactly right isn't crucial, but excluding camera and radar makes it almost
-  # impossible to get 3 matching versions, even if two models with shared parts are released at the same
-  # time and only one is in our database.
-  exclude_types = [Ecu.fwdCamera, Ecu.fwdRadar, Ecu.eps, Ecu.debug]
 
-  # Build lookup table from (addr, subaddr, fw) to list of candidate cars
-  all_fw_versions = defaultdict(list)
-  for candidate, fw_by_addr in FW_VERSIONS.items():
-    if candidate == exclude:
-      continue
+def invalidate_fw_index():
+  """Drops the cached index, call after editing FW_VERSIONS in place"""
+  global _fw_index
+  _fw_index = None
 
-    for addr, fws in fw_by_addr.items():
-      if addr[0] in exclude_types:
-        continue
-      for f in fws:
-        all_fw_versions[(addr[1], addr[2], f)].append(candidate)
+
+def match_fw_to_car_fuzzy(fw_versions_dict, log=True, exclude=None, fw_index=None):
+  """Do a fuzzy FW match. This function will return a match, and the number of firmware version
+  that were matched uniquely to that specific car. If multiple ECUs uniquely match to different cars
+  the match is rejected."""
+  if fw_index is None:
+    fw_index = get_fw_index()
 
   match_count = 0
   candidate = None
   for addr, version in fw_versions_dict.items():
     # All cars that have this FW response on the specified address
-    candidates = all_fw_versions[(addr[0], addr[1], version)]
+    candidates = fw_index.fuzzy.get((addr[0], addr[1], version), [])
+    if exclude is not None:
+      candidates = [c for c in candidates if c != exclude]
 
     if len(candidates) == 1:
       match_count += 1
@@ -243,40 +285,25 @@ def match_fw_to_car_fuzzy(fw_versions_dict, log=True, exclude=None):
     return set()
 
 
-def match_fw_to_car_exact(fw_versions_dict):
+def match_fw_to_car_exact(fw_versions_dict, fw_index=None):
   """Do an exact FW match. Returns all cars that match the given
   FW versions for a list of "essential" ECUs. If an ECU is not considered
   essential the FW version can be missing to get a fingerprint, but if it's present it
   needs to match the database."""
-  invalid = []
-  candidates = FW_VERSIONS
-
-  for candidate, fws in candidates.items():
-    for ecu, expected_versions in fws.items():
-      ecu_type = ecu[0]
-      addr = ecu[1:]
-      found_version = fw_versions_dict.get(addr, None)
-      ESSENTIAL_ECUS = [Ecu.engine, Ecu.eps, Ecu.esp, Ecu.fwdRadar, Ecu.fwdCamera, Ecu.vsa]
-      #if ecu_type == Ecu.esp and candidate in [TOYOTA.RAV4, TOYOTA.COROLLA, TOYOTA.HIGHLANDER] and found_version is None:
-      #  continue
-
-      # On some Toyota models, the engine can show on two different addresses
-      #if ecu_type == Ecu.engine and candidate in [TOYOTA.CAMRY, TOYOTA.COROLLA_TSS2, TOYOTA.CHR, TOYOTA.LEXUS_IS] and found_version is None:
-      #  continue
+  if fw_index is None:
+    fw_index = get_fw_index()
 
-      # Ignore non essential ecus
-      if ecu_type not in ESSENTIAL_ECUS and found_version is None:
-        continue
-
-      # Virtual debug ecu doesn't need to match the database
-      if ecu_type == Ecu.debug:
-        continue
+  invalid = set()
+  for addr, version in fw_versions_dict.items():
+    for ecu in fw_index.addr_ecus.get(addr, ()):
+      invalid |= fw_index.ecu_cars[ecu] - fw_index.fw_cars.get((ecu, version), set())
 
-      if found_version not in expected_versions:
-        invalid.append(candidate)
-        break
+  # Essential ECUs that didn't respond
+  for ecu, cars in fw_index.essential_cars.items():
+    if ecu[1:] not in fw_versions_dict:
+      invalid |= cars
 
-  return set(candidates.keys()) - set(invalid)
+  return fw_index.candidates - invalid
 
 
 def match_fw_to_car(fw_versions, allow_fuzzy=True):
@@ -323,20 +350,28 @@ def get_fw_versions(logcan, sendcan, extra=None, timeout=0.1, debug=False, progr
 
   addrs.insert(0, parallel_addrs)
 
-  fw_versions = {}
-  for i, addr in enumerate(tqdm(addrs, disable=not progress)):
+  # Queries on different buses and addresses run concurrently, the rest in order
+  queries = []
+  for i, addr in enumerate(addrs):
     for addr_chunk in chunks(addr):
       for r in REQUESTS:
         try:
-          addrs = [(a, s) for (b, a, s) in addr_chunk if b in (r.brand, 'any')]
+          query_addrs = [(a, s) for (b, a, s) in addr_chunk if b in (r.brand, 'any')]
 
-          if addrs:
-            query = IsoTpParallelQuery(sendcan, logcan, r.bus, addrs, r.request, r.response, r.rx_offset, debug=debug)
+          if query_addrs:
+            query = IsoTpParallelQuery(sendcan, logcan, r.bus, query_addrs, r.request, r.response, r.rx_offset, debug=debug)
             t = 2 * timeout if i == 0 else timeout
-            fw_versions.update(query.get_data(t))
+            queries.append((query, t))
         except Exception:
           cloudlog.warning(f"FW query exception: {traceback.format_exc()}")
 
+  with tqdm(total=len(queries), disable=not progress) as pbar:
+    results = run_parallel_queries(logcan, queries, on_done=lambda _: pbar.update())
+
+  fw_versions = {}
+  for result in results:
+    fw_versions.update(result)
+
   # Build capnp list to put into CarParams
   car_fw = []
   for addr, version in fw_versions.items():
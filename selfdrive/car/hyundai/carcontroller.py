@@ -6,7 +6,7 @@ from common.numpy_fast import clip, interp
 from selfdrive.car import apply_std_steer_torque_limits, common_fault_avoidance
 from selfdrive.car.hyundai.hyundaican import create_lkas11, create_clu11, \
   create_scc11, create_scc12, create_scc13, create_scc14, \
-  create_mdps12, create_lfahda_mfc, create_hda_mfc
+  create_mdps12, create_lfahda_mfc, create_hda_mfc, set_checksums
 from selfdrive.car.hyundai.scc_smoother import SccSmoother
 from selfdrive.car.hyundai.values import Buttons, CAR, FEATURES, CarControllerParams
 from opendbc.can.packer import CANPacker
@@ -55,6 +55,7 @@ class CarController:
     self.car_fingerprint = CP.carFingerprint
     self.params = CarControllerParams(CP)
     self.packer = CANPacker(dbc_name)
+    set_checksums(self.packer, self.car_fingerprint)
     self.frame = 0
 
     self.apply_steer_last = 0
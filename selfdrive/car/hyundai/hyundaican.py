@@ -1,9 +1,34 @@
 import copy
 
-import crcmod
 from selfdrive.car.hyundai.values import CAR, CHECKSUM, FEATURES, EV_HYBRID_CAR
 
-hyundai_checksum = crcmod.mkCrcFun(0x11D, initCrc=0xFD, rev=False, xorOut=0xdf)
+
+def set_checksums(packer, car_fingerprint):
+  # the packer fills in these checksums, so each message below is packed only once
+  if car_fingerprint in CHECKSUM["crc8"]:
+    # CRC Checksum as seen on 2019 Hyundai Santa Fe
+    lkas11_checksum = "crc8"
+  elif car_fingerprint in CHECKSUM["6B"]:
+    # Checksum of first 6 Bytes, as seen on 2018 Kia Sorento
+    lkas11_checksum = "6B"
+  else:
+    # Checksum of first 6 Bytes and last Byte as seen on 2018 Kia Stinger
+    lkas11_checksum = "7B"
+
+  packer.set_checksum("LKAS11", "CF_Lkas_Chksum", lkas11_checksum)
+  packer.set_checksum("MDPS12", "CF_Mdps_Chksum2", "sum")
+  packer.set_checksum("SCC12", "CR_VSM_ChkSum", "nibble")
+
+
+def make_can_msg(packer, name, bus, values):
+  # packs through a template compiled once per signal set, instead of encoding and looking up names every frame
+  try:
+    tmpl = packer.compile(name, tuple(values))
+  except KeyError:
+    # a signal the DBC doesn't have, like from a stock message that changed. packing
+    # by name warns and skips it instead of taking down controlsd
+    return packer.make_can_msg(name, bus, values)
+  return packer.make_can_msg_compiled(tmpl, bus, values.values())
 
 
 def create_lkas11(packer, frame, car_fingerprint, apply_steer, steer_req,
@@ -19,7 +44,6 @@ def create_lkas11(packer, frame, car_fingerprint, apply_steer, steer_req,
   values["CF_Lkas_ActToi"] = steer_req
   values["CF_Lkas_ToiFlt"] = torque_fault  # seems to allow actuation on CR_Lkas_StrToqReq
   values["CF_Lkas_MsgCount"] = frame % 0x10
-  values["CF_Lkas_Chksum"] = 0
 
   if car_fingerprint in FEATURES["send_lfa_mfa"]:
     values["CF_Lkas_LdwsActivemode"] = int(left_lane) + (int(right_lane) << 1)
@@ -53,29 +77,14 @@ def create_lkas11(packer, frame, car_fingerprint, apply_steer, steer_req,
   if ldws_opt:
     values["CF_Lkas_LdwsOpt_USM"] = 3
 
-  dat = packer.make_can_msg("LKAS11", 0, values)[2]
-
-  if car_fingerprint in CHECKSUM["crc8"]:
-    # CRC Checksum as seen on 2019 Hyundai Santa Fe
-    dat = dat[:6] + dat[7:8]
-    checksum = hyundai_checksum(dat)
-  elif car_fingerprint in CHECKSUM["6B"]:
-    # Checksum of first 6 Bytes, as seen on 2018 Kia Sorento
-    checksum = sum(dat[:6]) % 256
-  else:
-    # Checksum of first 6 Bytes and last Byte as seen on 2018 Kia Stinger
-    checksum = (sum(dat[:6]) + dat[7]) % 256
-
-  values["CF_Lkas_Chksum"] = checksum
-
-  return packer.make_can_msg("LKAS11", bus, values)
+  return make_can_msg(packer, "LKAS11", bus, values)
 
 def create_clu11(packer, bus, clu11, button, speed):
   values = copy.copy(clu11)
   values["CF_Clu_CruiseSwState"] = button
   values["CF_Clu_Vanz"] = speed
   values["CF_Clu_AliveCnt1"] = (values["CF_Clu_AliveCnt1"] + 1) % 0x10
-  return packer.make_can_msg("CLU11", bus, values)
+  return make_can_msg(packer, "CLU11", bus, values)
 
 def create_lfahda_mfc(packer, enabled, active):
   values = {
@@ -90,7 +99,7 @@ def create_lfahda_mfc(packer, enabled, active):
   # VAL_ 1157 HDA_Icon_State 0 "no_hda" 1 "white_hda" 2 "green_hda";
   # VAL_ 1157 HDA_SysWarning 0 "no_message" 1 "driving_convenience_systems_cancelled" 2 "highway_drive_assist_system_cancelled";
 
-  return packer.make_can_msg("LFAHDA_MFC", 0, values)
+  return make_can_msg(packer, "LFAHDA_MFC", 0, values)
 
 def create_hda_mfc(packer, active, CS, left_lane, right_lane):
   values = copy.copy(CS.lfahda_mfc)
@@ -108,20 +117,15 @@ def create_hda_mfc(packer, active, CS, left_lane, right_lane):
   values["HDA_Icon_State"] = 2 if active > 1 else 0
   values["HDA_Chime"] = 1 if active > 1 else 0
 
-  return packer.make_can_msg("LFAHDA_MFC", 0, values)
+  return make_can_msg(packer, "LFAHDA_MFC", 0, values)
 
 def create_mdps12(packer, frame, mdps12):
   values = copy.copy(mdps12)
   values["CF_Mdps_ToiActive"] = 0
   values["CF_Mdps_ToiUnavail"] = 1
   values["CF_Mdps_MsgCount2"] = frame % 0x100
-  values["CF_Mdps_Chksum2"] = 0
 
-  dat = packer.make_can_msg("MDPS12", 2, values)[2]
-  checksum = sum(dat) % 256
-  values["CF_Mdps_Chksum2"] = checksum
-
-  return packer.make_can_msg("MDPS12", 2, values)
+  return make_can_msg(packer, "MDPS12", 2, values)
 
 def create_scc11(packer, frame, enabled, set_speed, lead_visible, scc_live, scc11, active_cam, stock_cam):
   values = copy.copy(scc11)
@@ -138,7 +142,7 @@ def create_scc11(packer, frame, enabled, set_speed, lead_visible, scc_live, scc1
     values["DriverAlertDisplay"] = 0
     #values["ACC_ObjStatus"] = 0
 
-  return packer.make_can_msg("SCC11", 0, values)
+  return make_can_msg(packer, "SCC11", 0, values)
 
 def create_scc12(packer, apply_accel, enabled, cnt, scc_live, scc12, long_override, brakepressed,
                  standstill, car_fingerprint):
@@ -167,15 +171,11 @@ def create_scc12(packer, apply_accel, enabled, cnt, scc_live, scc12, long_overri
     if not scc_live:
       values["ACCMode"] = 1 if enabled else 0  # 2 if gas padel pressed
 
-  values["CR_VSM_ChkSum"] = 0
-  dat = packer.make_can_msg("SCC12", 0, values)[2]
-  values["CR_VSM_ChkSum"] = 16 - sum([sum(divmod(i, 16)) for i in dat]) % 16
-
-  return packer.make_can_msg("SCC12", 0, values)
+  return make_can_msg(packer, "SCC12", 0, values)
 
 def create_scc13(packer, scc13):
   values = copy.copy(scc13)
-  return packer.make_can_msg("SCC13", 0, values)
+  return make_can_msg(packer, "SCC13", 0, values)
 
 def create_scc14(packer, enabled, e_vgo, standstill, accel, upper_jerk, lower_jerk, long_override, objgap, scc14):
   values = copy.copy(scc14)
@@ -191,7 +191,7 @@ def create_scc14(packer, enabled, e_vgo, standstill, accel, upper_jerk, lower_je
     values["ComfortBandUpper"] = 0.0
     values["ComfortBandLower"] = 0.0
 
-  return packer.make_can_msg("SCC14", 0, values)
+  return make_can_msg(packer, "SCC14", 0, values)
 
 def create_EpsDtc(packer, Eps_Dtc):
   values = copy.copy(mdps12)
@@ -7,6 +7,7 @@ from common.numpy_fast import clip, interp, mean
 from cereal import car
 from common.realtime import DT_CTRL
 from common.conversions import Conversions as CV
+from selfdrive.car.hyundai import hyundaican
 from selfdrive.car.hyundai.values import Buttons
 from common.params import Params
 from selfdrive.controls.lib.drive_helpers import V_CRUISE_MAX, V_CRUISE_MIN, V_CRUISE_DELTA_KM, V_CRUISE_DELTA_MI, \
@@ -130,7 +131,7 @@ class SccSmoother:
     values = copy.copy(clu11)
     values["CF_Clu_CruiseSwState"] = button
     values["CF_Clu_AliveCnt1"] = (values["CF_Clu_AliveCnt1"] + 1) % 0x10
-    return packer.make_can_msg("CLU11", bus, values)
+    return hyundaican.make_can_msg(packer, "CLU11", bus, values)
 
   def is_active(self, frame):
     return frame - self.started_frame <= max(ALIVE_COUNT) + max(WAIT_COUNT)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+import random
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import crcmod
+
+from opendbc.can.packer import CANPacker
+from selfdrive.car.hyundai import hyundaican
+from selfdrive.car.hyundai.hyundaican import create_lkas11, create_clu11, create_lfahda_mfc, create_hda_mfc, \
+  create_mdps12, create_scc11, create_scc12, create_scc13, create_scc14, set_checksums
+from selfdrive.car.hyundai.scc_smoother import SccSmoother
+from selfdrive.car.hyundai.values import CAR, CHECKSUM, DBC
+
+crc8 = crcmod.mkCrcFun(0x11D, initCrc=0xFD, rev=False, xorOut=0xdf)
+CARS = (CAR.SONATA, CAR.SORENTO, CAR.STINGER)
+
+
+# reference checksums, computed in python over the message packed with the checksum cleared
+def lkas11_checksum(car_fingerprint, dat):
+  if car_fingerprint in CHECKSUM["crc8"]:
+    return crc8(dat[:6] + dat[7:8])
+  elif car_fingerprint in CHECKSUM["6B"]:
+    return sum(dat[:6]) % 256
+  return (sum(dat[:6]) + dat[7]) % 256
+
+
+def mdps12_checksum(dat):
+  return sum(dat) % 256
+
+
+def scc12_checksum(dat):
+  return 16 - sum([sum(divmod(i, 16)) for i in dat]) % 16
+
+
+def double_pack(packer, name, sig_name, values, checksum):
+  values = dict(values, **{sig_name: 0})
+  values[sig_name] = checksum(packer.make_can_msg(name, 0, values)[2])
+  return packer.make_can_msg(name, 0, values)[2]
+
+
+def random_values(rng):
+  lkas11 = {
+    "CF_Lkas_LdwsLHWarning": rng.randint(0, 3),
+    "CF_Lkas_LdwsRHWarning": rng.randint(0, 3),
+    "CF_Lkas_SysWarning": rng.randint(0, 15),
+    "CF_Lkas_LdwsActivemode": rng.randint(0, 3),
+    "CF_Lkas_FcwOpt_USM": rng.randint(0, 7),
+    "CF_Lkas_LdwsOpt_USM": rng.randint(0, 7),
+    "CF_Lkas_MsgCount": rng.randint(0, 15),
+    "CR_Lkas_StrToqReq": rng.randint(-1024, 1023),
+    "CF_Lkas_Chksum": rng.randint(0, 255),
+  }
+  mdps12 = {
+    "CF_Mdps_ToiActive": rng.randint(0, 1),
+    "CF_Mdps_ToiFlt": rng.randint(0, 1),
+    "CF_Mdps_MsgCount2": rng.randint(0, 255),
+    "CF_Mdps_Chksum2": rng.randint(0, 255),
+  }
+  scc12 = {
+    "ACCMode": rng.randint(0, 2),
+    "aReqRaw": round(rng.uniform(-3.5, 2.), 2),
+    "aReqValue": round(rng.uniform(-3.5, 2.), 2),
+    "CR_VSM_Alive": rng.randint(0, 15),
+    "CR_VSM_ChkSum": rng.randint(0, 15),
+  }
+  return lkas11, mdps12, scc12
+
+
+def stock_values(packer, rng, name):
+  return {sig: rng.randint(0, 1) for sig in packer.compile(name).signal_names}
+
+
+def random_stock(packer, rng):
+  return [stock_values(packer, rng, name) for name in ("LKAS11", "CLU11", "LFAHDA_MFC", "MDPS12", "SCC11", "SCC12", "SCC13", "SCC14")]
+
+
+def create_all(packer, rng, frame, car_fingerprint, stock):
+  lkas11, clu11, lfahda_mfc, mdps12, scc11, scc12, scc13, scc14 = stock
+  CS = SimpleNamespace(lfahda_mfc=lfahda_mfc, out=SimpleNamespace(cruiseState=SimpleNamespace(enabledAcc=True)))
+  apply_accel = round(rng.uniform(-3.5, 2.), 2)
+  enabled = rng.random() > 0.5
+
+  return [
+    create_lkas11(packer, frame, car_fingerprint, rng.randint(-409, 409), enabled, False, lkas11,
+                  frame % 2, 3, enabled, True, False, False, False, 0, False),
+    create_clu11(packer, 0, clu11, 1, rng.randint(0, 120)),
+    SccSmoother.create_clu11(packer, 0, clu11, 2),
+    create_lfahda_mfc(packer, enabled, rng.randint(0, 2)),
+    create_hda_mfc(packer, rng.randint(0, 2), CS, True, False),
+    create_mdps12(packer, frame, mdps12),
+    create_scc11(packer, frame, enabled, rng.randint(30, 120), True, False, scc11, True, False),
+    create_scc12(packer, apply_accel, enabled, frame % 0x10, False, scc12, False, False, False, car_fingerprint),
+    create_scc13(packer, scc13),
+    create_scc14(packer, enabled, 10., False, apply_accel, 1., 1., False, 2, scc14),
+  ]
+
+
+def make_can_msg_dict(packer, name, bus, values):
+  return packer.make_can_msg(name, bus, values)
+
+
+class TestHyundaiCan(unittest.TestCase):
+
+  def setUp(self):
+    self.rng = random.Random(0)
+
+  def test_checksum_parity(self):
+    for car_fingerprint in CARS:
+      ref_packer = CANPacker(DBC[car_fingerprint]['pt'])
+      packer = CANPacker(DBC[car_fingerprint]['pt'])
+      set_checksums(packer, car_fingerprint)
+
+      for _ in range(1000):
+        lkas11, mdps12, scc12 = random_values(self.rng)
+        self.assertEqual(packer.make_can_msg("LKAS11", 0, lkas11)[2],
+                         double_pack(ref_packer, "LKAS11", "CF_Lkas_Chksum", lkas11, lambda dat: lkas11_checksum(car_fingerprint, dat)))
+        self.assertEqual(packer.make_can_msg("MDPS12", 0, mdps12)[2],
+                         double_pack(ref_packer, "MDPS12", "CF_Mdps_Chksum2", mdps12, mdps12_checksum))
+        self.assertEqual(packer.make_can_msg("SCC12", 0, scc12)[2],
+                         double_pack(ref_packer, "SCC12", "CR_VSM_ChkSum", scc12, scc12_checksum))
+
+  def test_create_messages(self):
+    for car_fingerprint in CARS:
+      packer = CANPacker(DBC[car_fingerprint]['pt'])
+      set_checksums(packer, car_fingerprint)
+
+      for frame in range(200):
+        lkas11, mdps12, scc12 = random_values(self.rng)
+
+        dat = create_lkas11(packer, frame, car_fingerprint, lkas11["CR_Lkas_StrToqReq"], True, False, lkas11,
+                            frame % 2, 3, True, True, False, False, False, 0, False)[2]
+        self.assertEqual(dat[6], lkas11_checksum(car_fingerprint, dat[:6] + b"\x00" + dat[7:]))
+
+        dat = create_mdps12(packer, frame, mdps12)[2]
+        self.assertEqual(dat[3], mdps12_checksum(dat[:3] + b"\x00" + dat[4:]))
+
+        dat = create_scc12(packer, scc12["aReqRaw"], True, frame % 0x10, False, scc12, False, False, False, car_fingerprint)[2]
+        self.assertEqual(dat[7] >> 4, scc12_checksum(dat[:7] + bytes([dat[7] & 0xF])) % 16)
+
+  def test_compiled_parity(self):
+    for car_fingerprint in CARS:
+      packer = CANPacker(DBC[car_fingerprint]['pt'])
+      set_checksums(packer, car_fingerprint)
+
+      for frame in range(200):
+        stock = random_stock(packer, self.rng)
+        compiled = create_all(packer, random.Random(frame), frame, car_fingerprint, stock)
+        with mock.patch.object(hyundaican, "make_can_msg", wraps=make_can_msg_dict) as dict_path:
+          expected = create_all(packer, random.Random(frame), frame, car_fingerprint, stock)
+        self.assertEqual(compiled, expected)
+        # every message, SccSmoother's included, went through the dict path
+        self.assertEqual(dict_path.call_count, len(expected))
+
+    packer = CANPacker(DBC[CAR.SONATA]['pt'])
+    tmpl = packer.compile("SCC13")
+    self.assertIs(packer.compile("SCC13"), tmpl)
+    with self.assertRaises(KeyError):
+      packer.compile("SCC13", ("NOT_A_SIGNAL",))
+    with self.assertRaises(ValueError):
+      packer.make_can_msg_compiled(tmpl, 0, [0.] * (len(tmpl.signal_names) + 1))
+
+    # unknown signals in a stock message are skipped, like the dict path does
+    scc13 = dict(stock_values(packer, self.rng, "SCC13"), NOT_A_SIGNAL=1)
+    self.assertEqual(hyundaican.make_can_msg(packer, "SCC13", 0, scc13), packer.make_can_msg("SCC13", 0, scc13))
+
+  def test_benchmark_create(self):
+    packer = CANPacker(DBC[CAR.SONATA]['pt'])
+    set_checksums(packer, CAR.SONATA)
+    stocks = [random_stock(packer, self.rng) for _ in range(1000)]
+
+    for name, make_can_msg in (("dict", make_can_msg_dict), ("compiled", hyundaican.make_can_msg)):
+      with mock.patch.object(hyundaican, "make_can_msg", make_can_msg):
+        rng = random.Random(0)
+        t = time.monotonic()
+        for frame, stock in enumerate(stocks):
+          create_all(packer, rng, frame, CAR.SONATA, stock)
+        print(f"create_* helpers, {name}: {(time.monotonic() - t) * 1e3:.2f} us/frame")
+
+  def test_benchmark(self):
+    ref_packer = CANPacker(DBC[CAR.SONATA]['pt'])
+    packer = CANPacker(DBC[CAR.SONATA]['pt'])
+    set_checksums(packer, CAR.SONATA)
+    lkas11, _, _ = random_values(self.rng)
+
+    def ref():
+      return double_pack(ref_packer, "LKAS11", "CF_Lkas_Chksum", lkas11, lambda dat: lkas11_checksum(CAR.SONATA, dat))
+
+    def new():
+      return packer.make_can_msg("LKAS11", 0, lkas11)
+
+    for name, fn in (("double pack", ref), ("single pack", new)):
+      t = time.monotonic()
+      for _ in range(10000):
+        fn()
+      print(f"LKAS11 {name}: {(time.monotonic() - t) / 10000 * 1e6:.2f} us")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -5,6 +5,7 @@ import time
 import numpy as np
 from abc import abstractmethod, ABC
 from difflib import SequenceMatcher
+from functools import lru_cache
 from json import load
 from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
 
@@ -565,14 +566,20 @@ class CarStateBase(ABC):
 
 # interface-specific helpers
 
+@lru_cache(maxsize=None)
+def get_brand_names() -> List[str]:
+  # brands are the folders in selfdrive/car with a values.py
+  car_dir = os.path.join(BASEDIR, 'selfdrive/car')
+  return sorted(name for name in os.listdir(car_dir) if os.path.isfile(os.path.join(car_dir, name, 'values.py')))
+
+
 def get_interface_attr(attr: str, combine_brands: bool = False, ignore_none: bool = False) -> Dict[str, Any]:
-  # read all the folders in selfdrive/car and return a dict where:
+  # read all the brand folders in selfdrive/car and return a dict where:
   # - keys are all the car models or brand names
   # - values are attr values from all car folders
   result = {}
-  for car_folder in sorted([x[0] for x in os.walk(BASEDIR + '/selfdrive/car')]):
+  for brand_name in get_brand_names():
     try:
-      brand_name = car_folder.split('/')[-1]
       brand_values = __import__(f'selfdrive.car.{brand_name}.values', fromlist=[attr])
       if hasattr(brand_values, attr) or not ignore_none:
         attr_data = getattr(brand_values, attr, None)
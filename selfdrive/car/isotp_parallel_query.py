@@ -5,7 +5,7 @@ from typing import Optional
 
 import cereal.messaging as messaging
 from selfdrive.swaglog import cloudlog
-from selfdrive.boardd.boardd import can_list_to_can_capnp
+from selfdrive.boardd.boardd import can_list_to_can_capnp, can_capnp_to_list
 from panda.python.uds import CanClient, IsoTpMessage, FUNCTIONAL_ADDRS, get_rx_addr_for_tx_addr
 
 
@@ -29,9 +29,21 @@ class IsoTpParallelQuery:
     self.msg_addrs = {tx_addr: get_rx_addr_for_tx_addr(tx_addr[0], rx_offset=response_offset) for tx_addr in self.real_addrs}
     self.msg_buffer = defaultdict(list)
 
-  def rx(self):
-    """Drain can socket and sort messages into buffers based on address"""
-    can_packets = messaging.drain_sock(self.logcan, wait_for_one=True)
+    # response addresses, filtered before any python objects are created
+    if functional_addr:
+      self.rx_addr_filter = [(0x7E8, 0x7EF), (0x18DAF100, 0x18DAF1FF)]
+    else:
+      self.rx_addr_filter = list(set(self.msg_addrs.values()))
+
+  def rx(self, can_packets=None, timeout=None):
+    """Drain can socket, or use the given packets, and sort messages into buffers based on address.
+    When draining with a timeout, keeps waiting until a response frame arrives or timeout seconds pass."""
+    if can_packets is None:
+      end_time = None if timeout is None else time.monotonic() + timeout
+      while True:
+        strings = messaging.drain_sock_raw(self.logcan, wait_for_one=True)
+        if self.rx_raw(strings) or not strings or end_time is None or time.monotonic() >= end_time:
+          return
 
     for packet in can_packets:
       for msg in packet.can:
@@ -43,6 +55,17 @@ class IsoTpParallelQuery:
           elif msg.address in self.msg_addrs.values():
             self.msg_buffer[msg.address].append((msg.address, msg.busTime, msg.dat, msg.src))
 
+  def rx_raw(self, strings):
+    """Sort serialized can events into buffers, returns the number of response frames"""
+    frames = can_capnp_to_list(strings, src_filter=(self.bus,), addr_filter=self.rx_addr_filter)
+    for frame in frames:
+      if self.functional_addr:
+        fn_addr = next(a for a in FUNCTIONAL_ADDRS if frame[0] - a <= 32)
+        self.msg_buffer[fn_addr].append(frame)
+      else:
+        self.msg_buffer[frame[0]].append(frame)
+    return len(frames)
+
   def _can_tx(self, tx_addr, dat, bus):
     """Helper function to send single message"""
     msg = [tx_addr, 0, dat, bus]
@@ -68,19 +91,28 @@ class IsoTpParallelQuery:
     return msgs
 
   def _drain_rx(self):
-    messaging.drain_sock(self.logcan)
+    messaging.drain_sock_raw(self.logcan)
     self.msg_buffer = defaultdict(list)
 
-  def get_data(self, timeout, total_timeout=None):
+  @property
+  def addr_keys(self):
+    """(bus, address) pairs this query sends or listens on, None stands for every address on the bus"""
+    if self.functional_addr:
+      return {(self.bus, None)}
+    return {(self.bus, tx_addr[0]) for tx_addr in self.real_addrs} | {(self.bus, rx_addr) for rx_addr in self.msg_addrs.values()}
+
+  def start(self, timeout, total_timeout=None):
+    """Send the first request to every ECU, responses are then handled by rx() and step()"""
     if total_timeout is None:
       total_timeout = 10 * timeout
 
-    self._drain_rx()
+    self.timeout = timeout
+    self.msg_buffer = defaultdict(list)
+    self.msgs = {}
+    self.request_counter = {}
+    self.request_done = {}
+    self.results = {}
 
-    # Create message objects
-    msgs = {}
-    request_counter = {}
-    request_done = {}
     for tx_addr, rx_addr in self.msg_addrs.items():
       # rx_addr not set when using functional tx addr
       id_addr = rx_addr or tx_addr[0]
@@ -94,55 +126,132 @@ class IsoTpParallelQuery:
       msg = IsoTpMessage(can_client, timeout=0, max_len=max_len, debug=self.debug)
       msg.send(self.request[0])
 
-      msgs[tx_addr] = msg
-      request_counter[tx_addr] = 0
-      request_done[tx_addr] = False
+      self.msgs[tx_addr] = msg
+      self.request_counter[tx_addr] = 0
+      self.request_done[tx_addr] = False
 
-    results = {}
+    # like a single query loop, any valid response gives every ECU another timeout seconds to answer
     start_time = time.monotonic()
-    last_response_time = start_time
-    while True:
-      self.rx()
-
-      if all(request_done.values()):
-        break
-
-      for tx_addr, msg in msgs.items():
-        try:
-          dat: Optional[bytes] = msg.recv()
-        except Exception:
-          cloudlog.exception("Error processing UDS response")
-          request_done[tx_addr] = True
-          continue
-
-        if not dat:
-          continue
-
-        counter = request_counter[tx_addr]
-        expected_response = self.response[counter]
-        response_valid = dat[:len(expected_response)] == expected_response
-
-        if response_valid:
-          last_response_time = time.monotonic()
-          if counter + 1 < len(self.request):
-            msg.send(self.request[counter + 1])
-            request_counter[tx_addr] += 1
-          else:
-            results[tx_addr] = dat[len(expected_response):]
-            request_done[tx_addr] = True
+    self.last_response_time = start_time
+    self.total_deadline = start_time + total_timeout
+
+  def step(self):
+    """Process buffered responses, send follow-up requests and expire ECUs once none answered for timeout.
+    Returns True once every ECU is done or the total timeout is hit."""
+    for tx_addr, msg in self.msgs.items():
+      if self.request_done[tx_addr]:
+        continue
+
+      try:
+        dat: Optional[bytes] = msg.recv()
+      except Exception:
+        cloudlog.exception("Error processing UDS response")
+        self.request_done[tx_addr] = True
+        continue
+
+      if not dat:
+        continue
+
+      counter = self.request_counter[tx_addr]
+      expected_response = self.response[counter]
+      response_valid = dat[:len(expected_response)] == expected_response
+
+      if response_valid:
+        self.last_response_time = time.monotonic()
+        if counter + 1 < len(self.request):
+          msg.send(self.request[counter + 1])
+          self.request_counter[tx_addr] += 1
         else:
-          request_done[tx_addr] = True
-          cloudlog.warning(f"iso-tp query bad response: 0x{dat.hex()}")
+          self.results[tx_addr] = dat[len(expected_response):]
+          self.request_done[tx_addr] = True
+      else:
+        self.request_done[tx_addr] = True
+        cloudlog.warning(f"iso-tp query bad response: 0x{dat.hex()}")
+
+    cur_time = time.monotonic()
+    if cur_time - self.last_response_time > self.timeout:
+      for tx_addr in self.msgs:
+        if self.request_counter[tx_addr] > 0 and not self.request_done[tx_addr]:
+          cloudlog.warning(f"iso-tp query timeout after receiving response: {tx_addr}")
+        self.request_done[tx_addr] = True
+
+    if cur_time > self.total_deadline and not all(self.request_done.values()):
+      cloudlog.warning("iso-tp query timeout while receiving data")
+      return True
+
+    return all(self.request_done.values())
+
+  def time_left(self):
+    """Seconds until the query times out, unless another response comes in first"""
+    return max(min(self.last_response_time + self.timeout, self.total_deadline) - time.monotonic(), 0.)
+
+  def get_data(self, timeout, total_timeout=None):
+    self._drain_rx()
+    self.start(timeout, total_timeout)
+
+    while not self.step():
+      self.rx(timeout=self.time_left())
+
+    return self.results
+
+
+def run_parallel_queries(logcan, queries, on_done=None):
+  """Run (IsoTpParallelQuery, timeout) pairs, concurrently where they use different buses or addresses.
+  Queries that share an address run one after another in the given order. Responses for all running
+  queries come from a single receive loop. Returns the results of each query, in order."""
+  messaging.drain_sock_raw(logcan)
+
+  results = [{} for _ in queries]
+  pending = list(range(len(queries)))
+  running = []
+  while pending or running:
+    busy = set()
+    for i in running:
+      busy |= queries[i][0].addr_keys
+
+    # a query waits for earlier ones it conflicts with, so requests to an ECU keep their order
+    blocked = set()
+    for i in list(pending):
+      query, timeout = queries[i]
+      keys = query.addr_keys
+      if _conflicts(keys, busy) or _conflicts(keys, blocked):
+        blocked |= keys
+        continue
+
+      pending.remove(i)
+      try:
+        query.start(timeout)
+      except Exception:
+        cloudlog.exception("iso-tp query exception")
+        if on_done is not None:
+          on_done(i)
+        continue
+      running.append(i)
+      busy |= keys
+
+    strings = messaging.drain_sock_raw(logcan, wait_for_one=True)
+    for i in list(running):
+      query = queries[i][0]
+      try:
+        query.rx_raw(strings)
+        done = query.step()
+      except Exception:
+        cloudlog.exception("iso-tp query exception")
+        done = True
+
+      if done:
+        results[i] = query.results
+        running.remove(i)
+        if on_done is not None:
+          on_done(i)
 
-      cur_time = time.monotonic()
-      if cur_time - last_response_time > timeout:
-        for tx_addr in msgs:
-          if (request_counter[tx_addr] > 0) and (not request_done[tx_addr]):
-            cloudlog.warning(f"iso-tp query timeout after receiving response: {tx_addr}")
-        break
+  return results
 
-      if cur_time - start_time > total_timeout:
-        cloudlog.warning("iso-tp query timeout while receiving data")
-        break
 
-    return results
+def _conflicts(keys, other_keys):
+  if keys & other_keys:
+    return True
+  # functional queries listen to everything on their bus
+  buses = {bus for bus, _ in keys}
+  other_buses = {bus for bus, _ in other_keys}
+  return any((bus, None) in other_keys for bus in buses) or any((bus, None) in keys for bus in other_buses)
@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+import subprocess
+import sys
+import unittest
+
+from selfdrive.car.car_helpers import interface_names, interfaces, load_interfaces
+from selfdrive.car.interfaces import get_brand_names
+
+
+class TestCarHelpers(unittest.TestCase):
+  def test_brands(self):
+    self.assertEqual(sorted(interface_names), get_brand_names())
+    self.assertIn("mock", interface_names)
+
+  def test_no_interfaces_imported(self):
+    code = "import sys, selfdrive.car.car_helpers; print(' '.join(m for m in sys.modules if m.rsplit('.', 1)[-1] in ('interface', 'carstate', 'carcontroller')))"
+    out = subprocess.check_output([sys.executable, "-c", code], text=True)
+    self.assertEqual(out.strip(), "")
+
+  def test_lazy_interfaces(self):
+    self.assertEqual(set(interfaces), {model for models in interface_names.values() for model in models})
+    self.assertEqual(len(interfaces), sum(len(models) for models in interface_names.values()))
+
+    expected = load_interfaces(interface_names)
+    for model_name in interfaces:
+      self.assertEqual(interfaces[model_name], expected[model_name], model_name)
+    self.assertEqual(interfaces["mock"][1:], (None, None))
+
+    with self.assertRaises(KeyError):
+      interfaces["NOT A CAR"]  # pylint: disable=pointless-statement
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+import random
+import time
+import unittest
+from collections import defaultdict
+
+from cereal import car
+from selfdrive.car.fingerprints import FW_VERSIONS
+from selfdrive.car.fw_versions import ESSENTIAL_ECUS, FUZZY_EXCLUDE_ECUS, FwIndex, get_fw_index, invalidate_fw_index, \
+  match_fw_to_car_exact, match_fw_to_car_fuzzy
+
+Ecu = car.CarParams.Ecu
+ECU_TYPES = [Ecu.engine, Ecu.eps, Ecu.esp, Ecu.fwdRadar, Ecu.fwdCamera, Ecu.transmission, Ecu.srs, Ecu.gateway, Ecu.debug]
+
+
+# matchers that walk the whole database on every call, as the indexed ones must agree with them
+def reference_fuzzy(fw_versions_dict, fw_db, exclude=None):
+  all_fw_versions = defaultdict(list)
+  for candidate, fw_by_addr in fw_db.items():
+    if candidate == exclude:
+      continue
+    for addr, fws in fw_by_addr.items():
+      if addr[0] in FUZZY_EXCLUDE_ECUS:
+        continue
+      for f in fws:
+        all_fw_versions[(addr[1], addr[2], f)].append(candidate)
+
+  match_count = 0
+  candidate = None
+  for addr, version in fw_versions_dict.items():
+    candidates = all_fw_versions[(addr[0], addr[1], version)]
+    if len(candidates) == 1:
+      match_count += 1
+      if candidate is None:
+        candidate = candidates[0]
+      elif candidate != candidates[0]:
+        return set()
+  return {candidate} if match_count >= 2 else set()
+
+
+def reference_exact(fw_versions_dict, fw_db):
+  invalid = []
+  for candidate, fws in fw_db.items():
+    for ecu, expected_versions in fws.items():
+      found_version = fw_versions_dict.get(ecu[1:], None)
+      if ecu[0] not in ESSENTIAL_ECUS and found_version is None:
+        continue
+      if ecu[0] == Ecu.debug:
+        continue
+      if found_version not in expected_versions:
+        invalid.append(candidate)
+        break
+  return set(fw_db.keys()) - set(invalid)
+
+
+def synthetic_db(rng, n_cars=150):
+  # cars of a brand share ECU addresses and some firmware, like the real database
+  db = dict(FW_VERSIONS)
+  for brand in range(10):
+    addrs = [(ecu_type, 0x700 + 0x10 * brand + i, rng.choice([None, None, 0x1])) for i, ecu_type in enumerate(ECU_TYPES)]
+    shared = [f'{brand}-shared-{i}'.encode() for i in range(5)]
+    for c in range(n_cars // 10):
+      db[f'CAR {brand} {c}'] = {addr: [f'{brand}-{c}-{addr[1]}-{v}'.encode() for v in range(rng.randint(1, 6))] +
+                                rng.sample(shared, rng.randint(0, 2))
+                                for addr in rng.sample(addrs, rng.randint(3, len(addrs)))}
+  return db
+
+
+def fw_queries(rng, db):
+  for candidate, fws in db.items():
+    fw_dict = {ecu[1:]: rng.choice(versions) for ecu, versions in fws.items() if versions}
+    yield fw_dict
+
+    # missing ECUs, unknown and swapped versions
+    partial = {addr: v for addr, v in fw_dict.items() if rng.random() > 0.3}
+    yield partial
+    yield {addr: (b'unknown' if rng.random() > 0.7 else v) for addr, v in fw_dict.items()}
+    other = db[rng.choice(list(db))]
+    yield {**fw_dict, **{ecu[1:]: rng.choice(versions) for ecu, versions in other.items() if versions and rng.random() > 0.5}}
+
+
+class TestFwFingerprint(unittest.TestCase):
+
+  def setUp(self):
+    self.rng = random.Random(0)
+    self.db = synthetic_db(self.rng)
+
+  def test_exact_parity(self):
+    index = FwIndex(self.db)
+    for fw_dict in fw_queries(self.rng, self.db):
+      self.assertEqual(match_fw_to_car_exact(fw_dict, fw_index=index), reference_exact(fw_dict, self.db))
+
+  def test_fuzzy_parity(self):
+    index = FwIndex(self.db)
+    for fw_dict in fw_queries(self.rng, self.db):
+      self.assertEqual(match_fw_to_car_fuzzy(fw_dict, log=False, fw_index=index), reference_fuzzy(fw_dict, self.db))
+      exclude = self.rng.choice(list(self.db))
+      self.assertEqual(match_fw_to_car_fuzzy(fw_dict, log=False, exclude=exclude, fw_index=index),
+                       reference_fuzzy(fw_dict, self.db, exclude=exclude))
+
+  def test_all_fw_versions(self):
+    for candidate, fws in FW_VERSIONS.items():
+      fw_dict = {ecu[1:]: versions[0] for ecu, versions in fws.items() if versions}
+      self.assertEqual(match_fw_to_car_exact(fw_dict), reference_exact(fw_dict, FW_VERSIONS))
+      self.assertEqual(match_fw_to_car_fuzzy(fw_dict, log=False), reference_fuzzy(fw_dict, FW_VERSIONS))
+      self.assertIn(candidate, match_fw_to_car_exact(fw_dict))
+
+  def test_index_cache(self):
+    self.addCleanup(invalidate_fw_index)
+    car_name = 'CAR 0 0'
+    FW_VERSIONS[car_name] = {ecu: list(versions) for ecu, versions in self.db[car_name].items()}
+    self.addCleanup(FW_VERSIONS.pop, car_name)
+    invalidate_fw_index()
+    index = get_fw_index()
+    self.assertIs(get_fw_index(), index)
+
+    ecu = next(ecu for ecu in FW_VERSIONS[car_name] if ecu[0] != Ecu.debug)
+    fw_dict = {e[1:]: versions[0] for e, versions in FW_VERSIONS[car_name].items() if versions}
+    fw_dict[ecu[1:]] = b'new-version'
+    self.assertNotIn(car_name, match_fw_to_car_exact(fw_dict))
+
+    # an edit that keeps the number of cars is only picked up once the index is dropped
+    FW_VERSIONS[car_name][ecu].append(b'new-version')
+    self.assertIs(get_fw_index(), index)
+    invalidate_fw_index()
+    self.assertIsNot(get_fw_index(), index)
+    self.assertIn(car_name, match_fw_to_car_exact(fw_dict))
+
+  def test_benchmark(self):
+    queries = list(fw_queries(self.rng, self.db))
+    index = FwIndex(self.db)
+    for name, exact, fuzzy in (("reference", lambda q: reference_exact(q, self.db), lambda q: reference_fuzzy(q, self.db)),
+                               ("indexed", lambda q: match_fw_to_car_exact(q, fw_index=index),
+                                lambda q: match_fw_to_car_fuzzy(q, log=False, fw_index=index))):
+      t = time.monotonic()
+      for q in queries:
+        exact(q)
+        fuzzy(q)
+      print(f"{name}: {(time.monotonic() - t) / len(queries) * 1e6:.1f} us per exact + fuzzy match")
+
+
+if __name__ == "__main__":
+  unittest.main()
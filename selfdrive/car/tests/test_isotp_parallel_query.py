@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+import threading
+import time
+import unittest
+
+import cereal.messaging as messaging
+from selfdrive.car.isotp_parallel_query import IsoTpParallelQuery, run_parallel_queries
+
+REQUEST = b'\x22\xf1\x81'
+RESPONSE = b'\x62\xf1\x81'
+RESPONSE_DELAY = 0.02
+
+# (bus, tx address): firmware version, small enough for a single frame response
+ECUS = {
+  (0, 0x7e0): b'\x01\x02',
+  (0, 0x7e1): b'\x03\x04',
+  (1, 0x7e0): b'\x05\x06',
+  (1, 0x750): b'\x07\x08',
+  (1, 0x7b0): b'\x09\x0a',
+}
+
+
+class EcuResponder(threading.Thread):
+  """Answers single frame UDS requests on sendcan after a fixed delay, like a slow ECU.
+  Keeps a log of the requests and responses, and the most requests it had outstanding at once."""
+  def __init__(self, ecus, delay, noise=0):
+    super().__init__(daemon=True)
+    self.ecus = ecus
+    self.delay = delay
+    self.delays = {}  # (bus, tx address): delay of a slower ECU
+    self.noise = noise
+    self.lock = threading.Lock()
+    self.log = []  # ('request' or 'response', (bus, tx address))
+    self.max_outstanding = 0
+    self.stop_event = threading.Event()
+    self.sendcan = messaging.sub_sock('sendcan', timeout=10)
+    self.can = messaging.pub_sock('can')
+
+  def run(self):
+    pending = []
+    while not self.stop_event.is_set():
+      for packet in messaging.drain_sock(self.sendcan):
+        for msg in packet.sendcan:
+          fw = self.ecus.get((msg.src, msg.address))
+          if fw is not None and msg.dat[1:1 + len(REQUEST)] == REQUEST:
+            dat = RESPONSE + fw
+            delay = self.delays.get((msg.src, msg.address), self.delay)
+            pending.append((time.monotonic() + delay, msg.address + 8, msg.src, bytes([len(dat)]) + dat))
+            with self.lock:
+              self.log.append(('request', (msg.src, msg.address)))
+              self.max_outstanding = max(self.max_outstanding, len(pending))
+
+      now = time.monotonic()
+      due = [p for p in pending if p[0] <= now]
+      pending = [p for p in pending if p[0] > now]
+      with self.lock:
+        self.log += [('response', (bus, address - 8)) for _, address, bus, _ in due]
+
+      # also publish without responses, a bus is never quiet in a car
+      can = messaging.new_message('can', len(due) + self.noise)
+      for i, (_, address, bus, dat) in enumerate(due):
+        can.can[i].address = address
+        can.can[i].dat = dat.ljust(8, b'\x00')
+        can.can[i].src = bus
+      for i in range(len(due), len(due) + self.noise):
+        can.can[i].address = 0x100 + i
+        can.can[i].dat = b'\x00' * 8
+        can.can[i].src = i % 3
+      self.can.send(can.to_bytes())
+      time.sleep(0.001)
+
+
+class PollingQuery(IsoTpParallelQuery):
+  """Parses every can message in python and polls, like rx used to"""
+  def rx(self, can_packets=None, timeout=None):
+    super().rx(messaging.drain_sock(self.logcan, wait_for_one=True))
+
+
+class TestIsoTpParallelQuery(unittest.TestCase):
+  noise = 0
+
+  def setUp(self):
+    self.sendcan = messaging.pub_sock('sendcan')
+    self.logcan = messaging.sub_sock('can', timeout=10)
+    self.responder = EcuResponder(ECUS, RESPONSE_DELAY, self.noise)
+    self.responder.start()
+    time.sleep(0.2)
+
+  def tearDown(self):
+    self.responder.stop_event.set()
+    self.responder.join()
+
+  def make_queries(self):
+    # one query per ECU, like the sub address queries in get_fw_versions
+    return [(IsoTpParallelQuery(self.sendcan, self.logcan, bus, [addr], [REQUEST], [RESPONSE]), 0.1) for bus, addr in ECUS]
+
+  def expected(self):
+    return [{(addr, None): fw} for (_, addr), fw in ECUS.items()]
+
+  def reset_responder(self):
+    with self.responder.lock:
+      self.responder.log.clear()
+      self.responder.max_outstanding = 0
+
+  def test_sequential_vs_scheduled(self):
+    start = time.monotonic()
+    sequential = [query.get_data(timeout) for query, timeout in self.make_queries()]
+    sequential_time = time.monotonic() - start
+    self.assertEqual(sequential, self.expected())
+    self.assertEqual(self.responder.max_outstanding, 1)
+
+    # every ECU has a request outstanding before the first one answers
+    self.reset_responder()
+    start = time.monotonic()
+    scheduled = run_parallel_queries(self.logcan, self.make_queries())
+    scheduled_time = time.monotonic() - start
+    self.assertEqual(scheduled, self.expected())
+    self.assertEqual(self.responder.max_outstanding, len(ECUS))
+
+    print(f"sequential: {sequential_time * 1000:.1f} ms, scheduled: {scheduled_time * 1000:.1f} ms")
+
+  def test_conflicting_queries_run_in_order(self):
+    # the same ECU twice, the second query has to wait for the first
+    queries = self.make_queries()[:2]
+    queries.insert(1, (IsoTpParallelQuery(self.sendcan, self.logcan, 0, [0x7e0], [REQUEST], [RESPONSE]), 0.1))
+    self.reset_responder()
+    self.assertEqual(run_parallel_queries(self.logcan, queries), [self.expected()[0], self.expected()[0], self.expected()[1]])
+
+    # the other ECU is queried alongside the first, the repeated query only goes out after its answer
+    with self.responder.lock:
+      log = list(self.responder.log)
+    self.assertEqual([event for event, ecu in log if ecu == (0, 0x7e0)], ['request', 'response', 'request', 'response'])
+    self.assertEqual(self.responder.max_outstanding, 2)
+
+  def test_missing_ecu_times_out(self):
+    queries = [(IsoTpParallelQuery(self.sendcan, self.logcan, 2, [0x7e0], [REQUEST], [RESPONSE]), 0.1)] + self.make_queries()
+    self.reset_responder()
+    results = run_parallel_queries(self.logcan, queries)
+    self.assertEqual(results, [{}] + self.expected())
+
+    # the other ECUs were queried alongside it, not after it timed out
+    with self.responder.lock:
+      log = list(self.responder.log)
+    self.assertEqual(log[:len(ECUS)], [('request', ecu) for ecu in ECUS])
+    self.assertEqual(self.responder.max_outstanding, len(ECUS))
+
+  def test_slow_ecu_after_response(self):
+    # any response restarts the timeout for the whole query, so an ECU answering later than
+    # timeout after the request still counts when another one answered in between
+    timeout = 0.2
+    self.responder.delays = {(0, 0x7e0): 0.15, (0, 0x7e1): 0.3}
+    query = IsoTpParallelQuery(self.sendcan, self.logcan, 0, [0x7e0, 0x7e1], [REQUEST], [RESPONSE])
+    self.assertEqual(query.get_data(timeout), {(0x7e0, None): ECUS[(0, 0x7e0)], (0x7e1, None): ECUS[(0, 0x7e1)]})
+
+
+class TestIsoTpParallelQueryBusyBus(TestIsoTpParallelQuery):
+  noise = 100
+
+  def test_busy_bus(self):
+    for name, cls in (("polling", PollingQuery), ("filtered", IsoTpParallelQuery)):
+      results = []
+      start, start_cpu = time.monotonic(), time.thread_time()
+      for bus, addr in ECUS:
+        results.append(cls(self.sendcan, self.logcan, bus, [addr], [REQUEST], [RESPONSE]).get_data(0.1))
+      latency = (time.monotonic() - start) / len(ECUS)
+      cpu = (time.thread_time() - start_cpu) / len(ECUS)
+
+      print(f"{name}: {latency * 1000:.1f} ms latency, {cpu * 1000:.2f} ms cpu per query")
+      self.assertEqual(results, self.expected())
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -6,12 +6,13 @@ from numbers import Number
 from cereal import car, log
 from common.numpy_fast import clip, interp
 from common.realtime import sec_since_boot, config_realtime_process, Priority, Ratekeeper, DT_CTRL
-from common.profiler import Profiler
+from common.profiler import Profiler, StageTimer
 from common.params import Params
 import cereal.messaging as messaging
 from common.conversions import Conversions as CV
 from panda import ALTERNATIVE_EXPERIENCE
 from selfdrive.swaglog import cloudlog
+from selfdrive.statsd import statlog
 from selfdrive.boardd.boardd import can_list_to_can_capnp
 from selfdrive.car.car_helpers import get_car, get_startup_event, get_one_can
 from selfdrive.controls.lib.lane_planner import CAMERA_OFFSET
@@ -39,6 +40,7 @@ SR_SCALE_V = [16.3, 16.1, 15.8, 15.5, 15.3]
 SOFT_DISABLE_TIME = 3  # seconds
 LDW_MIN_SPEED = 31 * CV.MPH_TO_MS
 LANE_DEPARTURE_THRESHOLD = 0.1
+STAGE_TIMER_EXPORT_FRAMES = int(10. / DT_CTRL)  # report step stage latencies every 10s
 
 REPLAY = "REPLAY" in os.environ
 SIMULATION = "SIMULATION" in os.environ
@@ -234,6 +236,7 @@ class Controls:
     # controlsd is driven by can recv, expected at 100Hz
     self.rk = Ratekeeper(100, print_delay_threshold=None)
     self.prof = Profiler(False)  # off by default
+    self.stage_timer = StageTimer(["data_sample", "update_events", "state_transition", "state_control", "publish_logs"])
 
   def update_events(self, CS):
     """Compute carEvents from carState"""
@@ -901,28 +904,34 @@ class Controls:
   def step(self):
     start_time = sec_since_boot()
     self.prof.checkpoint("Ratekeeper", ignore=True)
+    self.stage_timer.start()
 
     # Sample data from sockets and get a carState
     CS = self.data_sample()
     cloudlog.timestamp("Data sampled")
     self.prof.checkpoint("Sample")
+    self.stage_timer.lap("data_sample")
 
     self.update_events(CS)
     cloudlog.timestamp("Events updated")
+    self.stage_timer.lap("update_events")
 
     if not self.read_only and self.initialized:
       # Update control state
       self.state_transition(CS)
       self.prof.checkpoint("State transition")
+      self.stage_timer.lap("state_transition")
 
     # Compute actuators (runs PID loops and lateral MPC)
     CC, lac_log = self.state_control(CS)
 
     self.prof.checkpoint("State Control")
+    self.stage_timer.lap("state_control")
 
     # Publish data
     self.publish_logs(CS, start_time, CC, lac_log)
     self.prof.checkpoint("Sent")
+    self.stage_timer.lap("publish_logs")
 
     self.update_button_timers(CS.buttonEvents)
     self.CS_prev = CS
@@ -933,6 +942,9 @@ class Controls:
       self.rk.monitor_time()
       self.prof.display()
 
+      if self.rk.frame % STAGE_TIMER_EXPORT_FRAMES == 0:
+        self.stage_timer.export(statlog, "controlsd")
+
 def main(sm=None, pm=None, logcan=None):
   controls = Controls(sm, pm, logcan)
   controls.controlsd_thread()
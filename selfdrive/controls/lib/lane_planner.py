@@ -1,7 +1,7 @@
 import numpy as np
 from cereal import log
 from common.filter_simple import FirstOrderFilter
-from common.numpy_fast import interp, clip, mean
+from common.numpy_fast import interp, clip, mean, Interpolator
 from common.realtime import DT_MDL
 from selfdrive.hardware import EON, TICI
 from selfdrive.swaglog import cloudlog
@@ -22,6 +22,11 @@ else:
   CAMERA_OFFSET = 0.0
   PATH_OFFSET = 0.0
 
+# trust in lanelines falls off with their width and uncertainty
+_WIDTH_PROB_MOD = Interpolator([4.0, 5.0], [1.0, 0.0])
+_STD_PROB_MOD = Interpolator([.15, .3], [1.0, 0.0])
+_SPEED_LANE_WIDTH = Interpolator([0., 31.], [2.8, 3.5])
+
 class LanePlanner:
   def __init__(self, wide_camera=False):
     self.ll_t = np.zeros((TRAJECTORY_SIZE,))
@@ -77,14 +82,14 @@ class LanePlanner:
     prob_mods = []
     for t_check in (0.0, 1.5, 3.0):
       width_at_t = interp(t_check * (v_ego + 7), self.ll_x, width_pts)
-      prob_mods.append(interp(width_at_t, [4.0, 5.0], [1.0, 0.0]))
+      prob_mods.append(_WIDTH_PROB_MOD(width_at_t))
     mod = min(prob_mods)
     l_prob *= mod
     r_prob *= mod
 
     # Reduce reliance on uncertain lanelines
-    l_std_mod = interp(self.lll_std, [.15, .3], [1.0, 0.0])
-    r_std_mod = interp(self.rll_std, [.15, .3], [1.0, 0.0])
+    l_std_mod = _STD_PROB_MOD(self.lll_std)
+    r_std_mod = _STD_PROB_MOD(self.rll_std)
     l_prob *= l_std_mod
     r_prob *= r_std_mod
 
@@ -92,7 +97,7 @@ class LanePlanner:
     self.lane_width_certainty.update(l_prob * r_prob)
     current_lane_width = abs(self.rll_y[0] - self.lll_y[0])
     self.lane_width_estimate.update(current_lane_width)
-    speed_lane_width = interp(v_ego, [0., 31.], [2.8, 3.5])
+    speed_lane_width = _SPEED_LANE_WIDTH(v_ego)
     self.lane_width = self.lane_width_certainty.x * self.lane_width_estimate.x + \
                       (1 - self.lane_width_certainty.x) * speed_lane_width
 
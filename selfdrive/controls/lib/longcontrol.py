@@ -1,5 +1,5 @@
 from cereal import car
-from common.numpy_fast import clip, interp
+from common.numpy_fast import clip, interp, Interpolator
 from common.realtime import DT_CTRL
 from selfdrive.controls.lib.drive_helpers import CONTROL_N, apply_deadzone
 from selfdrive.controls.lib.pid import PIDController
@@ -60,6 +60,7 @@ class LongControl:
                              k_f=CP.longitudinalTuning.kf,
                              k_d=(CP.longitudinalTuning.kdBP, CP.longitudinalTuning.kdV),
                              derivative_period=0.5, rate=1 / DT_CTRL)
+    self.deadzone = Interpolator(CP.longitudinalTuning.deadzoneBP, CP.longitudinalTuning.deadzoneV)
     self.v_pid = 0.0
     self.last_output_accel = 0.0
     
@@ -119,7 +120,7 @@ class LongControl:
       # Toyota starts braking more when it thinks you want to stop
       # Freeze the integrator so we don't accelerate to compensate, and don't allow positive acceleration
       prevent_overshoot = not self.CP.stoppingControl and CS.vEgo < 1.5 and v_target_1sec < 0.7 and v_target_1sec < self.v_pid
-      deadzone = interp(CS.vEgo, self.CP.longitudinalTuning.deadzoneBP, self.CP.longitudinalTuning.deadzoneV)
+      deadzone = self.deadzone(CS.vEgo)
       freeze_integrator = prevent_overshoot
 
       error = self.v_pid - CS.vEgo
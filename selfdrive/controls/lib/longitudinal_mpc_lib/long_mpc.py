@@ -4,7 +4,7 @@ import numpy as np
 
 from cereal import log
 from common.realtime import sec_since_boot
-from common.numpy_fast import clip, interp
+from common.numpy_fast import clip, Interpolator
 from common.realtime import DT_MDL
 from selfdrive.swaglog import cloudlog
 from selfdrive.modeld.constants import index_function
@@ -56,6 +56,9 @@ CRUISE_GAP_V = [1.0, 1.3, 1.8, 2.10]
 AUTO_TR_BP = [0., 30.*CV.KPH_TO_MS, 70.*CV.KPH_TO_MS, 110.*CV.KPH_TO_MS]
 AUTO_TR_V = [1.1, 1.2, 1.3, 1.45]
 
+_CRUISE_GAP_T_FOLLOW = Interpolator(CRUISE_GAP_BP, CRUISE_GAP_V)
+_AUTO_TR_T_FOLLOW = Interpolator(AUTO_TR_BP, AUTO_TR_V)
+
 AUTO_TR_CRUISE_GAP = 4
 
 # Fewer timestamps don't hurt performance and lead to
@@ -398,9 +401,9 @@ class LongitudinalMpc:
 
     cruise_gap = int(clip(carstate.cruiseGap, 1., 4.))
     if cruise_gap == AUTO_TR_CRUISE_GAP:
-      self.t_follow = interp(carstate.vEgo, AUTO_TR_BP, AUTO_TR_V)
+      self.t_follow = _AUTO_TR_T_FOLLOW(carstate.vEgo)
     else:
-      self.t_follow = interp(float(cruise_gap), CRUISE_GAP_BP, CRUISE_GAP_V)
+      self.t_follow = _CRUISE_GAP_T_FOLLOW(float(cruise_gap))
     self.t_follow *= get_T_FOLLOW_Factor(personality)
     stop_distance = ntune_scc_get('stopDistance')
     comfort_brake = ntune_scc_get('comfortBrake')
@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 import math
 import numpy as np
-from common.numpy_fast import clip, interp
+from common.numpy_fast import clip, interp, Interpolator
 from cereal import log
 
 import cereal.messaging as messaging
@@ -29,9 +29,12 @@ A_CRUISE_MAX_BP = [0., 10.0, 25., 40.]
 # Lookup table for turns
 _A_TOTAL_MAX_V = [1.7, 3.2]
 _A_TOTAL_MAX_BP = [20., 40.]
+
+_A_CRUISE_MAX = Interpolator(A_CRUISE_MAX_BP, A_CRUISE_MAX_VALS)
+_A_TOTAL_MAX = Interpolator(_A_TOTAL_MAX_BP, _A_TOTAL_MAX_V)
   
 def get_max_accel(v_ego):
-  return interp(v_ego, A_CRUISE_MAX_BP, A_CRUISE_MAX_VALS)
+  return _A_CRUISE_MAX(v_ego)
 
 def limit_accel_in_turns(v_ego, angle_steers, a_target, CP):
   """
@@ -41,7 +44,7 @@ def limit_accel_in_turns(v_ego, angle_steers, a_target, CP):
 
   # FIXME: This function to calculate lateral accel is incorrect and should use the VehicleModel
   # The lookup table for turns should also be updated if we do this
-  a_total_max = interp(v_ego, _A_TOTAL_MAX_BP, _A_TOTAL_MAX_V)
+  a_total_max = _A_TOTAL_MAX(v_ego)
   a_y = v_ego ** 2 * angle_steers * CV.DEG_TO_RAD / (CP.steerRatio * CP.wheelbase)
   a_x_allowed = math.sqrt(max(a_total_max ** 2 - a_y ** 2, 0.))
 
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+import math
+import timeit
+import unittest
+
+import numpy as np
+from numpy.linalg import solve
+
+from cereal import car
+from selfdrive.car import scale_rot_inertia, scale_tire_stiffness
+from selfdrive.controls.lib.vehicle_model import VehicleModel, calc_slip_factor, create_dyn_state_matrices, dyn_ss_sol
+
+
+def get_car_params():
+  CP = car.CarParams.new_message()
+  CP.mass = 1999. + 136.
+  CP.wheelbase = 2.9
+  CP.centerToFront = CP.wheelbase * 0.4
+  CP.steerRatio = 13.27
+  CP.rotationalInertia = scale_rot_inertia(CP.mass, CP.wheelbase)
+  CP.tireStiffnessFront, CP.tireStiffnessRear = scale_tire_stiffness(CP.mass, CP.wheelbase, CP.centerToFront)
+  return CP
+
+
+# previous implementations, recomputing the slip factor and solving the linear system on every call
+def reference_curvature_factor(VM, u):
+  sf = calc_slip_factor(VM)
+  return (1. - VM.chi) / (1. - sf * u**2) / VM.l
+
+
+def reference_roll_compensation(VM, roll, u):
+  sf = calc_slip_factor(VM)
+  if abs(sf) < 1e-6:
+    return 0
+  return (9.8 * roll) / ((1 / sf) - u**2)
+
+
+def reference_calc_curvature(VM, sa, u, roll):
+  return (reference_curvature_factor(VM, u) * sa / VM.sR) + reference_roll_compensation(VM, roll, u)
+
+
+def reference_dyn_ss_sol(sa, u, roll, VM):
+  A, B = create_dyn_state_matrices(u, VM)
+  return -solve(A, B) @ np.array([[sa], [roll]])
+
+
+class TestVehicleModel(unittest.TestCase):
+  def setUp(self):
+    self.VM = VehicleModel(get_car_params())
+    self.speeds = np.linspace(0.2, 40, 37)
+    self.angles = np.radians(np.linspace(-90, 90, 31))
+    self.rolls = np.radians(np.linspace(-5, 5, 5))
+
+  def grid(self):
+    return [a.ravel() for a in np.meshgrid(self.angles, self.speeds, self.rolls)]
+
+  def test_scalar_parity(self):
+    for stiffness, sr in [(1.0, 13.27), (0.8, 15.), (1.2, 12.)]:
+      self.VM.update_params(stiffness, sr)
+      for sa, u, roll in zip(*self.grid()):
+        self.assertEqual(self.VM.calc_curvature(sa, u, roll), reference_calc_curvature(self.VM, sa, u, roll))
+        np.testing.assert_allclose(dyn_ss_sol(sa, u, roll, self.VM), reference_dyn_ss_sol(sa, u, roll, self.VM), rtol=1e-9, atol=1e-12)
+
+  def test_slip_factor_refreshed(self):
+    sf = self.VM.sf
+    self.VM.update_params(1.0, self.VM.sR)
+    self.assertEqual(self.VM.sf, sf)
+    self.VM.update_params(0.5, self.VM.sR)
+    self.assertNotEqual(self.VM.sf, sf)
+    self.assertEqual(self.VM.sf, calc_slip_factor(self.VM))
+
+  def test_batch_parity(self):
+    sa, u, roll = self.grid()
+    curv = self.VM.calc_curvature_batch(sa, u, roll)
+    np.testing.assert_allclose(curv, [self.VM.calc_curvature(*x) for x in zip(sa, u, roll)], rtol=1e-12)
+    np.testing.assert_allclose(self.VM.get_steer_from_curvature_batch(curv, u, roll), sa, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(self.VM.get_steer_from_curvature_batch(curv, u, roll),
+                               [self.VM.get_steer_from_curvature(*x) for x in zip(curv, u, roll)], rtol=1e-12)
+
+    u = np.concatenate([u, np.full(5, 0.05)])
+    sa, roll = np.concatenate([sa, np.full(5, 0.1)]), np.concatenate([roll, np.zeros(5)])
+    ss = self.VM.steady_state_sol_batch(sa, u, roll)
+    expected = np.array([self.VM.steady_state_sol(*x)[:, 0] for x in zip(sa, u, roll)])
+    np.testing.assert_allclose(ss, expected, rtol=1e-9, atol=1e-12)
+
+  def test_round_trip(self):
+    for sa, u, roll in zip(*self.grid()):
+      curv = self.VM.calc_curvature(sa, u, roll)
+      self.assertAlmostEqual(self.VM.get_steer_from_curvature(curv, u, roll), sa, places=9)
+      self.assertTrue(math.isfinite(self.VM.yaw_rate(sa, u, roll)))
+
+  def test_latency(self):
+    n = 10000
+    ref = timeit.timeit(lambda: reference_calc_curvature(self.VM, 0.1, 20., 0.01), number=n) / n
+    new = timeit.timeit(lambda: self.VM.calc_curvature(0.1, 20., 0.01), number=n) / n
+    print(f"calc_curvature: {ref * 1e6:.2f} us -> {new * 1e6:.2f} us")
+
+    ref = timeit.timeit(lambda: reference_dyn_ss_sol(0.1, 20., 0.01, self.VM), number=n) / n
+    new = timeit.timeit(lambda: dyn_ss_sol(0.1, 20., 0.01, self.VM), number=n) / n
+    print(f"dyn_ss_sol: {ref * 1e6:.2f} us -> {new * 1e6:.2f} us")
+
+    sa, u, roll = self.grid()
+    loop = timeit.timeit(lambda: [self.VM.calc_curvature(*x) for x in zip(sa, u, roll)], number=10) / 10 / len(sa)
+    batch = timeit.timeit(lambda: self.VM.calc_curvature_batch(sa, u, roll), number=10) / 10 / len(sa)
+    print(f"calc_curvature per element: loop {loop * 1e6:.2f} us, batch {batch * 1e6:.3f} us")
+
+
+if __name__ == "__main__":
+  unittest.main()
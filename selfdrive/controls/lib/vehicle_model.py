@@ -15,7 +15,6 @@ A depends on longitudinal speed, u [m/s], and vehicle parameters CP
 from typing import Tuple
 
 import numpy as np
-from numpy.linalg import solve
 
 from cereal import car
 
@@ -38,14 +37,28 @@ class VehicleModel:
 
     self.cF_orig = CP.tireStiffnessFront
     self.cR_orig = CP.tireStiffnessRear
+    self._params = None
     self.update_params(1.0, CP.steerRatio)
 
   def update_params(self, stiffness_factor: float, steer_ratio: float) -> None:
     """Update the vehicle model with a new stiffness factor and steer ratio"""
+    if self._params == (stiffness_factor, steer_ratio):
+      return
+    self._params = (stiffness_factor, steer_ratio)
+
     self.cF = stiffness_factor * self.cF_orig
     self.cR = stiffness_factor * self.cR_orig
     self.sR = steer_ratio
 
+    # terms that only depend on the parameters, refreshed here instead of on every call
+    self.sf = calc_slip_factor(self)
+    self._ss_A = (-(self.cF + self.cR) / self.m,
+                  -(self.cF * self.aF - self.cR * self.aR) / self.m,
+                  -(self.cF * self.aF - self.cR * self.aR) / self.j,
+                  -(self.cF * self.aF**2 + self.cR * self.aR**2) / self.j)
+    self._ss_B = ((self.cF + self.chi * self.cR) / self.m / self.sR,
+                  (self.cF * self.aF - self.chi * self.cR * self.aR) / self.j / self.sR)
+
   def steady_state_sol(self, sa: float, u: float, roll: float) -> np.ndarray:
     """Returns the steady state solution.
 
@@ -88,8 +101,7 @@ class VehicleModel:
     Returns:
       Curvature factor [1/m]
     """
-    sf = calc_slip_factor(self)
-    return (1. - self.chi) / (1. - sf * u**2) / self.l
+    return (1. - self.chi) / (1. - self.sf * u**2) / self.l
 
   def get_steer_from_curvature(self, curv: float, u: float, roll: float) -> float:
     """Calculates the required steering wheel angle for a given curvature
@@ -115,12 +127,10 @@ class VehicleModel:
     Returns:
       Roll compensation curvature [rad]
     """
-    sf = calc_slip_factor(self)
-
-    if abs(sf) < 1e-6:
+    if abs(self.sf) < 1e-6:
       return 0
     else:
-      return (ACCELERATION_DUE_TO_GRAVITY * roll) / ((1 / sf) - u**2)
+      return (ACCELERATION_DUE_TO_GRAVITY * roll) / ((1 / self.sf) - u**2)
 
   def get_steer_from_yaw_rate(self, yaw_rate: float, u: float, roll: float) -> float:
     """Calculates the required steering wheel angle for a given yaw_rate
@@ -149,6 +159,35 @@ class VehicleModel:
     """
     return self.calc_curvature(sa, u, roll) * u
 
+  def calc_curvature_batch(self, sa: np.ndarray, u: np.ndarray, roll: np.ndarray) -> np.ndarray:
+    """Vectorized calc_curvature over arrays of steering angles [rad], speeds [m/s] and roll [rad]"""
+    sa, u, roll = np.asarray(sa, dtype=float), np.asarray(u, dtype=float), np.asarray(roll, dtype=float)
+    return (self.curvature_factor(u) * sa / self.sR) + self.roll_compensation_batch(roll, u)
+
+  def get_steer_from_curvature_batch(self, curv: np.ndarray, u: np.ndarray, roll: np.ndarray) -> np.ndarray:
+    """Vectorized get_steer_from_curvature over arrays of curvatures [1/m], speeds [m/s] and roll [rad]"""
+    curv, u, roll = np.asarray(curv, dtype=float), np.asarray(u, dtype=float), np.asarray(roll, dtype=float)
+    return (curv - self.roll_compensation_batch(roll, u)) * self.sR * 1.0 / self.curvature_factor(u)
+
+  def roll_compensation_batch(self, roll: np.ndarray, u: np.ndarray) -> np.ndarray:
+    """Vectorized roll_compensation over arrays of roll [rad] and speeds [m/s]"""
+    roll, u = np.asarray(roll, dtype=float), np.asarray(u, dtype=float)
+    if abs(self.sf) < 1e-6:
+      return np.zeros(np.broadcast(roll, u).shape)
+    return (ACCELERATION_DUE_TO_GRAVITY * roll) / ((1 / self.sf) - u**2)
+
+  def steady_state_sol_batch(self, sa: np.ndarray, u: np.ndarray, roll: np.ndarray) -> np.ndarray:
+    """Vectorized steady_state_sol, returns an Nx2 array of (lateral speed, rotational speed)"""
+    sa, u, roll = np.broadcast_arrays(np.asarray(sa, dtype=float), np.asarray(u, dtype=float), np.asarray(roll, dtype=float))
+    dyn = u > 0.1
+    u_dyn = np.where(dyn, u, 1.0)
+
+    x = np.empty(sa.shape + (2,))
+    x[..., 0], x[..., 1] = _dyn_ss_sol_closed_form(sa, u_dyn, roll, self)
+    x[~dyn, 0] = (self.aR / self.sR / self.l * u * sa)[~dyn]
+    x[~dyn, 1] = (1. / self.sR / self.l * u * sa)[~dyn]
+    return x
+
 
 def kin_ss_sol(sa: float, u: float, VM: VehicleModel) -> np.ndarray:
   """Calculate the steady state solution at low speeds
@@ -219,9 +258,25 @@ def dyn_ss_sol(sa: float, u: float, roll: float, VM: VehicleModel) -> np.ndarray
   Returns:
     2x1 matrix with steady state solution
   """
-  A, B = create_dyn_state_matrices(u, VM)
-  inp = np.array([[sa], [roll]])
-  return -solve(A, B) @ inp
+  v, r = _dyn_ss_sol_closed_form(sa, u, roll, VM)
+  return np.array([[v], [r]])
+
+
+def _dyn_ss_sol_closed_form(sa, u, roll, VM: VehicleModel):
+  """Solves -A^{-1} B u for the 2x2 system directly, using the speed independent
+  terms cached by VehicleModel.update_params. Works on scalars and arrays."""
+  a00, a01, a10, a11 = VM._ss_A
+  b00, b10 = VM._ss_B
+
+  A00 = a00 / u
+  A01 = a01 / u - u
+  A10 = a10 / u
+  A11 = a11 / u
+  w0 = b00 * sa - ACCELERATION_DUE_TO_GRAVITY * roll
+  w1 = b10 * sa
+
+  det = A00 * A11 - A01 * A10
+  return -(A11 * w0 - A01 * w1) / det, -(A00 * w1 - A10 * w0) / det
 
 
 def calc_slip_factor(VM):
@@ -5,6 +5,7 @@ from collections import defaultdict
 
 import cereal.messaging as messaging
 from common.realtime import sec_since_boot
+from selfdrive.boardd.boardd import can_capnp_to_list
 
 
 def can_printer(bus, max_msg, addr, ascii_decode):
@@ -14,11 +15,9 @@ def can_printer(bus, max_msg, addr, ascii_decode):
   lp = sec_since_boot()
   msgs = defaultdict(list)
   while 1:
-    can_recv = messaging.drain_sock(logcan, wait_for_one=True)
-    for x in can_recv:
-      for y in x.can:
-        if y.src == bus:
-          msgs[y.address].append(y.dat)
+    can_recv = messaging.drain_sock_raw(logcan, wait_for_one=True)
+    for address, _, dat, _ in can_capnp_to_list(can_recv, src_filter=(bus,)):
+      msgs[address].append(dat)
 
     if sec_since_boot() - lp > 0.1:
       dd = chr(27) + "[2J"
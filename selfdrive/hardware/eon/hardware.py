@@ -9,6 +9,7 @@ from typing import List, Union
 
 from cereal import log
 from selfdrive.hardware.base import HardwareBase, ThermalConfig
+from selfdrive.hardware.sysfs import sysfs
 
 try:
   from common.params import Params
@@ -405,7 +406,7 @@ class Android(HardwareBase):
 
   def get_gpu_usage_percent(self):
     try:
-      used, total = open('/sys/devices/soc/b00000.qcom,kgsl-3d0/kgsl/kgsl-3d0/gpubusy').read().strip().split()
+      used, total = sysfs.read('/sys/devices/soc/b00000.qcom,kgsl-3d0/kgsl/kgsl-3d0/gpubusy').strip().split()
       perc = 100.0 * int(used) / int(total)
       return min(max(perc, 0), 100)
     except Exception:
@@ -0,0 +1,46 @@
+import os
+import threading
+from typing import Dict
+
+# sysfs attributes are at most a page, and the ones we sample are a few bytes
+READ_SIZE = 4096
+
+
+class SysfsReader:
+  """
+  Rereads files through one fd each, opened on first use. A read is a single
+  pread at offset 0, sysfs regenerates the contents on every read from the start.
+  """
+  def __init__(self):
+    self.fds: Dict[str, int] = {}
+    self.lock = threading.Lock()
+
+  def _fd(self, path: str) -> int:
+    with self.lock:
+      fd = self.fds.get(path)
+      if fd is None:
+        fd = os.open(path, os.O_RDONLY | os.O_CLOEXEC)
+        self.fds[path] = fd
+      return fd
+
+  def read(self, path: str) -> str:
+    fd = self._fd(path)
+    try:
+      return os.pread(fd, READ_SIZE, 0).decode()
+    except OSError:
+      # the attribute went away with its device, reopen next time
+      self.forget(path)
+      raise
+
+  def forget(self, path: str) -> None:
+    with self.lock:
+      fd = self.fds.pop(path, None)
+    if fd is not None:
+      os.close(fd)
+
+  def close(self) -> None:
+    for path in list(self.fds):
+      self.forget(path)
+
+
+sysfs = SysfsReader()
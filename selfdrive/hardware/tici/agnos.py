@@ -2,40 +2,101 @@
 import json
 import lzma
 import hashlib
+import queue
 import requests
 import struct
 import subprocess
+import threading
 import time
 import os
-from typing import Generator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Generator, Optional
 
 SPARSE_CHUNK_FMT = struct.Struct('H2xI4x')
+CHUNK_SIZE = 1024 * 1024
+
+
+class ThreadedHash:
+  """
+  sha256 computed on a separate thread, so hashing overlaps with downloading and
+  writing. hashlib releases the GIL while hashing large buffers.
+  """
+  def __init__(self, max_pending: int = 4) -> None:
+    self.hash = hashlib.sha256()
+    self.pending = bytearray()  # small updates are batched
+    self.q: queue.Queue[Optional[bytes]] = queue.Queue(maxsize=max_pending)
+    self.thread = threading.Thread(target=self._hash_thread, daemon=True)
+    self.thread.start()
+
+  def _hash_thread(self) -> None:
+    while (data := self.q.get()) is not None:
+      self.hash.update(data)
+
+  def update(self, data: bytes) -> None:
+    if len(data) < 64 * 1024:
+      self.pending += data
+      if len(self.pending) < 64 * 1024:
+        return
+      data, self.pending = bytes(self.pending), bytearray()
+    elif len(self.pending):
+      self.q.put(bytes(self.pending))
+      self.pending = bytearray()
+    self.q.put(data)
+
+  def finish(self) -> None:
+    if self.thread.is_alive():
+      if len(self.pending):
+        self.q.put(bytes(self.pending))
+        self.pending = bytearray()
+      self.q.put(None)
+      self.thread.join()
+
+  def hexdigest(self) -> str:
+    self.finish()
+    return self.hash.hexdigest()
 
 
 class StreamingDecompressor:
   def __init__(self, url: str) -> None:
-    self.buf = b""
+    # decompressed data starts at pos, everything before it was read already
+    self.buf = bytearray()
+    self.pos = 0
 
     self.req = requests.get(url, stream=True, headers={'Accept-Encoding': None})
-    self.it = self.req.iter_content(chunk_size=1024 * 1024)
+    self.it = self.req.iter_content(chunk_size=CHUNK_SIZE)
     self.decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_AUTO)
     self.eof = False
-    self.sha256 = hashlib.sha256()
+    self.sha256 = ThreadedHash()
 
-  def read(self, length: int) -> bytes:
-    while len(self.buf) < length:
-      self.req.raise_for_status()
+  def decompress_chunk(self) -> bool:
+    """Decompresses at most CHUNK_SIZE more bytes into buf, False at the end of the stream"""
+    if self.decompressor.eof:
+      return False
 
+    compressed = b""
+    if self.decompressor.needs_input:
+      self.req.raise_for_status()
       try:
         compressed = next(self.it)
       except StopIteration:
+        return False
+
+    # drop what was read before growing, only the unread tail is moved
+    if self.pos:
+      del self.buf[:self.pos]
+      self.pos = 0
+    self.buf += self.decompressor.decompress(compressed, max_length=CHUNK_SIZE)
+    return True
+
+  def read(self, length: int) -> bytes:
+    while len(self.buf) - self.pos < length:
+      if not self.decompress_chunk():
         self.eof = True
         break
-      out = self.decompressor.decompress(compressed)
-      self.buf += out
 
-    result = self.buf[:length]
-    self.buf = self.buf[length:]
+    with memoryview(self.buf) as mv:
+      result = bytes(mv[self.pos:self.pos + length])
+    self.pos += len(result)
 
     self.sha256.update(result)
     return result
@@ -63,12 +124,20 @@ def unsparsify(f: StreamingDecompressor) -> Generator[bytes, None, None]:
     chunk_type, out_blocks = SPARSE_CHUNK_FMT.unpack(f.read(12))
 
     if chunk_type == 0xcac1:  # Raw
-      # TODO: yield in smaller chunks. Yielding only block_sz is too slow. Largest observed data chunk is 252 MB.
-      yield f.read(out_blocks * block_sz)
+      # Largest observed data chunk is 252 MB
+      remaining = out_blocks * block_sz
+      while remaining > 0:
+        data = f.read(min(CHUNK_SIZE, remaining))
+        if not len(data):
+          raise Exception("Sparse image truncated")
+        remaining -= len(data)
+        yield data
     elif chunk_type == 0xcac2:  # Fill
+      blocks_per_chunk = max(1, CHUNK_SIZE // block_sz)
       filler = f.read(4) * (block_sz // 4)
-      for _ in range(out_blocks):
-        yield filler
+      fill_chunk = filler * min(out_blocks, blocks_per_chunk)
+      for i in range(0, out_blocks, blocks_per_chunk):
+        yield fill_chunk if out_blocks - i >= blocks_per_chunk else filler * (out_blocks - i)
     elif chunk_type == 0xcac3:  # Don't care
       yield b""
     else:
@@ -77,7 +146,7 @@ def unsparsify(f: StreamingDecompressor) -> Generator[bytes, None, None]:
 # noop wrapper with same API as unsparsify() for non sparse images
 def noop(f: StreamingDecompressor) -> Generator[bytes, None, None]:
   while not f.eof:
-    yield f.read(1024 * 1024)
+    yield f.read(CHUNK_SIZE)
 
 
 def get_target_slot_number() -> int:
@@ -106,14 +175,17 @@ def verify_partition(target_slot_number: int, partition: dict) -> bool:
 
   with open(path, 'rb+') as out:
     if full_check:
-      raw_hash = hashlib.sha256()
+      # reads the next chunk while the last one is being hashed
+      raw_hash = ThreadedHash()
 
-      pos = 0
-      chunk_size = 1024 * 1024
-      while pos < partition_size:
-        n = min(chunk_size, partition_size - pos)
-        raw_hash.update(out.read(n))
-        pos += n
+      try:
+        pos = 0
+        while pos < partition_size:
+          n = min(CHUNK_SIZE, partition_size - pos)
+          raw_hash.update(out.read(n))
+          pos += n
+      finally:
+        raw_hash.finish()
 
       return raw_hash.hexdigest().lower() == partition['hash_raw'].lower()
     else:
@@ -149,15 +221,19 @@ def flash_partition(target_slot_number: int, partition: dict, cloudlog):
   with open(path, 'wb+') as out:
     # Flash partition
     last_p = 0
-    raw_hash = hashlib.sha256()
+    raw_hash = ThreadedHash()
     f = unsparsify if partition['sparse'] else noop
-    for chunk in f(downloader):
-      raw_hash.update(chunk)
-      out.write(chunk)
-      p = int(out.tell() / partition['size'] * 100)
-      if p != last_p:
-        last_p = p
-        print(f"Installing {partition['name']}: {p}", flush=True)
+    try:
+      for chunk in f(downloader):
+        raw_hash.update(chunk)
+        out.write(chunk)
+        p = int(out.tell() / partition['size'] * 100)
+        if p != last_p:
+          last_p = p
+          print(f"Installing {partition['name']}: {p}", flush=True)
+    finally:
+      raw_hash.finish()
+      downloader.sha256.finish()
 
     if raw_hash.hexdigest().lower() != partition['hash_raw'].lower():
       raise Exception(f"Raw hash mismatch '{raw_hash.hexdigest().lower()}'")
@@ -220,7 +296,9 @@ def flash_agnos_update(manifest_path: str, target_slot_number: int, cloudlog) ->
 
 def verify_agnos_update(manifest_path: str, target_slot_number: int) -> bool:
   update = json.load(open(manifest_path))
-  return all(verify_partition(target_slot_number, partition) for partition in update)
+  # partitions are hashed in parallel
+  with ThreadPoolExecutor(max_workers=4) as pool:
+    return all(pool.map(lambda partition: verify_partition(target_slot_number, partition), update))
 
 
 if __name__ == "__main__":
@@ -9,6 +9,7 @@ from pathlib import Path
 
 from cereal import log
 from selfdrive.hardware.base import HardwareBase, ThermalConfig
+from selfdrive.hardware.sysfs import sysfs
 from selfdrive.hardware.tici import iwlist
 from selfdrive.hardware.tici.amplifier import Amplifier
 
@@ -401,8 +402,7 @@ class Tici(HardwareBase):
 
   def get_screen_brightness(self):
     try:
-      with open("/sys/class/backlight/panel0-backlight/brightness") as f:
-        return int(float(f.read()) / 10.23)
+      return int(float(sysfs.read("/sys/class/backlight/panel0-backlight/brightness")) / 10.23)
     except Exception:
       return 0
 
@@ -431,7 +431,7 @@ class Tici(HardwareBase):
 
   def get_gpu_usage_percent(self):
     try:
-      used, total = open('/sys/class/kgsl/kgsl-3d0/gpubusy').read().strip().split()
+      used, total = sysfs.read('/sys/class/kgsl/kgsl-3d0/gpubusy').strip().split()
       return 100.0 * int(used) / int(total)
     except Exception:
       return 0
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+import contextlib
+import functools
+import io
+import hashlib
+import lzma
+import os
+import random
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import tracemalloc
+import unittest
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import requests
+
+from selfdrive.hardware.tici import agnos
+from selfdrive.hardware.tici.agnos import StreamingDecompressor, flash_partition, noop, unsparsify, verify_partition
+
+BLOCK_SZ = 4096
+MB = 1024 * 1024
+
+
+def sparse_image(chunks):
+  """Android sparse image of (type, data or fill value or block count) chunks, and its raw contents"""
+  body, raw = b"", b""
+  total_blocks = 0
+  for chunk_type, arg in chunks:
+    if chunk_type == 0xcac1:
+      blocks, data = len(arg) // BLOCK_SZ, arg
+      raw += arg
+    elif chunk_type == 0xcac2:
+      blocks, data = arg[1], arg[0]
+      raw += arg[0] * (BLOCK_SZ // 4) * arg[1]
+    else:
+      blocks, data = arg, b""
+    body += struct.pack("<HHII", chunk_type, 0, blocks, 12 + len(data)) + data
+    total_blocks += blocks
+  header = struct.pack("<IHHHHIIII", 0xed26ff3a, 1, 0, 28, 12, BLOCK_SZ, total_blocks, len(chunks), 0)
+  return header + body, raw
+
+
+def make_image(rnd, scale=1):
+  """Sparse and raw contents of a test image of about 14MB times scale"""
+  # compressible, but not trivially
+  text = bytes(rnd.choice(b"abcdefghijklmnop") for _ in range(MB))
+  return sparse_image([
+    (0xcac1, b"".join(text[rnd.randrange(MB // 2):][:MB // 2] for _ in range(6 * scale))),
+    (0xcac2, (b"\xde\xad\xbe\xef", 512 * scale)),
+    (0xcac3, 128),
+    (0xcac1, os.urandom(MB // 2 * scale)),
+    # mostly empty filesystem blocks, these expand a lot
+    (0xcac1, b"".join(struct.pack("<Q", i) + bytes(BLOCK_SZ - 8) for i in range(8 * scale * MB // BLOCK_SZ))),
+    (0xcac2, (b"\x00\x00\x00\x00", 3)),
+  ])
+
+
+def write_xz(path, data):
+  with open(path, "wb") as f:
+    f.write(lzma.compress(data, preset=0))
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+  def log_message(self, *args):
+    pass
+
+
+class LegacyDecompressor:
+  # StreamingDecompressor before it kept an offset into its buffer
+  def __init__(self, url):
+    self.buf = b""
+    self.req = requests.get(url, stream=True, headers={'Accept-Encoding': None})
+    self.it = self.req.iter_content(chunk_size=MB)
+    self.decompressor = lzma.LZMADecompressor(format=lzma.FORMAT_AUTO)
+    self.eof = False
+    self.sha256 = hashlib.sha256()
+
+  def read(self, length):
+    while len(self.buf) < length:
+      try:
+        compressed = next(self.it)
+      except StopIteration:
+        self.eof = True
+        break
+      self.buf += self.decompressor.decompress(compressed)
+    result = self.buf[:length]
+    self.buf = self.buf[length:]
+    self.sha256.update(result)
+    return result
+
+
+class TestAgnosDecompressor(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.tmp = tempfile.mkdtemp()
+    cls.sparse, cls.raw = make_image(random.Random(0))
+    write_xz(os.path.join(cls.tmp, "sparse.img.xz"), cls.sparse)
+    write_xz(os.path.join(cls.tmp, "raw.img.xz"), cls.raw)
+
+    cls.server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=cls.tmp))
+    threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+    cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}/"
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.server.shutdown()
+    cls.server.server_close()
+    shutil.rmtree(cls.tmp)
+
+  def partition(self, sparse):
+    fn = "sparse.img.xz" if sparse else "raw.img.xz"
+    return {
+      'name': "test",
+      'url': self.url + fn,
+      'hash': hashlib.sha256(self.sparse if sparse else self.raw).hexdigest(),
+      'hash_raw': hashlib.sha256(self.raw).hexdigest(),
+      'size': len(self.raw),
+      'sparse': sparse,
+      'full_check': True,
+    }
+
+  def test_read(self):
+    f = StreamingDecompressor(self.url + "raw.img.xz")
+    out = b"".join(f.read(n) for n in [0, 1, 3, 4096, 5 * MB, 12345, 4 * MB])
+    out += b"".join(noop(f))
+    self.assertTrue(f.eof)
+    self.assertEqual(out, self.raw)
+    self.assertEqual(f.sha256.hexdigest(), hashlib.sha256(self.raw).hexdigest())
+
+  def test_unsparsify(self):
+    f = StreamingDecompressor(self.url + "sparse.img.xz")
+    chunks = list(unsparsify(f))
+    self.assertEqual(b"".join(chunks), self.raw)
+    self.assertLessEqual(max(len(c) for c in chunks), agnos.CHUNK_SIZE)
+    self.assertEqual(f.sha256.hexdigest(), hashlib.sha256(self.sparse).hexdigest())
+
+  def test_flash_and_verify(self):
+    out_fn = os.path.join(self.tmp, "partition")
+    for sparse in (True, False):
+      partition = self.partition(sparse)
+      open(out_fn, "wb").close()
+      with mock.patch.object(agnos, "get_partition_path", return_value=out_fn), contextlib.redirect_stdout(io.StringIO()):
+        self.assertFalse(verify_partition(0, partition))
+        flash_partition(0, partition, mock.Mock())
+        self.assertTrue(verify_partition(0, partition))
+      with open(out_fn, "rb") as f:
+        self.assertEqual(f.read(), self.raw)
+
+  @unittest.skipUnless(os.getenv("BENCHMARK"), "set BENCHMARK=1 to compare decompressor throughput")
+  def test_benchmark(self):
+    sparse, raw = make_image(random.Random(0), scale=8)
+    write_xz(os.path.join(self.tmp, "benchmark.img.xz"), sparse)
+
+    def run(decompressor, sparse_reads):
+      tracemalloc.start()
+      t = time.monotonic()
+      f = decompressor(self.url + "benchmark.img.xz")
+      h = hashlib.sha256()
+      header = f.read(28)
+      for _ in range(struct.unpack_from("<I", header, 20)[0]):
+        chunk_type, blocks = agnos.SPARSE_CHUNK_FMT.unpack(f.read(12))
+        if chunk_type == 0xcac1:
+          for n in sparse_reads(blocks * BLOCK_SZ):
+            h.update(f.read(n))
+        elif chunk_type == 0xcac2:
+          h.update(f.read(4) * (BLOCK_SZ // 4) * blocks)
+      digest = f.sha256.hexdigest()
+      dt = time.monotonic() - t
+      peak = tracemalloc.get_traced_memory()[1]
+      tracemalloc.stop()
+      self.assertEqual(h.hexdigest(), hashlib.sha256(raw).hexdigest())
+      self.assertEqual(digest, hashlib.sha256(sparse).hexdigest())
+      return len(sparse) / dt / MB, peak / MB
+
+    def in_chunks(size):
+      return [agnos.CHUNK_SIZE] * (size // agnos.CHUNK_SIZE) + [size % agnos.CHUNK_SIZE]
+
+    results = {
+      "legacy, whole raw chunks": run(LegacyDecompressor, lambda size: [size]),
+      "legacy, 1MB reads": run(LegacyDecompressor, in_chunks),
+      "offset buffer, 1MB reads": run(StreamingDecompressor, in_chunks),
+    }
+    print(f"\n{len(sparse) / MB:.0f}MB sparse image")
+    for name, (throughput, peak) in results.items():
+      print(f"{name:<26}{throughput:>8.1f}MB/s{peak:>8.1f}MB peak")
+
+if __name__ == "__main__":
+  unittest.main()
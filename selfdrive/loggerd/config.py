@@ -39,3 +39,13 @@ def get_available_bytes(default=None):
     available_bytes = default
 
   return available_bytes
+
+
+def get_total_bytes(default=None):
+  try:
+    statvfs = os.statvfs(ROOT)
+    total_bytes = statvfs.f_blocks * statvfs.f_frsize
+  except OSError:
+    total_bytes = default
+
+  return total_bytes
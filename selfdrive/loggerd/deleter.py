@@ -1,40 +1,154 @@
 #!/usr/bin/env python3
+import bisect
 import os
 import shutil
 import threading
+import time
+from typing import Dict, List, Optional
 from selfdrive.swaglog import cloudlog
-from selfdrive.loggerd.config import ROOT, get_available_bytes, get_available_percent
-from selfdrive.loggerd.uploader import listdir_by_creation
+from selfdrive.loggerd.config import ROOT, get_available_bytes, get_available_percent, get_total_bytes
+from selfdrive.loggerd.uploader import get_directory_sort
 
 MIN_BYTES = 5 * 1024 * 1024 * 1024
 MIN_PERCENT = 10
 
+# keeps deleting from starving loggerd of disk bandwidth
+MAX_DELETE_RATE = 200 * 1024 * 1024
+
 DELETE_LAST = ['boot', 'crash']
 
 
+def deletion_order(name):
+  return (name in DELETE_LAST, get_directory_sort(name))
+
+
+def get_size(path):
+  if os.path.isfile(path):
+    return os.path.getsize(path)
+
+  size = 0
+  for dirpath, _, filenames in os.walk(path):
+    for fn in filenames:
+      try:
+        size += os.path.getsize(os.path.join(dirpath, fn))
+      except OSError:
+        pass
+  return size
+
+
+class DeleterIndex:
+  """Directories under root in deletion order, with cached sizes.
+  refresh() only looks at entries that were added or removed since the last call."""
+  def __init__(self, root):
+    self.root = root
+    self.order: List[tuple] = []
+    self.sizes: Dict[str, Optional[int]] = {}
+
+  def refresh(self):
+    try:
+      names = set(os.listdir(self.root))
+    except OSError:
+      cloudlog.exception("deleter listdir failed")
+      return
+
+    for name in self.sizes.keys() - names:
+      self.remove(name)
+
+    # order is already sorted, so this is a merge of the new entries
+    new_names = names - self.sizes.keys()
+    self.order.extend((deletion_order(name), name) for name in new_names)
+    self.order.sort()
+    self.sizes.update(dict.fromkeys(new_names))
+
+  def remove(self, name):
+    if name in self.sizes:
+      del self.sizes[name]
+      del self.order[bisect.bisect_left(self.order, (deletion_order(name), name))]
+
+  def names(self):
+    return [name for _, name in self.order]
+
+  def size(self, name):
+    # directories still being written to are measured again next time
+    if self.sizes[name] is None:
+      size = get_size(os.path.join(self.root, name))
+      if self.is_locked(name):
+        return size
+      self.sizes[name] = size
+    return self.sizes[name]
+
+  def is_locked(self, name):
+    path = os.path.join(self.root, name)
+    try:
+      return os.path.isdir(path) and any(fn.endswith(".lock") for fn in os.listdir(path))
+    except OSError:
+      return False
+
+  def plan(self, bytes_needed):
+    """Oldest unlocked directories that together free at least bytes_needed"""
+    batch = []
+    for _, name in self.order:
+      if bytes_needed <= 0:
+        break
+      if self.is_locked(name):
+        self.sizes[name] = None
+        continue
+      batch.append(name)
+      bytes_needed -= self.size(name)
+    return batch
+
+
+def get_bytes_needed():
+  available_bytes = get_available_bytes(default=MIN_BYTES + 1)
+  total_bytes = get_total_bytes(default=0)
+  bytes_needed = max(MIN_BYTES - available_bytes, MIN_PERCENT / 100 * total_bytes - available_bytes)
+
+  # the percentage can be low without a known total, free at least one directory then
+  if get_available_percent(default=MIN_PERCENT + 1) < MIN_PERCENT:
+    bytes_needed = max(bytes_needed, 1)
+  return max(int(bytes_needed), 0)
+
+
+def delete_batch(index, batch, exit_event):
+  start_time = time.monotonic()
+  deleted_bytes = 0
+  for name in batch:
+    if exit_event.is_set():
+      break
+
+    # locks can show up while rate limited, the uploader takes them too
+    if index.is_locked(name):
+      continue
+
+    delete_path = os.path.join(index.root, name)
+    size = index.size(name)
+    try:
+      cloudlog.info(f"deleting {delete_path}")
+      if os.path.isfile(delete_path):
+        os.remove(delete_path)
+      else:
+        shutil.rmtree(delete_path)
+      index.remove(name)
+      deleted_bytes += size
+    except OSError:
+      cloudlog.exception(f"issue deleting {delete_path}")
+      continue
+
+    # stay under max_rate on average over the batch
+    ahead = deleted_bytes / MAX_DELETE_RATE - (time.monotonic() - start_time)
+    if ahead > 0:
+      exit_event.wait(ahead)
+
+
 def deleter_thread(exit_event):
+  index = DeleterIndex(ROOT)
   while not exit_event.is_set():
-    out_of_bytes = get_available_bytes(default=MIN_BYTES + 1) < MIN_BYTES
-    out_of_percent = get_available_percent(default=MIN_PERCENT + 1) < MIN_PERCENT
-
-    if out_of_percent or out_of_bytes:
-      # remove the earliest directory we can
-      dirs = sorted(listdir_by_creation(ROOT), key=lambda x: x in DELETE_LAST)
-      for delete_dir in dirs:
-        delete_path = os.path.join(ROOT, delete_dir)
-
-        if any(name.endswith(".lock") for name in os.listdir(delete_path)):
-          continue
-
-        try:
-          cloudlog.info(f"deleting {delete_path}")
-          if os.path.isfile(delete_path):
-            os.remove(delete_path)
-          else:
-            shutil.rmtree(delete_path)
-          break
-        except OSError:
-          cloudlog.exception(f"issue deleting {delete_path}")
+    bytes_needed = get_bytes_needed()
+
+    if bytes_needed > 0:
+      index.refresh()
+      batch = index.plan(bytes_needed)
+      delete_batch(index, batch, exit_event)
       exit_event.wait(.1)
     else:
       exit_event.wait(30)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from selfdrive.loggerd import deleter
+from selfdrive.loggerd.uploader import listdir_by_creation
+
+SEGMENT_SIZE = 64 * 1024
+N_SEGMENTS = 2000
+TOTAL_SEGMENTS = 2100
+
+# tmpfs keeps the test from measuring the disk
+TMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+def legacy_deleter_pass(root):
+  """One iteration of the old deleter, it slept .1 s after each of these"""
+  dirs = sorted(listdir_by_creation(root), key=lambda x: x in deleter.DELETE_LAST)
+  for delete_dir in dirs:
+    delete_path = os.path.join(root, delete_dir)
+    if any(name.endswith(".lock") for name in os.listdir(delete_path)):
+      continue
+    shutil.rmtree(delete_path)
+    break
+
+
+class TestDeleter(unittest.TestCase):
+
+  def setUp(self):
+    self.root = tempfile.mkdtemp(dir=TMP_DIR)
+    self.segments = [f"2021-01-01--00-00-00--{i}" for i in range(N_SEGMENTS)]
+    for name in self.segments + deleter.DELETE_LAST:
+      os.mkdir(os.path.join(self.root, name))
+      for fn in ("rlog.bz2", "qlog.bz2"):
+        with open(os.path.join(self.root, name, fn), "wb") as f:
+          f.write(b"\x00" * (SEGMENT_SIZE // 2))
+
+    # currently being logged
+    open(os.path.join(self.root, self.segments[0], "rlog.lock"), "w").close()
+
+    patches = [
+      mock.patch.object(deleter, "ROOT", self.root),
+      mock.patch.object(deleter, "MIN_BYTES", 0),
+      mock.patch.object(deleter, "MIN_PERCENT", 10),
+      mock.patch.object(deleter, "MAX_DELETE_RATE", 1e12),
+      mock.patch.object(deleter, "get_available_bytes", lambda default=None: self.available_bytes()),
+      mock.patch.object(deleter, "get_total_bytes", lambda default=None: TOTAL_SEGMENTS * SEGMENT_SIZE),
+      mock.patch.object(deleter, "get_available_percent",
+                        lambda default=None: 100 * self.available_bytes() / (TOTAL_SEGMENTS * SEGMENT_SIZE)),
+    ]
+    for p in patches:
+      p.start()
+      self.addCleanup(p.stop)
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def available_bytes(self):
+    # fake disk, every directory takes the same space
+    return (TOTAL_SEGMENTS - len(os.listdir(self.root))) * SEGMENT_SIZE
+
+  def run_deleter(self, timeout=30):
+    exit_event = threading.Event()
+    thread = threading.Thread(target=deleter.deleter_thread, args=(exit_event,))
+    start = time.monotonic()
+    thread.start()
+    while deleter.get_bytes_needed() > 0 and time.monotonic() - start < timeout:
+      time.sleep(0.001)
+    recover_time = time.monotonic() - start
+    exit_event.set()
+    thread.join()
+    return recover_time
+
+  def test_recover(self):
+    bytes_needed = deleter.get_bytes_needed()
+    self.assertGreater(bytes_needed, 0)
+
+    recover_time = self.run_deleter()
+    remaining = set(os.listdir(self.root))
+    n_deleted = N_SEGMENTS + len(deleter.DELETE_LAST) - len(remaining)
+    print(f"freed {n_deleted} segments in {recover_time * 1000:.1f} ms")
+
+    self.assertEqual(deleter.get_bytes_needed(), 0)
+    self.assertEqual(n_deleted, bytes_needed // SEGMENT_SIZE)
+    # oldest first, skipping the locked one
+    self.assertIn(self.segments[0], remaining)
+    self.assertEqual(remaining, {self.segments[0]} | set(self.segments[n_deleted + 1:]) | set(deleter.DELETE_LAST))
+
+  def test_recover_legacy(self):
+    start = time.monotonic()
+    passes = 0
+    while deleter.get_bytes_needed() > 0:
+      legacy_deleter_pass(self.root)
+      passes += 1
+    work_time = time.monotonic() - start
+    print(f"legacy: freed {passes} segments in {work_time * 1000:.1f} ms of work and {passes * 0.1:.1f} s of waits")
+
+  def test_keeps_locked(self):
+    for name in self.segments[1:]:
+      shutil.rmtree(os.path.join(self.root, name))
+    with mock.patch.object(deleter, "MIN_BYTES", (TOTAL_SEGMENTS - 1) * SEGMENT_SIZE):
+      self.run_deleter(timeout=1)
+    self.assertEqual(os.listdir(self.root), [self.segments[0]])
+
+  def test_rate_limit(self):
+    rate = 100 * SEGMENT_SIZE
+    with mock.patch.object(deleter, "MAX_DELETE_RATE", rate):
+      bytes_needed = deleter.get_bytes_needed()
+      recover_time = self.run_deleter()
+    self.assertGreaterEqual(recover_time, 0.9 * (bytes_needed - SEGMENT_SIZE) / rate)
+
+  def test_index(self):
+    index = deleter.DeleterIndex(self.root)
+    index.refresh()
+    expected = sorted(listdir_by_creation(self.root), key=lambda x: x in deleter.DELETE_LAST)
+    self.assertEqual(index.names(), expected)
+
+    # changes made behind the index's back
+    shutil.rmtree(os.path.join(self.root, self.segments[5]))
+    os.mkdir(os.path.join(self.root, f"2021-01-01--00-00-00--{N_SEGMENTS}"))
+    index.refresh()
+    expected = sorted(listdir_by_creation(self.root), key=lambda x: x in deleter.DELETE_LAST)
+    self.assertEqual(index.names(), expected)
+
+    self.assertEqual(index.plan(1), [self.segments[1]])
+    self.assertEqual(index.size(self.segments[1]), SEGMENT_SIZE)
+
+
+if __name__ == "__main__":
+  unittest.main()
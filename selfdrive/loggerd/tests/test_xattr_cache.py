@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+from unittest import mock
+
+from selfdrive.loggerd import xattr_cache
+
+TMP_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+ATTR_NAME = 'user.upload'
+
+
+class TestXattrCache(unittest.TestCase):
+
+  def setUp(self):
+    self.root = tempfile.mkdtemp(dir=TMP_DIR)
+    xattr_cache.cache_clear()
+
+    # not every filesystem has user xattrs, keep them next to the files instead
+    self.attrs = {}
+    patches = [
+      mock.patch.object(xattr_cache, "getattr1", lambda path, name: self.attrs.get((path, name))),
+      mock.patch.object(xattr_cache, "setattr1", self.fake_setxattr),
+    ]
+    for p in patches:
+      p.start()
+      self.addCleanup(p.stop)
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+    xattr_cache.cache_clear()
+
+  def fake_setxattr(self, path, name, value):
+    self.attrs[(path, name)] = value
+    os.utime(path)  # a real setxattr bumps ctime, so does this
+
+  def make_file(self, i):
+    fn = os.path.join(self.root, str(i))
+    open(fn, "w").close()
+    return fn
+
+  def test_invalidation(self):
+    fn = self.make_file(0)
+    self.assertIsNone(xattr_cache.getxattr(fn, ATTR_NAME))
+    xattr_cache.setxattr(fn, ATTR_NAME, b'1')
+    self.assertEqual(xattr_cache.getxattr(fn, ATTR_NAME), b'1')
+
+    # set by another process
+    self.fake_setxattr(fn, ATTR_NAME, b'2')
+    self.assertEqual(xattr_cache.getxattr(fn, ATTR_NAME), b'2')
+
+    # deleted and recreated under the same name
+    os.unlink(fn)
+    with self.assertRaises(OSError):
+      xattr_cache.getxattr(fn, ATTR_NAME)
+    self.assertEqual(xattr_cache.cache_info().currsize, 0)
+    self.attrs.clear()
+    self.make_file(0)
+    self.assertIsNone(xattr_cache.getxattr(fn, ATTR_NAME))
+
+  def test_churn(self):
+    live = 100
+    n_files = 100000
+    files = []
+
+    tracemalloc.start()
+    baseline = None
+    for i in range(n_files):
+      files.append(self.make_file(i))
+      if len(files) > live:
+        # uploaded and then rotated out by the deleter, in another process
+        fn = files.pop(0)
+        self.fake_setxattr(fn, ATTR_NAME, b'1')
+        os.unlink(fn)
+        del self.attrs[(fn, ATTR_NAME)]
+
+      # the uploader rescans every file that is still around, a few are new each time
+      if i % (live // 10) == 0:
+        for fn in files:
+          xattr_cache.getxattr(fn, ATTR_NAME)
+      if i == n_files // 4:
+        baseline = tracemalloc.get_traced_memory()[0]
+
+    growth = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    info = xattr_cache.cache_info()
+    hit_rate = info.hits / (info.hits + info.misses)
+    print(f"{info}, hit rate {hit_rate:.3f}, memory growth {growth / 1024:.1f} kB")
+    self.assertLessEqual(info.currsize, info.maxsize)
+    self.assertGreater(hit_rate, 0.85)
+    self.assertLess(growth, 1024 * 1024)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,15 +1,58 @@
-from typing import Dict, Tuple
+import os
+from collections import OrderedDict, namedtuple
+from typing import Optional, Tuple
 
 from common.xattr import getxattr as getattr1
 from common.xattr import setxattr as setattr1
 
-cached_attributes: Dict[Tuple, bytes] = {}
-def getxattr(path: str, attr_name: bytes) -> bytes:
-  if (path, attr_name) not in cached_attributes:
-    response = getattr1(path, attr_name)
-    cached_attributes[(path, attr_name)] = response
-  return cached_attributes[(path, attr_name)]
+MAX_CACHE_ENTRIES = 4096
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+# (path, attr_name) -> (inode, ctime, value), least recently used first.
+# setting an xattr changes ctime, so values set by other processes are noticed too.
+# Files are deleted by the deleter process, so there is nothing to invalidate here: the
+# stat of a deleted file fails and drops its entry, a recreated file has a new inode or
+# ctime, and entries of files that are never looked up again age out of the LRU.
+cached_attributes: "OrderedDict[Tuple[str, str], Tuple[int, int, Optional[bytes]]]" = OrderedDict()
+hits = 0
+misses = 0
+
+
+def getxattr(path: str, attr_name: str) -> Optional[bytes]:
+  global hits, misses
+  key = (path, attr_name)
+  try:
+    st = os.stat(path)
+  except OSError:
+    cached_attributes.pop(key, None)
+    raise
+
+  entry = cached_attributes.get(key)
+  if entry is not None and entry[:2] == (st.st_ino, st.st_ctime_ns):
+    cached_attributes.move_to_end(key)
+    hits += 1
+    return entry[2]
+
+  misses += 1
+  response = getattr1(path, attr_name)
+  cached_attributes[key] = (st.st_ino, st.st_ctime_ns, response)
+  cached_attributes.move_to_end(key)
+  while len(cached_attributes) > MAX_CACHE_ENTRIES:
+    cached_attributes.popitem(last=False)
+  return response
+
 
 def setxattr(path: str, attr_name: str, attr_value: bytes) -> None:
   cached_attributes.pop((path, attr_name), None)
   return setattr1(path, attr_name, attr_value)
+
+
+def cache_info() -> CacheInfo:
+  return CacheInfo(hits, misses, MAX_CACHE_ENTRIES, len(cached_attributes))
+
+
+def cache_clear() -> None:
+  global hits, misses
+  cached_attributes.clear()
+  hits = misses = 0
@@ -21,21 +21,22 @@ def main() -> NoReturn:
   error_log_message_sock = messaging.pub_sock('errorLogMessage')
 
   while True:
-    dat = b''.join(sock.recv_multipart())
-    level = dat[0]
-    record = dat[1:].decode("utf-8")
-    if level >= log_level:
-      log_handler.emit(record)
-
-    # then we publish them
-    msg = messaging.new_message()
-    msg.logMessage = record
-    log_message_sock.send(msg.to_bytes())
-
-    if level >= 40:  # logging.ERROR
+    # one part per log message, python processes send them in batches
+    for dat in sock.recv_multipart():
+      level = dat[0]
+      record = dat[1:].decode("utf-8")
+      if level >= log_level:
+        log_handler.emit(record)
+
+      # then we publish them
       msg = messaging.new_message()
-      msg.errorLogMessage = record
-      error_log_message_sock.send(msg.to_bytes())
+      msg.logMessage = record
+      log_message_sock.send(msg.to_bytes())
+
+      if level >= 40:  # logging.ERROR
+        msg = messaging.new_message()
+        msg.errorLogMessage = record
+        error_log_message_sock.send(msg.to_bytes())
 
 
 if __name__ == "__main__":
@@ -17,7 +17,7 @@ from common.text_window import TextWindow
 from selfdrive.boardd.set_time import set_time
 from selfdrive.hardware import HARDWARE, PC, EON
 from selfdrive.manager.helpers import unblock_stdout
-from selfdrive.manager.process import ensure_running, launcher
+from selfdrive.manager.process import ENABLE_ZYGOTE, PythonProcess, ensure_running, launcher, start_zygote
 from selfdrive.manager.process_config import managed_processes
 from selfdrive.athena.registration import register, UNREGISTERED_DONGLE_ID
 from selfdrive.swaglog import cloudlog, add_file_handler
@@ -171,6 +171,10 @@ def manager_init() -> None:
     os.remove('/data/tmux_error.log')
 
 def manager_prepare() -> None:
+  # the zygote imports python processes at the same time as prepare
+  if ENABLE_ZYGOTE:
+    start_zygote([p.module for p in managed_processes.values() if isinstance(p, PythonProcess) and p.enabled])
+
   for p in managed_processes.values():
     p.prepare()
 
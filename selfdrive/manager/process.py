@@ -1,12 +1,17 @@
 import importlib
+import itertools
+import multiprocessing
+import multiprocessing.connection
+import multiprocessing.forkserver
 import os
 import signal
 import struct
 import time
 import subprocess
-from typing import Optional, List, ValuesView
+from typing import Any, Dict, Optional, List, ValuesView
 from abc import ABC, abstractmethod
 from multiprocessing import Process
+from multiprocessing.process import BaseProcess
 
 from setproctitle import setproctitle  # pylint: disable=no-name-in-module
 
@@ -15,16 +20,50 @@ import selfdrive.sentry as sentry
 from common.basedir import BASEDIR
 from common.params import Params
 from common.realtime import sec_since_boot
+from common.watchdog import WATCHDOG_SLOTS, WatchdogTable
 from selfdrive.swaglog import cloudlog
 from selfdrive.hardware import HARDWARE
 from cereal import log
 
 WATCHDOG_FN = "/dev/shm/wd_"
 ENABLE_WATCHDOG = os.getenv("NO_WATCHDOG") is None
+# opt-in until the zygote is measured to beat forking from a prepared manager on device
+ENABLE_ZYGOTE = os.getenv("ZYGOTE") is not None
 
+# watched processes kick their slot in this table, see common/watchdog.py
+watchdog_table = WatchdogTable()
+watchdog_slots = itertools.count()
 
-def launcher(proc: str, name: str) -> None:
+
+def allocate_watchdog_slot() -> Optional[int]:
+  slot = next(watchdog_slots)
+  return slot if slot < WATCHDOG_SLOTS else None
+
+# python processes are forked from a server process that already imported them, see start_zygote
+zygote = multiprocessing.get_context('forkserver')
+
+
+def start_zygote(modules: List[str]) -> None:
+  """Starts the server python processes are forked from. It imports the
+  modules in the background, the first process started waits for that.
+  It's a new interpreter, so the modules have to be on PYTHONPATH."""
+  # selfdrive.manager.zygote imports them, so one that fails to import can't take the server down
+  os.environ['ZYGOTE_PRELOAD'] = ','.join(modules)
   try:
+    zygote.set_forkserver_preload(['selfdrive.manager.zygote'])
+    multiprocessing.forkserver.ensure_running()
+  finally:
+    del os.environ['ZYGOTE_PRELOAD']
+
+
+def launcher(proc: str, name: str, log_ctx: Optional[Dict[str, Any]] = None, watchdog_slot: Optional[int] = None) -> None:
+  try:
+    # the zygote didn't inherit this from manager
+    if log_ctx is not None:
+      cloudlog.bind_global(**log_ctx)
+    if watchdog_slot is not None:
+      os.environ['WATCHDOG_SLOT'] = str(watchdog_slot)
+
     # import the process
     mod = importlib.import_module(proc)
 
@@ -49,18 +88,22 @@ def launcher(proc: str, name: str) -> None:
     raise
 
 
-def nativelauncher(pargs: List[str], cwd: str, name: str) -> None:
+def nativelauncher(pargs: List[str], cwd: str, name: str, watchdog_slot: Optional[int] = None) -> None:
   os.environ['MANAGER_DAEMON'] = name
+  if watchdog_slot is not None:
+    os.environ['WATCHDOG_SLOT'] = str(watchdog_slot)
 
   # exec the process
   os.chdir(cwd)
   os.execvp(pargs[0], pargs)
 
 
-def join_process(process: Process, timeout: float) -> None:
+def join_process(process: BaseProcess, timeout: float) -> None:
   # Process().join(timeout) will hang due to a python 3 bug: https://bugs.python.org/issue28382
-  # We have to poll the exitcode instead
+  # Wait for the process sentinel instead, it's ready once the process exits on every kernel and
+  # start method. The exitcode can lag it for a moment, so that is still polled.
   t = time.monotonic()
+  multiprocessing.connection.wait([process.sentinel], timeout)
   while time.monotonic() - t < timeout and process.exitcode is None:
     time.sleep(0.001)
 
@@ -71,12 +114,13 @@ class ManagerProcess(ABC):
   sigkill = False
   persistent = False
   driverview = False
-  proc: Optional[Process] = None
+  proc: Optional[BaseProcess] = None
   enabled = True
   name = ""
 
   last_watchdog_time = 0
   watchdog_max_dt = None
+  watchdog_slot: Optional[int] = None
   watchdog_seen = False
   shutting_down = False
 
@@ -97,9 +141,15 @@ class ManagerProcess(ABC):
       return
 
     try:
-      fn = WATCHDOG_FN + str(self.proc.pid)
-      # TODO: why can't pylint find struct.unpack?
-      self.last_watchdog_time = struct.unpack('Q', open(fn, "rb").read())[0] # pylint: disable=no-member
+      ts = None
+      if self.watchdog_slot is not None:
+        ts = watchdog_table.get(self.watchdog_slot, self.proc.pid)
+      if ts is None:
+        # not kicked through the table yet
+        fn = WATCHDOG_FN + str(self.proc.pid)
+        # TODO: why can't pylint find struct.unpack?
+        ts = struct.unpack('Q', open(fn, "rb").read())[0] # pylint: disable=no-member
+      self.last_watchdog_time = ts
     except Exception:
       pass
 
@@ -155,6 +205,15 @@ class ManagerProcess(ABC):
 
     return ret
 
+  def clear_watchdog(self) -> None:
+    self.watchdog_seen = False
+    if self.watchdog_slot is not None:
+      try:
+        watchdog_table.clear(self.watchdog_slot)
+      except OSError:
+        cloudlog.exception(f"failed to clear watchdog slot of {self.name}")
+        self.watchdog_slot = None
+
   def signal(self, sig: int) -> None:
     if self.proc is None:
       return
@@ -192,6 +251,7 @@ class NativeProcess(ManagerProcess):
     self.unkillable = unkillable
     self.sigkill = sigkill
     self.watchdog_max_dt = watchdog_max_dt
+    self.watchdog_slot = allocate_watchdog_slot() if watchdog_max_dt is not None else None
 
   def prepare(self) -> None:
     pass
@@ -206,9 +266,9 @@ class NativeProcess(ManagerProcess):
 
     cwd = os.path.join(BASEDIR, self.cwd)
     cloudlog.info(f"starting process {self.name}")
-    self.proc = Process(name=self.name, target=nativelauncher, args=(self.cmdline, cwd, self.name))
+    self.clear_watchdog()
+    self.proc = Process(name=self.name, target=nativelauncher, args=(self.cmdline, cwd, self.name, self.watchdog_slot))
     self.proc.start()
-    self.watchdog_seen = False
     self.shutting_down = False
 
 
@@ -222,6 +282,7 @@ class PythonProcess(ManagerProcess):
     self.unkillable = unkillable
     self.sigkill = sigkill
     self.watchdog_max_dt = watchdog_max_dt
+    self.watchdog_slot = allocate_watchdog_slot() if watchdog_max_dt is not None else None
 
   def prepare(self) -> None:
     if self.enabled:
@@ -237,9 +298,18 @@ class PythonProcess(ManagerProcess):
       return
 
     cloudlog.info(f"starting python {self.module}")
-    self.proc = Process(name=self.name, target=launcher, args=(self.module, self.name))
-    self.proc.start()
-    self.watchdog_seen = False
+    self.clear_watchdog()
+    if ENABLE_ZYGOTE:
+      try:
+        self.proc = zygote.Process(name=self.name, target=launcher, args=(self.module, self.name, cloudlog.global_ctx, self.watchdog_slot))
+        self.proc.start()
+      except Exception:
+        cloudlog.exception(f"failed to start {self.name} from the zygote, forking manager")
+        self.proc = None
+
+    if self.proc is None:
+      self.proc = Process(name=self.name, target=launcher, args=(self.module, self.name, None, self.watchdog_slot))
+      self.proc.start()
     self.shutting_down = False
 
 
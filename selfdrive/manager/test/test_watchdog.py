@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+import os
+import struct
+import sys
+import time
+import unittest
+from multiprocessing import Process
+from unittest import mock
+
+from common.basedir import BASEDIR
+from common.watchdog import WATCHDOG_FN, WatchdogTable
+from selfdrive.manager import process
+from selfdrive.manager.process import NativeProcess, join_process
+
+# kicks like a daemon for a while, then hangs
+HANG_SCRIPT = """import time
+from common.watchdog import kick
+t = time.monotonic()
+while time.monotonic() - t < {kick_time}:
+  kick()
+  time.sleep(0.01)
+time.sleep(1000)
+"""
+
+WATCHDOG_MAX_DT = 0.5
+NUM_WATCHED = 32
+
+
+def cpu_time(f, n):
+  t = time.process_time()
+  for _ in range(n):
+    f()
+  return time.process_time() - t
+
+
+class TestWatchdog(unittest.TestCase):
+  def setUp(self):
+    self.env = mock.patch.dict(os.environ, {"PYTHONPATH": BASEDIR})
+    self.env.start()
+
+  def tearDown(self):
+    self.env.stop()
+
+  def test_table(self):
+    table = WatchdogTable(os.path.join("/dev/shm", f"wd_table_test_{os.getpid()}"))
+    try:
+      self.assertIsNone(table.get(3, 1234))
+      table.kick(3, 1234)
+      self.assertIsNotNone(table.get(3, 1234))
+      self.assertIsNone(table.get(3, 4321))
+      self.assertIsNone(table.get(4, 1234))
+      table.clear(3)
+      self.assertIsNone(table.get(3, 1234))
+    finally:
+      os.remove(table.path)
+
+  def test_hung_process(self):
+    p = NativeProcess("hang", "", [sys.executable, "-c", HANG_SCRIPT.format(kick_time=1.0)], sigkill=True, watchdog_max_dt=WATCHDOG_MAX_DT)
+    self.assertIsNotNone(p.watchdog_slot)
+    try:
+      p.start()
+      first_pid = p.proc.pid
+      last_kick = 0
+      start = time.monotonic()
+      while p.proc.pid == first_pid:
+        self.assertLess(time.monotonic() - start, 10, "hung process wasn't restarted")
+        p.check_watchdog(False)
+        if p.watchdog_seen:
+          last_kick = p.last_watchdog_time
+        time.sleep(0.01)
+      restarted = time.clock_gettime_ns(time.CLOCK_BOOTTIME)
+
+      self.assertFalse(p.watchdog_seen)
+      self.assertGreater(last_kick, 0)
+      latency = (restarted - last_kick) / 1e9 - WATCHDOG_MAX_DT
+      print(f"\nhung process restarted {latency * 1000:.1f}ms after its watchdog expired")
+      self.assertLess(latency, 1.0)
+    finally:
+      p.stop()
+
+  def test_check_cpu_usage(self):
+    procs = []
+    for i in range(NUM_WATCHED):
+      p = NativeProcess(f"watched{i}", "", ["true"], watchdog_max_dt=WATCHDOG_MAX_DT)
+      p.watchdog_slot = i
+      p.proc = mock.Mock(pid=10_000_000 + i, exitcode=None)
+      procs.append(p)
+
+    table = WatchdogTable(os.path.join("/dev/shm", f"wd_table_test_{os.getpid()}"))
+    try:
+      now = time.clock_gettime_ns(time.CLOCK_BOOTTIME)
+      for p in procs:
+        table.kick(p.watchdog_slot, p.proc.pid)
+        with open(WATCHDOG_FN + str(p.proc.pid), "wb") as f:
+          f.write(struct.pack("Q", now))
+
+      def check_all():
+        for p in procs:
+          p.check_watchdog(False)
+
+      n = 200
+      with mock.patch.object(process, "watchdog_table", table):
+        table_time = cpu_time(check_all, n)
+        self.assertTrue(all(p.last_watchdog_time == table.get(p.watchdog_slot, p.proc.pid) for p in procs))
+
+        for p in procs:
+          p.watchdog_slot = None
+        file_time = cpu_time(check_all, n)
+        self.assertTrue(all(p.last_watchdog_time == now for p in procs))
+    finally:
+      os.remove(table.path)
+      for p in procs:
+        os.remove(WATCHDOG_FN + str(p.proc.pid))
+
+    print(f"\ncheck_watchdog for {NUM_WATCHED} processes: table {table_time / n * 1e6:.0f}us, files {file_time / n * 1e6:.0f}us")
+    self.assertLess(table_time, file_time)
+
+  def test_join(self):
+    def join(sentinel):
+      proc = Process(target=time.sleep, args=(0.5,))
+      proc.start()
+      t, cpu = time.monotonic(), time.process_time()
+      if sentinel:
+        join_process(proc, 5)
+      else:
+        with mock.patch("multiprocessing.connection.wait", return_value=[]):
+          join_process(proc, 5)
+      t, cpu = time.monotonic() - t, time.process_time() - cpu
+      self.assertIsNotNone(proc.exitcode)
+      return t, cpu
+
+    results = {"sentinel": join(True), "polling": join(False)}
+    print()
+    for name, (t, cpu) in results.items():
+      print(f"join with {name}: {t * 1000:.1f}ms, {cpu * 1000:.1f}ms cpu")
+    self.assertLess(results["sentinel"][1], results["polling"][1])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+import multiprocessing.forkserver
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from selfdrive.manager import process
+from selfdrive.manager.process import PythonProcess, start_zygote
+from selfdrive.manager.process_config import managed_processes
+
+PACKAGE = "zygote_test_daemons"
+
+# stands in for a daemon: pays for the imports of the real one, then sends its first message
+DAEMON_TEMPLATE = """import os
+import time
+{imports}
+
+
+def main():
+  with open(os.path.join({out_dir!r}, {name!r}), "w") as f:
+    f.write(repr(time.monotonic()))
+"""
+
+
+def importable(module):
+  # checked in a new interpreter, importing here would make every start warm
+  return subprocess.run([sys.executable, "-c", f"import {module}"], capture_output=True).returncode == 0
+
+
+class TestZygote(unittest.TestCase):
+  @classmethod
+  def setUpClass(cls):
+    cls.tmp = tempfile.mkdtemp()
+    cls.out_dir = os.path.join(cls.tmp, "out")
+    os.makedirs(os.path.join(cls.tmp, PACKAGE))
+    os.mkdir(cls.out_dir)
+    open(os.path.join(cls.tmp, PACKAGE, "__init__.py"), "w").close()
+
+    cls.daemons = {p.name: p.module for p in managed_processes.values()
+                   if isinstance(p, PythonProcess) and p.enabled and importable(p.module)}
+    for name, module in list(cls.daemons.items()) + [("warmup", None)]:
+      with open(os.path.join(cls.tmp, PACKAGE, f"{name}.py"), "w") as f:
+        f.write(DAEMON_TEMPLATE.format(imports=f"import {module}  # noqa: F401" if module else "", out_dir=cls.out_dir, name=name))
+    # fails to import while the flag file exists
+    cls.broken_flag = os.path.join(cls.tmp, "broken")
+    with open(os.path.join(cls.tmp, PACKAGE, "broken.py"), "w") as f:
+      f.write(DAEMON_TEMPLATE.format(imports=f"if os.path.exists({cls.broken_flag!r}):\n  raise RuntimeError('broken')", out_dir=cls.out_dir, name="broken"))
+    sys.path.insert(0, cls.tmp)
+    cls.env = mock.patch.dict(os.environ, {"PYTHONPATH": os.pathsep.join([cls.tmp, os.environ.get("PYTHONPATH", "")])})
+    cls.env.start()
+
+  def tearDown(self):
+    # the next test starts its own zygote
+    multiprocessing.forkserver._forkserver._stop()  # pylint: disable=protected-access
+
+  @classmethod
+  def tearDownClass(cls):
+    cls.env.stop()
+    sys.path.remove(cls.tmp)
+    shutil.rmtree(cls.tmp)
+
+  def start_time(self, name):
+    """Seconds from starting a daemon to its first message"""
+    p = PythonProcess(name, f"{PACKAGE}.{name}")
+    fn = os.path.join(self.out_dir, name)
+
+    start = time.monotonic()
+    p.start()
+    while not os.path.exists(fn) or os.path.getsize(fn) == 0:
+      self.assertLess(time.monotonic() - start, 30, f"{name} didn't start")
+      time.sleep(0.001)
+    with open(fn) as f:
+      first_message = float(f.read())
+
+    p.stop()
+    os.remove(fn)
+    return first_message - start
+
+  def test_broken_module(self):
+    with mock.patch.object(process, "ENABLE_ZYGOTE", True):
+      open(self.broken_flag, "w").close()
+      start_zygote([f"{PACKAGE}.broken", f"{PACKAGE}.warmup"])
+      self.start_time("warmup")
+      # the zygote survived, and the process is imported again when it's started
+      os.remove(self.broken_flag)
+      self.start_time("broken")
+
+  def test_zygote_start_fails(self):
+    with mock.patch.object(process, "ENABLE_ZYGOTE", True), mock.patch.object(process.zygote, "Process", side_effect=OSError):
+      self.start_time("warmup")
+
+  def test_start_time(self):
+    self.assertGreater(len(self.daemons), 0)
+
+    # forked from a parent that didn't import them, every start pays for the imports
+    with mock.patch.object(process, "ENABLE_ZYGOTE", False):
+      cold = {name: self.start_time(name) for name in self.daemons}
+
+    with mock.patch.object(process, "ENABLE_ZYGOTE", True):
+      start_zygote([f"{PACKAGE}.{name}" for name in self.daemons])
+      # waits for the zygote to finish importing
+      self.start_time("warmup")
+      zygote = {name: self.start_time(name) for name in self.daemons}
+
+    # forked from manager after manager_prepare imported them
+    with mock.patch.object(process, "ENABLE_ZYGOTE", False):
+      for name in self.daemons:
+        PythonProcess(name, f"{PACKAGE}.{name}").prepare()
+      prepared = {name: self.start_time(name) for name in self.daemons}
+
+    print(f"\n{'daemon':<16}{'cold':>10}{'prepared':>10}{'zygote':>10}")
+    for name in self.daemons:
+      print(f"{name:<16}{cold[name] * 1000:>8.1f}ms{prepared[name] * 1000:>8.1f}ms{zygote[name] * 1000:>8.1f}ms")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,18 @@
+"""Preloaded by the server python processes are forked from, see start_zygote.
+Sets up what they used to inherit from manager, once for all of them, and
+imports the processes listed in ZYGOTE_PRELOAD."""
+import importlib
+import os
+
+import selfdrive.sentry as sentry
+from selfdrive.swaglog import cloudlog
+
+sentry.init(sentry.SentryProject.SELFDRIVE)
+
+# the forkserver only survives an ImportError in its preload, a process
+# that fails to import any other way is imported again when it's started
+for module in ['selfdrive.manager.process'] + [m for m in os.getenv('ZYGOTE_PRELOAD', '').split(',') if m]:
+  try:
+    importlib.import_module(module)
+  except Exception:
+    cloudlog.exception(f"zygote failed to preimport {module}")
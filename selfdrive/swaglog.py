@@ -1,8 +1,14 @@
+import copy
+import gzip
 import logging
 import os
+import shutil
+import threading
 import time
+from collections import deque
 from pathlib import Path
 from logging.handlers import BaseRotatingHandler
+from multiprocessing.util import Finalize
 
 import zmq
 
@@ -14,6 +20,8 @@ if PC:
 else:
   SWAGLOG_DIR = "/data/log/"
 
+LOG_MESSAGE_SOCKET = "ipc:///tmp/logmessage"
+
 def get_file_handler():
   Path(SWAGLOG_DIR).mkdir(parents=True, exist_ok=True)
   base_filename = os.path.join(SWAGLOG_DIR, "swaglog")
@@ -21,14 +29,15 @@ def get_file_handler():
   return handler
 
 class SwaglogRotatingFileHandler(BaseRotatingHandler):
-  def __init__(self, base_filename, interval=60, max_bytes=1024*256, backup_count=2500, encoding=None):
+  def __init__(self, base_filename, interval=60, max_bytes=1024*256, backup_count=2500, encoding=None, compress=False):
     super().__init__(base_filename, mode="a", encoding=encoding, delay=True)
     self.base_filename = base_filename
     self.interval = interval # seconds
     self.max_bytes = max_bytes
     self.backup_count = backup_count
+    self.compress = compress # gzip files once rotated out
     self.log_files = self.get_existing_logfiles()
-    log_indexes = [f.split(".")[-1] for f in self.log_files]
+    log_indexes = [f[len(self.base_filename) + 1:].split(".")[0] for f in self.log_files]
     self.last_file_idx = max([int(i) for i in log_indexes if i.isdigit()] or [-1])
     self.last_rollover = None
     self.doRollover()
@@ -58,6 +67,8 @@ class SwaglogRotatingFileHandler(BaseRotatingHandler):
   def doRollover(self):
     if self.stream:
       self.stream.close()
+      if self.compress:
+        self.compress_file(0)
     self.stream = self._open()
 
     if self.backup_count > 0:
@@ -66,17 +77,28 @@ class SwaglogRotatingFileHandler(BaseRotatingHandler):
         if os.path.exists(to_delete): # just being safe, should always exist
           os.remove(to_delete)
 
+  def compress_file(self, idx):
+    fn = self.log_files[idx]
+    try:
+      with open(fn, "rb") as f_in, gzip.open(fn + ".gz", "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+      os.remove(fn)
+      self.log_files[idx] = fn + ".gz"
+    except OSError:
+      pass
+
 class UnixDomainSocketHandler(logging.Handler):
-  def __init__(self, formatter):
+  def __init__(self, formatter, addr=LOG_MESSAGE_SOCKET):
     logging.Handler.__init__(self)
     self.setFormatter(formatter)
+    self.addr = addr
     self.pid = None
 
   def connect(self):
     self.zctx = zmq.Context()
     self.sock = self.zctx.socket(zmq.PUSH)
     self.sock.setsockopt(zmq.LINGER, 10)
-    self.sock.connect("ipc:///tmp/logmessage")
+    self.sock.connect(self.addr)
     self.pid = os.getpid()
 
   def emit(self, record):
@@ -93,6 +115,125 @@ class UnixDomainSocketHandler(logging.Handler):
       pass
 
 
+def snapshot(v):
+  """Copy of v, and of the lists, dicts and sets directly in it"""
+  if isinstance(v, dict):
+    v = copy.copy(v)
+    for k, item in v.items():
+      if isinstance(item, (list, dict, set)):
+        v[k] = copy.copy(item)
+  elif isinstance(v, (list, tuple)):
+    v = type(v)(copy.copy(item) if isinstance(item, (list, dict, set)) else item for item in v)
+  elif isinstance(v, set):
+    v = set(v)
+  return v
+
+
+class AsyncUnixDomainSocketHandler(UnixDomainSocketHandler):
+  """
+  Sends the same messages as UnixDomainSocketHandler, but emit only queues the record.
+  A background thread formats the records and sends them in batches, one multipart
+  message each. When more than max_queue records are waiting new ones are dropped,
+  and the number dropped is logged once the queue has room again.
+
+  Records are formatted after emit returns, so the message and its arguments are
+  copied one level deep. Containers nested deeper than that must not be changed
+  after logging them.
+  """
+  def __init__(self, formatter, addr=LOG_MESSAGE_SOCKET, max_queue=10000, max_batch=100, interval=0.05):
+    super().__init__(formatter, addr)
+    self.max_queue = max_queue
+    self.max_batch = max_batch
+    self.interval = interval
+
+    # deque appends and pops are atomic, emit never waits on the sender
+    self.queue = deque()
+    self.dropped = 0
+    self.dropped_lock = threading.Lock()
+    self.thread_pid = None
+
+  def start(self):
+    # a forked child has the parent's queue and locks but not its thread
+    self.queue = deque()
+    self.dropped = 0
+    self.dropped_lock = threading.Lock()
+    self.send_lock = threading.Lock()
+    self.wake = threading.Event()
+    self.thread_pid = os.getpid()
+    threading.Thread(target=self.sender_thread, name="swaglog", daemon=True).start()
+
+    # manager's python processes end in os._exit, which skips logging.shutdown.
+    # multiprocessing runs finalizers before that, and at exit in other processes
+    Finalize(self, self.flush, exitpriority=0)
+
+  def add_dropped(self, n):
+    with self.dropped_lock:
+      self.dropped += n
+
+  def take_dropped(self):
+    with self.dropped_lock:
+      dropped, self.dropped = self.dropped, 0
+    return dropped
+
+  def emit(self, record):
+    if os.getpid() != self.thread_pid:
+      self.start()
+
+    if len(self.queue) >= self.max_queue:
+      self.add_dropped(1)
+      return
+
+    # the caller may change what it logged once we return
+    record.msg = snapshot(record.msg)
+    if record.args:
+      record.args = snapshot(record.args)
+    record.swaglog_ctx = self.formatter.swaglogger.get_ctx()
+    self.queue.append(record)
+    if len(self.queue) == self.max_batch:
+      self.wake.set()
+
+  def sender_thread(self):
+    while True:
+      self.wake.wait(self.interval)
+      self.wake.clear()
+      self.flush()
+
+  def flush(self):
+    if os.getpid() != self.thread_pid:
+      return
+
+    with self.send_lock:
+      if os.getpid() != self.pid:
+        self.connect()
+
+      while self.queue or self.dropped:
+        parts = []
+        dropped = self.take_dropped()
+        if dropped:
+          dropped_record = self.formatter.swaglogger.makeRecord(self.formatter.swaglogger.name, logging.WARNING, __file__, 0,
+                                                                {'event': 'swaglog_dropped', 'count': dropped}, None, None)
+          parts.append(self.serialize(dropped_record))
+
+        while self.queue and len(parts) < self.max_batch:
+          record = self.queue.popleft()
+          try:
+            parts.append(self.serialize(record))
+          except Exception:
+            self.handleError(record)
+          # hand the GIL back between records, the logging thread could be waiting for it
+          time.sleep(0)
+
+        try:
+          if parts:
+            self.sock.send_multipart(parts, zmq.NOBLOCK)
+        except zmq.error.Again:
+          self.add_dropped(dropped + len(parts) - (1 if dropped else 0))
+          break
+
+  def serialize(self, record):
+    return (chr(record.levelno) + self.format(record).rstrip('\n')).encode('utf8')
+
+
 def add_file_handler(log):
   """
   Function to add the file log handler to swaglog.
@@ -118,5 +259,6 @@ elif print_level == 'warning':
   outhandler.setLevel(logging.WARNING)
 
 log.addHandler(outhandler)
-# logs are sent through IPC before writing to disk to prevent disk I/O blocking
-log.addHandler(UnixDomainSocketHandler(SwagFormatter(log)))
+# logs are sent through IPC before writing to disk to prevent disk I/O blocking,
+# and from a background thread to keep formatting and sending off the caller's thread
+log.addHandler(AsyncUnixDomainSocketHandler(SwagFormatter(log)))
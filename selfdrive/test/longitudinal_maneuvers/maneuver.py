@@ -1,3 +1,5 @@
+import multiprocessing
+
 import numpy as np
 from selfdrive.test.longitudinal_maneuvers.plant import Plant
 
@@ -21,41 +23,57 @@ class Maneuver():
     self.duration = duration
     self.title = title
 
-  def evaluate(self):
+  def evaluate(self, headless=True):
     plant = Plant(
       lead_relevancy=self.lead_relevancy,
       speed=self.speed,
       distance_lead=self.distance_lead,
       only_lead2=self.only_lead2,
-      only_radar=self.only_radar
+      only_radar=self.only_radar,
+      headless=headless,
     )
 
+    # inputs of every step, on the plant's clock
+    times = np.arange(int(self.duration * plant.rate) + 2) / plant.rate
+    times = times[times < self.duration]
+    speed_leads = np.interp(times, self.breakpoints, self.speed_lead_values)
+    probs = np.interp(times, self.breakpoints, self.prob_lead_values)
+    cruises = np.interp(times, self.breakpoints, self.cruise_values)
+
     valid = True
-    logs = []
-    while plant.current_time() < self.duration:
-      speed_lead = np.interp(plant.current_time(), self.breakpoints, self.speed_lead_values)
-      prob = np.interp(plant.current_time(), self.breakpoints, self.prob_lead_values)
-      cruise = np.interp(plant.current_time(), self.breakpoints, self.cruise_values)
+    logs = np.empty((len(times), 6))
+    for i, (speed_lead, prob, cruise) in enumerate(zip(speed_leads, probs, cruises)):
       log = plant.step(speed_lead, prob, cruise)
 
       d_rel = log['distance_lead'] - log['distance'] if self.lead_relevancy else 200.
       v_rel = speed_lead - log['speed'] if self.lead_relevancy else 0.
-      log['d_rel'] = d_rel
-      log['v_rel'] = v_rel
-      logs.append(np.array([plant.current_time(),
-                            log['distance'],
-                            log['distance_lead'],
-                            log['speed'],
-                            speed_lead,
-                            log['acceleration']]))
+      logs[i] = (plant.current_time(),
+                 log['distance'],
+                 log['distance_lead'],
+                 log['speed'],
+                 speed_lead,
+                 log['acceleration'])
 
       if d_rel < .4 and (self.only_radar or prob > 0.5):
-        print("Crashed!!!!")
+        if not headless:
+          print("Crashed!!!!")
+        valid = False
+
+      if self.ensure_start and v_rel > 0 and log['speeds'][-1] <= 0.1:
+        if not headless:
+          print('Planner not starting!')
         valid = False
-        
-      if self.ensure_start and log['v_rel'] > 0 and log['speeds'][-1] <= 0.1:
-        print('Planner not starting!')
-        valid = False 
 
-    print("maneuver end", valid)
-    return valid, np.array(logs)
+    if not headless:
+      print("maneuver end", valid)
+    return valid, logs
+
+
+def evaluate_maneuver(maneuver):
+  return maneuver.evaluate()
+
+
+def run_maneuvers(maneuvers, processes=None):
+  """Evaluates headless maneuvers in parallel, returns (valid, logs) of each"""
+  with multiprocessing.Pool(processes) as pool:
+    return pool.map(evaluate_maneuver, maneuvers, chunksize=1)
@@ -13,10 +13,13 @@ class Plant():
   messaging_initialized = False
 
   def __init__(self, lead_relevancy=False, speed=0.0, distance_lead=2.0,
-               only_lead2=False, only_radar=False):
+               only_lead2=False, only_radar=False, headless=False):
     self.rate = 1. / DT_MDL
+    # headless plants only count frames, without sockets, sleeping or printing
+    self.headless = headless
+    self.frame = 0
 
-    if not Plant.messaging_initialized:
+    if not headless and not Plant.messaging_initialized:
       Plant.radar = messaging.pub_sock('radarState')
       Plant.controls_state = messaging.pub_sock('controlsState')
       Plant.car_state = messaging.pub_sock('carState')
@@ -36,17 +39,18 @@ class Plant():
     self.only_lead2=only_lead2
     self.only_radar=only_radar
 
-    self.rk = Ratekeeper(self.rate, print_delay_threshold=100.0)
     self.ts = 1. / self.rate
-    time.sleep(1)
-    self.sm = messaging.SubMaster(['longitudinalPlan'])
+    if not headless:
+      self.rk = Ratekeeper(self.rate, print_delay_threshold=100.0)
+      time.sleep(1)
+      self.sm = messaging.SubMaster(['longitudinalPlan'])
 
     from selfdrive.car.hyundai.values import CAR
     from selfdrive.car.hyundai.interface import CarInterface
     self.planner = Planner(CarInterface.get_params(CAR.GRANDEUR_IG), init_v=self.speed)
 
   def current_time(self):
-    return float(self.rk.frame) / self.rate
+    return float(self.frame) / self.rate
 
   def step(self, v_lead=0.0, prob=1.0, v_cruise=50.):
     # ******** publish a fake model going straight and fake calibration ********
@@ -111,22 +115,24 @@ class Plant():
       self.acceleration = 0
     self.distance = self.distance + self.speed * self.ts
 
-    # *** radar model ***
-    if self.lead_relevancy:
-      d_rel = np.maximum(0., self.distance_lead - self.distance)
-      v_rel = v_lead - self.speed
-    else:
-      d_rel = 200.
-      v_rel = 0.
+    if not self.headless:
+      # *** radar model ***
+      if self.lead_relevancy:
+        d_rel = np.maximum(0., self.distance_lead - self.distance)
+        v_rel = v_lead - self.speed
+      else:
+        d_rel = 200.
+        v_rel = 0.
 
-    # print at 5hz
-    if (self.rk.frame % (self.rate // 5)) == 0:
-      print("%2.2f sec   %6.2f m  %6.2f m/s  %6.2f m/s2   lead_rel: %6.2f m  %6.2f m/s"
-            % (self.current_time(), self.distance, self.speed, self.acceleration, d_rel, v_rel))
+      # print at 5hz
+      if (self.frame % (self.rate // 5)) == 0:
+        print("%2.2f sec   %6.2f m  %6.2f m/s  %6.2f m/s2   lead_rel: %6.2f m  %6.2f m/s"
+              % (self.current_time(), self.distance, self.speed, self.acceleration, d_rel, v_rel))
 
+      self.rk.monitor_time()
 
     # ******** update prevs ********
-    self.rk.monitor_time()
+    self.frame += 1
 
     return {
       "distance": self.distance,
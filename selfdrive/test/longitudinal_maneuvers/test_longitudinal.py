@@ -1,10 +1,14 @@
 #!/usr/bin/env python3
 import os
+import time
 import unittest
 
+import numpy as np
+
 from common.params import Params
+from common.realtime import DT_MDL
 from selfdrive.controls.lib.longitudinal_mpc_lib.long_mpc import STOP_DISTANCE
-from selfdrive.test.longitudinal_maneuvers.maneuver import Maneuver
+from selfdrive.test.longitudinal_maneuvers.maneuver import Maneuver, run_maneuvers
 
 
 # TODO: make new FCW tests
@@ -133,16 +137,37 @@ class LongitudinalControl(unittest.TestCase):
     params.put_bool("Passive", bool(os.getenv("PASSIVE")))
     params.put_bool("OpenpilotEnabledToggle", True)
 
-  # hack
-  def test_longitudinal_setup(self):
-    pass
+    # headless, in parallel
+    t = time.monotonic()
+    cls.results = run_maneuvers(maneuvers)
+    cls.run_time = time.monotonic() - t
+
+  def test_run_time(self):
+    simulated = sum(man.duration for man in maneuvers)
+    print(f"{len(maneuvers)} maneuvers, {simulated:.0f}s simulated in {self.run_time:.1f}s")
+
+  def test_headless_trajectory(self):
+    # the frame clock doesn't change what the planner does
+    man = Maneuver(
+      'approach slower car',
+      duration=3.,
+      initial_speed=20.,
+      lead_relevancy=True,
+      initial_distance_lead=60.,
+      speed_lead_values=[20., 10.],
+      breakpoints=[0., 3.],
+    )
+    valid, logs = man.evaluate()
+    plant_valid, plant_logs = man.evaluate(headless=False)
+    self.assertEqual(valid, plant_valid)
+    np.testing.assert_array_equal(logs, plant_logs)
 
 
 def run_maneuver_worker(k):
   def run(self):
     man = maneuvers[k]
-    print(man.title)
-    valid, _ = man.evaluate()
+    valid, logs = self.results[k]
+    self.assertEqual(len(logs), round(man.duration / DT_MDL))
     self.assertTrue(valid, msg=man.title)
   return run
 
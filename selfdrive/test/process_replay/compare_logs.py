@@ -4,8 +4,11 @@ import os
 import sys
 import math
 import numbers
+import capnp
 import dictdiffer
+import numpy as np
 from collections import Counter
+from capnp.lib.capnp import _DynamicEnum, _DynamicListReader, _DynamicStructBuilder, _DynamicStructReader  # pylint: disable=no-name-in-module
 
 if "CI" in os.environ:
   def tqdm(x):
@@ -53,18 +56,205 @@ def remove_ignored_fields(msg, ignore):
   return msg.as_reader()
 
 
-def compare_logs(log1, log2, ignore_fields=None, ignore_msgs=None, tolerance=None):
-  if ignore_fields is None:
-    ignore_fields = []
-  if ignore_msgs is None:
-    ignore_msgs = []
+def _outside_tolerance(a, b, tolerance):
+  """Scalar check matching dictdiffer's are_different followed by the absolute tolerance filter"""
+  if a == b:
+    return False
+  a_nan, b_nan = a != a, b != b
+  if a_nan or b_nan:
+    return not (a_nan and b_nan)
+  if not (isinstance(a, numbers.Number) and isinstance(b, numbers.Number)):
+    return True
+  try:
+    if math.isclose(a, b, rel_tol=EPSILON):
+      return False
+    if math.isfinite(a) and math.isfinite(b):
+      return abs(a - b) > max(tolerance, tolerance * max(abs(a), abs(b)))
+  except TypeError:
+    pass
+  return True
+
+
+def _to_plain(v):
+  if isinstance(v, _DynamicStructReader):
+    return v.to_dict(verbose=True)
+  elif isinstance(v, _DynamicListReader):
+    return [_to_plain(x) for x in v]
+  elif isinstance(v, _DynamicEnum):
+    return str(v)
+  return v
+
+
+def _node(path):
+  # dictdiffer reports all-string paths in dot notation and anything else as a list
+  if all(isinstance(k, str) for k in path):
+    return ".".join(path)
+  return list(path)
+
+
+class _MsgDiffer:
+  """Diffs two capnp readers in a single traversal, producing the same output as
+  dictdiffer on their verbose dicts. Messages and subtrees are first compared by
+  their serialized bytes and only walked if those differ."""
+
+  def __init__(self, ignore, tolerance):
+    self.ignore = set()
+    for key in ignore:
+      self.ignore.add(tuple(key.split(".")) if isinstance(key, str) else tuple(key))
+    self.ignore_prefixes = {key[:i] for key in self.ignore for i in range(len(key))}
+    self.tolerance = tolerance
+    self.struct_keys = {}
+
+  def layout(self, r):
+    schema = r.schema
+    node_id = schema.node.id
+    if node_id not in self.struct_keys:
+      self.struct_keys[node_id] = (len(schema.union_fields) > 0, list(schema.non_union_fields), schema.node.struct.isGroup)
+    return self.struct_keys[node_id]
+
+  def keys(self, r):
+    has_union, fields, _ = self.layout(r)
+    return [r.which()] + fields if has_union else fields
+
+  def canonical_bytes(self, msg):
+    # serialize a copy of the message with all ignored numeric fields zeroed
+    which = msg.which()
+    msg = msg.as_builder()
+    for key in self.ignore:
+      if (len(key) > 1 and key[0] != which) or not all(isinstance(k, str) for k in key):
+        continue
+      try:
+        attr = msg
+        for k in key[:-1]:
+          attr = getattr(attr, k)
+        v = getattr(attr, key[-1])
+      except (AttributeError, capnp.KjException):
+        continue
+      if isinstance(v, bool):
+        setattr(attr, key[-1], False)
+      elif isinstance(v, numbers.Number):
+        setattr(attr, key[-1], 0)
+      else:
+        return None
+    return msg.to_bytes()
+
+  def diff(self, msg1, msg2):
+    out = []
+    msg1_bytes, msg2_bytes = self.canonical_bytes(msg1), self.canonical_bytes(msg2)
+    if msg1_bytes is None or msg1_bytes != msg2_bytes:
+      self.diff_struct(msg1, msg2, (), out, True)
+    return out
+
+  def diff_struct(self, a, b, path, out, canonical):
+    # groups share their parent's storage and can't be serialized on their own
+    if canonical and path not in self.ignore_prefixes and not self.layout(a)[2]:
+      if a.as_builder().to_bytes() == b.as_builder().to_bytes():
+        return
+      canonical = False
+
+    keys_a, keys_b = self.keys(a), self.keys(b)
+    keys_a = [k for k in keys_a if path + (k,) not in self.ignore]
+    keys_b = [k for k in keys_b if path + (k,) not in self.ignore]
+
+    for k in keys_a:
+      if k in keys_b:
+        self.diff_value(getattr(a, k), getattr(b, k), path + (k,), out, canonical)
+
+    addition = [(k, _to_plain(getattr(b, k))) for k in keys_b if k not in keys_a]
+    if addition:
+      out.append(("add", _node(path), addition))
+    deletion = [(k, _to_plain(getattr(a, k))) for k in keys_a if k not in keys_b]
+    if deletion:
+      out.append(("remove", _node(path), deletion))
+
+  def diff_list(self, a, b, path, out, canonical):
+    a, b = list(a), list(b)
+    n = min(len(a), len(b))
+
+    if n and type(a[0]) in (float, int, bool):
+      for i in self.numeric_candidates(a[:n], b[:n]):
+        if _outside_tolerance(a[i], b[i], self.tolerance):
+          out.append(("change", _node(path + (i,)), (a[i], b[i])))
+    else:
+      for i in range(n):
+        self.diff_value(a[i], b[i], path + (i,), out, canonical)
+
+    if len(b) > n:
+      out.append(("add", _node(path), [(i, _to_plain(b[i])) for i in range(n, len(b))]))
+    if len(a) > n:
+      out.append(("remove", _node(path), [(i, _to_plain(a[i])) for i in reversed(range(n, len(a)))]))
 
+  def numeric_candidates(self, a, b):
+    xa, xb = np.array(a), np.array(b)
+    if xa.dtype.kind != 'f' or xb.dtype.kind != 'f':
+      # exact screening for ints and bools, the scalar check handles the rest
+      if xa.dtype == object or xb.dtype == object:
+        return range(len(a))
+      return np.flatnonzero(xa != xb)
+
+    with np.errstate(invalid='ignore', over='ignore'):
+      delta = np.abs(xa - xb)
+      scale = np.maximum(np.abs(xa), np.abs(xb))
+      finite = np.isfinite(xa) & np.isfinite(xb)
+      within = finite & ((delta <= EPSILON * scale) | (delta <= np.maximum(self.tolerance, self.tolerance * scale)))
+    both_nan = np.isnan(xa) & np.isnan(xb)
+    return np.flatnonzero((xa != xb) & ~both_nan & ~within)
+
+  def diff_value(self, a, b, path, out, canonical):
+    t = type(a)
+    if t is _DynamicStructReader:
+      self.diff_struct(a, b, path, out, canonical)
+    elif t is _DynamicListReader:
+      self.diff_list(a, b, path, out, canonical)
+    else:
+      if t is _DynamicEnum:
+        a, b = str(a), str(b)
+      if a != b and _outside_tolerance(a, b, self.tolerance):
+        out.append(("change", _node(path), (a, b)))
+
+
+def filter_and_align(log1, log2, ignore_msgs):
   log1, log2 = (list(filter(lambda m: m.which() not in ignore_msgs, log)) for log in (log1, log2))
 
   if len(log1) != len(log2):
     cnt1 = Counter(m.which() for m in log1)
     cnt2 = Counter(m.which() for m in log2)
     raise Exception(f"logs are not same length: {len(log1)} VS {len(log2)}\n\t\t{cnt1}\n\t\t{cnt2}")
+  return log1, log2
+
+
+def compare_logs(log1, log2, ignore_fields=None, ignore_msgs=None, tolerance=None):
+  if ignore_fields is None:
+    ignore_fields = []
+  if ignore_msgs is None:
+    ignore_msgs = []
+  tolerance = EPSILON if tolerance is None else tolerance
+
+  log1, log2 = filter_and_align(log1, log2, ignore_msgs)
+  differ = _MsgDiffer(ignore_fields, tolerance)
+
+  diff = []
+  for msg1, msg2 in tqdm(zip(log1, log2)):
+    if msg1.which() != msg2.which():
+      print(msg1, msg2)
+      raise Exception("msgs not aligned between logs")
+
+    if isinstance(msg1, _DynamicStructBuilder):
+      msg1 = msg1.as_reader()
+    if isinstance(msg2, _DynamicStructBuilder):
+      msg2 = msg2.as_reader()
+    diff.extend(differ.diff(msg1, msg2))
+  return diff
+
+
+def compare_logs_dictdiffer(log1, log2, ignore_fields=None, ignore_msgs=None, tolerance=None):
+  """Reference implementation of compare_logs, rebuilding every message and diffing it as a dict"""
+  if ignore_fields is None:
+    ignore_fields = []
+  if ignore_msgs is None:
+    ignore_msgs = []
+
+  log1, log2 = filter_and_align(log1, log2, ignore_msgs)
 
   diff = []
   for msg1, msg2 in tqdm(zip(log1, log2)):
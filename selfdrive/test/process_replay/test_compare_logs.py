@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+import math
+import random
+import time
+import unittest
+
+from cereal import log
+from selfdrive.test.process_replay.compare_logs import compare_logs, compare_logs_dictdiffer
+
+IGNORE = ["logMonoTime", "valid", "controlsState.startMonoTime", "controlsState.cumLagMs"]
+
+
+def make_msgs(rng, n, perturb):
+  def f(x):
+    if not perturb or rng.random() > 0.2:
+      return x
+    return rng.choice([x + 1e-9, x * 1.5, float('nan'), float('inf'), x])
+
+  msgs = []
+  for i in range(n):
+    kind = ["controlsState", "modelV2", "carState", "radarState"][i % 4]
+    m = log.Event.new_message()
+    m.logMonoTime = i * 10000000 + (rng.randint(0, 1000) if perturb else 0)
+    m.valid = not perturb or rng.random() > 0.1
+    if kind == "controlsState":
+      cs = m.init("controlsState")
+      cs.startMonoTime = rng.randint(0, 2**32)
+      cs.cumLagMs = rng.random()
+      cs.vCruise = f(30. + i)
+      cs.curvature = f(0.001 * i)
+      cs.enabled = perturb and rng.random() > 0.5
+      cs.alertText1 = "test" if perturb and rng.random() > 0.8 else ""
+      if perturb and rng.random() > 0.5:
+        cs.lateralControlState.init("indiState").steeringAngleDeg = f(1.)
+      else:
+        cs.lateralControlState.init("pidState").output = f(0.5)
+    elif kind == "modelV2":
+      mv = m.init("modelV2")
+      mv.frameId = i
+      mv.position.x = [f(0.1 * j) for j in range(33)]
+      mv.position.y = [f(0.01 * j) for j in range(33 if not perturb or rng.random() > 0.1 else 30)]
+      mv.laneLineProbs = [f(0.9), f(0.8), f(0.7), f(0.6)]
+      mv.meta.desirePrediction = [f(0.1)] * 32
+    elif kind == "carState":
+      cs = m.init("carState")
+      cs.vEgo = f(10. + i)
+      cs.gearShifter = "drive" if not perturb or rng.random() > 0.1 else "park"
+      cs.buttonEvents = [{"pressed": True, "type": "accelCruise"}] * (1 if not perturb or rng.random() > 0.2 else 2)
+    else:
+      rs = m.init("radarState")
+      rs.cumLagMs = rng.random()
+      rs.leadOne.dRel = f(20.)
+      rs.leadOne.status = True
+      rs.radarErrors = ["fault"] if perturb and rng.random() > 0.7 else []
+    msgs.append(m.as_reader())
+  return msgs
+
+
+def normalize(diff):
+  # NaNs never compare equal, replace them so the diffs can be compared
+  def norm(v):
+    if isinstance(v, float) and math.isnan(v):
+      return "nan"
+    if isinstance(v, (list, tuple)):
+      return type(v)(norm(x) for x in v)
+    if isinstance(v, dict):
+      return {k: norm(x) for k, x in v.items()}
+    return v
+  return [norm(d) for d in diff]
+
+
+class TestCompareLogs(unittest.TestCase):
+
+  def setUp(self):
+    rng = random.Random(0)
+    self.ref = make_msgs(random.Random(0), 400, False)
+    self.new = make_msgs(rng, 400, True)
+
+  def test_identical(self):
+    self.assertEqual(compare_logs(self.ref, self.ref, IGNORE), [])
+
+  def test_parity(self):
+    for tolerance in (None, 1e-4, 1e-2):
+      for ignore in ([], IGNORE):
+        expected = compare_logs_dictdiffer(self.ref, self.new, ignore, tolerance=tolerance)
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(normalize(compare_logs(self.ref, self.new, ignore, tolerance=tolerance)), normalize(expected))
+
+  def test_benchmark(self):
+    for name, fn in (("dictdiffer", compare_logs_dictdiffer), ("single traversal", compare_logs)):
+      for other in (self.ref, self.new):
+        times = []
+        for _ in range(5):
+          t = time.monotonic()
+          fn(self.ref, other, IGNORE, tolerance=1e-4)
+          times.append(time.monotonic() - t)
+        print(f"{name}, {'matching' if other is self.ref else 'perturbed'}: {min(times) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+  unittest.main()
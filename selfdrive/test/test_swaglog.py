@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+import glob
+import multiprocessing
+import gzip
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import zmq
+
+from common.logging_extra import SwagLogger, SwagFormatter, SwagLogFileFormatter
+from selfdrive.swaglog import AsyncUnixDomainSocketHandler, UnixDomainSocketHandler, SwaglogRotatingFileHandler
+
+
+class TestSwaglog(unittest.TestCase):
+
+  def setUp(self):
+    self.addr = f"ipc:///tmp/test_swaglog_{os.getpid()}"
+    self.zctx = zmq.Context()
+    self.sock = self.zctx.socket(zmq.PULL)
+    self.sock.bind(self.addr)
+    self.handlers = []
+
+  def tearDown(self):
+    for handler in self.handlers:
+      if handler.pid is not None:
+        handler.sock.close(linger=0)
+        handler.zctx.term()
+    self.sock.close(linger=0)
+    self.zctx.term()
+
+  def make_logger(self, handler_cls, **kwargs):
+    log = SwagLogger()
+    log.setLevel(logging.DEBUG)
+    handler = handler_cls(SwagFormatter(log), addr=self.addr, **kwargs)
+    log.addHandler(handler)
+    self.handlers.append(handler)
+    return log, handler
+
+  def recv_all(self, n, timeout=5):
+    msgs = []
+    start = time.monotonic()
+    while len(msgs) < n and time.monotonic() - start < timeout:
+      if self.sock.poll(100):
+        for dat in self.sock.recv_multipart():
+          msgs.append((dat[0], json.loads(dat[1:].decode('utf8'))))
+    return msgs
+
+  def test_delivery(self):
+    log, handler = self.make_logger(AsyncUnixDomainSocketHandler)
+    for i in range(1000):
+      with log.ctx(i=i):
+        log.info("msg %d", i)
+    log.error("error")
+    handler.flush()
+
+    msgs = self.recv_all(1001)
+    self.assertEqual(len(msgs), 1001)
+    for i, (level, msg) in enumerate(msgs[:-1]):
+      self.assertEqual(level, logging.INFO)
+      self.assertEqual(msg['msg'], f"msg {i}")
+      # context from the caller's thread, not the sender's
+      self.assertEqual(msg['ctx'], {'i': i})
+    self.assertEqual(msgs[-1][0], logging.ERROR)
+
+  def test_overflow(self):
+    log, handler = self.make_logger(AsyncUnixDomainSocketHandler, max_queue=10, interval=60)
+    for i in range(100):
+      log.info("msg %d", i)
+    self.assertEqual(handler.dropped, 90)
+    handler.flush()
+
+    msgs = self.recv_all(11)
+    self.assertEqual(msgs[0][1]['msg'], {'event': 'swaglog_dropped', 'count': 90})
+    self.assertEqual([m['msg'] for _, m in msgs[1:]], [f"msg {i}" for i in range(10)])
+
+  def test_mutated_after_logging(self):
+    log, handler = self.make_logger(AsyncUnixDomainSocketHandler, interval=60)
+    values = [1, 2, 3]
+    log.event("test_event", values=values)
+    log.info("values %s", values)
+    values.append(4)
+    handler.flush()
+
+    msgs = self.recv_all(2)
+    self.assertEqual(msgs[0][1]['msg']['values'], [1, 2, 3])
+    self.assertEqual(msgs[1][1]['msg'], "values [1, 2, 3]")
+
+  def test_flushed_at_process_exit(self):
+    log, _ = self.make_logger(AsyncUnixDomainSocketHandler, interval=60)
+
+    def child():
+      log.info("last words")
+      # like manager's python processes, which end in os._exit
+    proc = multiprocessing.Process(target=child)
+    proc.start()
+    proc.join()
+    self.assertEqual(proc.exitcode, 0)
+
+    msgs = self.recv_all(1)
+    self.assertEqual([m['msg'] for _, m in msgs], ["last words"])
+
+  def test_dropped_from_threads(self):
+    log, handler = self.make_logger(AsyncUnixDomainSocketHandler, max_queue=10, interval=0.001)
+
+    def spam():
+      for i in range(2000):
+        log.info("msg %d", i)
+    threads = [threading.Thread(target=spam) for _ in range(4)]
+    for t in threads:
+      t.start()
+    for t in threads:
+      t.join()
+    handler.flush()
+
+    # every message is either received or counted as dropped
+    received, dropped = 0, 0
+    for _, msg in self.recv_all(8000, timeout=1):
+      if isinstance(msg['msg'], dict) and msg['msg'].get('event') == 'swaglog_dropped':
+        dropped += msg['msg']['count']
+      else:
+        received += 1
+    self.assertEqual(received + dropped, 8000)
+
+  def test_emit_latency(self):
+    # benchmark only, timing depends on the machine
+    stop = threading.Event()
+
+    # something has to pull the messages for the synchronous handler to keep sending
+    def drain():
+      while not stop.is_set():
+        if self.sock.poll(10):
+          self.sock.recv_multipart()
+    drain_thread = threading.Thread(target=drain)
+    drain_thread.start()
+
+    results = {}
+    for handler_cls in (UnixDomainSocketHandler, AsyncUnixDomainSocketHandler):
+      log, handler = self.make_logger(handler_cls)
+      latencies = []
+      for i in range(20000):
+        t = time.perf_counter()
+        log.event("test_event", i=i, values=list(range(10)), name="controlsd")
+        latencies.append(time.perf_counter() - t)
+      handler.flush()
+
+      latencies.sort()
+      results[handler_cls] = latencies
+      p50, p99, worst = (latencies[int(len(latencies) * q)] * 1e6 for q in (0.5, 0.99, 0.9999))
+      print(f"{handler_cls.__name__}: p50 {p50:.1f} us, p99 {p99:.1f} us, p99.99 {worst:.1f} us")
+
+    stop.set()
+    drain_thread.join()
+
+  def test_compress_rotated(self):
+    tmp = tempfile.mkdtemp()
+    try:
+      base_filename = os.path.join(tmp, "swaglog")
+      handler = SwaglogRotatingFileHandler(base_filename, max_bytes=1024, compress=True)
+      handler.setFormatter(SwagLogFileFormatter(None))
+      for i in range(100):
+        handler.emit(json.dumps({'msg': "x" * 100, 'i': i}))
+      handler.close()
+
+      compressed = sorted(glob.glob(base_filename + ".*.gz"))
+      self.assertGreater(len(compressed), 1)
+      with gzip.open(compressed[0], "rt") as f:
+        self.assertEqual(json.loads(f.readline())['i'], 0)
+
+      # indexes keep going after a restart
+      handler = SwaglogRotatingFileHandler(base_filename, max_bytes=1024, compress=True)
+      self.assertEqual(handler.last_file_idx, len(compressed) + 1)
+      handler.close()
+    finally:
+      shutil.rmtree(tmp)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+import errno
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from selfdrive.hardware.base import ThermalConfig
+from selfdrive.thermald.thermal_zones import ThermalSampler
+
+CONFIG = ThermalConfig(cpu=(["cpu%d-silver-usr" % i for i in range(4)] +
+                            ["cpu%d-gold-usr" % i for i in range(4)], 1000),
+                       gpu=(("gpu0-usr", "gpu1-usr"), 1000),
+                       mem=("ddr-usr", 1000),
+                       bat=(None, 1),
+                       ambient=("xo-therm-adc", 1000),
+                       pmic=(("pm8998_tz", "pm8005_tz"), 1000))
+ZONE_TYPES = [s for group in ('cpu', 'gpu', 'pmic') for s in getattr(CONFIG, group)[0]] + ["ddr-usr", "xo-therm-adc", "unused"]
+
+opens = 0
+counting = False
+
+
+def audit(event, args):
+  global opens
+  if counting and event == "open":
+    opens += 1
+
+
+sys.addaudithook(audit)
+
+
+def read_syscalls():
+  with open("/proc/self/io") as f:
+    return int(next(l for l in f if l.startswith("syscr:")).split()[1])
+
+
+def count_syscalls(f, n):
+  """Opens and read syscalls per call of f"""
+  global opens, counting
+  opens = 0
+  reads = read_syscalls()
+  counting = True
+  for _ in range(n):
+    f()
+  counting = False
+  return opens / n, (read_syscalls() - reads - 1) / n
+
+
+class TestThermalSampler(unittest.TestCase):
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    for i, t in enumerate(ZONE_TYPES):
+      os.mkdir(os.path.join(self.root, f"thermal_zone{i}"))
+      with open(os.path.join(self.root, f"thermal_zone{i}", "type"), "w") as f:
+        f.write(t + "\n")
+      self.write_temp(t, 40000 + i * 100)
+    os.mkdir(os.path.join(self.root, "cooling_device0"))
+    self.tz_by_type = None
+
+  def tearDown(self):
+    shutil.rmtree(self.root)
+
+  def write_temp(self, zone_type, temp):
+    with open(os.path.join(self.root, f"thermal_zone{ZONE_TYPES.index(zone_type)}", "temp"), "w") as f:
+      f.write(f"{temp}\n")
+
+  def legacy_sample(self):
+    # how thermald read them before: zone types listed once, every temp file opened on every read
+    if self.tz_by_type is None:
+      self.tz_by_type = {}
+      for n in os.listdir(self.root):
+        if n.startswith("thermal_zone"):
+          with open(os.path.join(self.root, n, "type")) as f:
+            self.tz_by_type[f.read().strip()] = int(n.lstrip("thermal_zone"))
+
+    def read_tz(x):
+      try:
+        with open(os.path.join(self.root, f"thermal_zone{self.tz_by_type[x]}", "temp")) as f:
+          return int(f.read())
+      except FileNotFoundError:
+        return 0
+
+    return {
+      'cpu': [read_tz(z) / CONFIG.cpu[1] for z in CONFIG.cpu[0]],
+      'gpu': [read_tz(z) / CONFIG.gpu[1] for z in CONFIG.gpu[0]],
+      'mem': [read_tz(CONFIG.mem[0]) / CONFIG.mem[1]],
+      'ambient': [read_tz(CONFIG.ambient[0]) / CONFIG.ambient[1]],
+      'pmic': [read_tz(z) / CONFIG.pmic[1] for z in CONFIG.pmic[0]],
+    }
+
+  def test_sample(self):
+    sampler = ThermalSampler(CONFIG, self.root)
+    temps = sampler.sample()
+    self.assertEqual(temps['cpu'], [40.0 + i * 0.1 for i in range(8)])
+    self.assertEqual(temps['gpu'], [40.8, 40.9])
+    self.assertEqual(temps['pmic'], [41.0, 41.1])
+    self.assertEqual(temps['mem'], [41.2])
+    self.assertEqual(temps['ambient'], [41.3])
+
+    # values are reread through the open fds
+    self.write_temp("ddr-usr", 55000)
+    self.assertEqual(sampler.sample()['mem'], [55.0])
+
+    # missing sensors read as 0 until they show up
+    os.remove(os.path.join(self.root, f"thermal_zone{ZONE_TYPES.index('xo-therm-adc')}", "temp"))
+    # a removed sysfs attribute fails its next pread, which drops the fd like this
+    sampler.reader.forget(sampler.groups['ambient'][0][0])
+    self.assertEqual(sampler.sample()['ambient'], [0.0])
+    self.write_temp("xo-therm-adc", 30000)
+    self.assertEqual(sampler.sample()['ambient'], [30.0])
+    sampler.close()
+
+  def test_zone_removed(self):
+    sampler = ThermalSampler(CONFIG, self.root)
+    self.assertEqual(sampler.sample()['mem'], [41.2])
+
+    # reads through the open fds of a removed zone fail with ENODEV
+    with mock.patch("os.pread", side_effect=OSError(errno.ENODEV, os.strerror(errno.ENODEV))):
+      temps = sampler.sample()
+    self.assertTrue(all(t == 0 for group in temps.values() for t in group))
+    self.assertEqual(sampler.reader.fds, {})
+
+    # and are reopened once it's back
+    self.assertEqual(sampler.sample()['mem'], [41.2])
+    sampler.close()
+
+  def test_unused_sensors(self):
+    sampler = ThermalSampler(ThermalConfig(cpu=((None,), 1), gpu=((None,), 1), mem=(None, 1), bat=(None, 1), ambient=(None, 1), pmic=((None,), 1)), self.root)
+    self.assertEqual(sampler.sample(), {'cpu': [0.0], 'gpu': [0.0], 'mem': [0.0], 'ambient': [0.0], 'pmic': [0.0]})
+
+  def test_syscalls(self):
+    sampler = ThermalSampler(CONFIG, self.root)
+    self.assertEqual(sampler.sample(), self.legacy_sample())
+
+    n = 1000
+    sampler_syscalls = count_syscalls(sampler.sample, n)
+    legacy_syscalls = count_syscalls(self.legacy_sample, n)
+
+    t = time.perf_counter()
+    for _ in range(n):
+      sampler.sample()
+    sampler_time = (time.perf_counter() - t) / n
+    t = time.perf_counter()
+    for _ in range(n):
+      self.legacy_sample()
+    legacy_time = (time.perf_counter() - t) / n
+    sampler.close()
+
+    num_sensors = len(ZONE_TYPES) - 1
+    print(f"\nsampling {num_sensors} zones per thermald cycle")
+    print(f"sampler: {sampler_syscalls[0]:.0f} opens, {sampler_syscalls[1]:.0f} reads, {sampler_time * 1e6:.0f}us")
+    print(f"legacy:  {legacy_syscalls[0]:.0f} opens, {legacy_syscalls[1]:.0f} reads, {legacy_time * 1e6:.0f}us")
+    self.assertEqual(sampler_syscalls[0], 0)
+    self.assertEqual(sampler_syscalls[1], num_sensors)
+    self.assertLess(sampler_time, legacy_time)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,69 @@
+import os
+from typing import Dict, List, Optional
+
+from selfdrive.hardware.base import ThermalConfig
+from selfdrive.hardware.sysfs import SysfsReader
+
+THERMAL_ZONES_PATH = "/sys/devices/virtual/thermal"
+SENSOR_GROUPS = ('cpu', 'gpu', 'mem', 'ambient', 'pmic')
+
+
+class ThermalSampler:
+  """
+  Reads the temperatures of a ThermalConfig. Zone types are resolved once,
+  and each zone's temp file is kept open and reread in place.
+  """
+  def __init__(self, thermal_config: ThermalConfig, root: str = THERMAL_ZONES_PATH):
+    self.root = root
+    self.reader = SysfsReader()
+    self.zone_by_type: Optional[Dict[str, int]] = None
+
+    # group -> (temp file of each sensor, None if unused, scale)
+    self.groups = {}
+    for group in SENSOR_GROUPS:
+      sensors, scale = getattr(thermal_config, group)
+      if not isinstance(sensors, (list, tuple)):
+        sensors = [sensors]
+      self.groups[group] = ([self.temp_path(s) for s in sensors], scale)
+
+  def populate_zone_by_type(self) -> Dict[str, int]:
+    self.zone_by_type = {}
+    for n in os.listdir(self.root):
+      if not n.startswith("thermal_zone"):
+        continue
+      with open(os.path.join(self.root, n, "type")) as f:
+        self.zone_by_type[f.read().strip()] = int(n.lstrip("thermal_zone"))
+    return self.zone_by_type
+
+  def temp_path(self, x) -> Optional[str]:
+    if x is None:
+      return None
+
+    if isinstance(x, str):
+      zone_by_type = self.zone_by_type if self.zone_by_type is not None else self.populate_zone_by_type()
+      x = zone_by_type[x]
+    return os.path.join(self.root, f"thermal_zone{x}", "temp")
+
+  def read_temp(self, path: Optional[str]) -> int:
+    if path is None:
+      return 0
+
+    try:
+      return int(self.reader.read(path))
+    except OSError:
+      # missing, or its zone went away and the read failed with ENODEV
+      return 0
+
+  def sample(self) -> Dict[str, List[float]]:
+    """Scaled temperatures of every group, read in one pass"""
+    raw: Dict[Optional[str], int] = {}
+    temps = {}
+    for group, (paths, scale) in self.groups.items():
+      for path in paths:
+        if path not in raw:
+          raw[path] = self.read_temp(path)
+      temps[group] = [raw[path] / scale for path in paths]
+    return temps
+
+  def close(self) -> None:
+    self.reader.close()
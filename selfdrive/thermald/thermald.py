@@ -23,6 +23,7 @@ from selfdrive.statsd import statlog
 from selfdrive.swaglog import cloudlog
 from selfdrive.thermald.power_monitoring import PowerMonitoring
 from selfdrive.thermald.fan_controller import EonFanController, UnoFanController, TiciFanController
+from selfdrive.thermald.thermal_zones import ThermalSampler
 from selfdrive.version import terms_version, training_version
 
 ThermalStatus = log.DeviceState.ThermalStatus
@@ -50,40 +51,16 @@ OFFROAD_DANGER_TEMP = 79.5 if TICI else 70.0
 
 prev_offroad_states: Dict[str, Tuple[bool, Optional[str]]] = {}
 
-tz_by_type: Optional[Dict[str, int]] = None
-def populate_tz_by_type():
-  global tz_by_type
-  tz_by_type = {}
-  for n in os.listdir("/sys/devices/virtual/thermal"):
-    if not n.startswith("thermal_zone"):
-      continue
-    with open(os.path.join("/sys/devices/virtual/thermal", n, "type")) as f:
-      tz_by_type[f.read().strip()] = int(n.lstrip("thermal_zone"))
-
-def read_tz(x):
-  if x is None:
-    return 0
-
-  if isinstance(x, str):
-    if tz_by_type is None:
-      populate_tz_by_type()
-    x = tz_by_type[x]
-
-  try:
-    with open(f"/sys/devices/virtual/thermal/thermal_zone{x}/temp") as f:
-      return int(f.read())
-  except FileNotFoundError:
-    return 0
-
 prebuiltfile = '/data/openpilot/prebuilt'
 
-def read_thermal(thermal_config):
+def read_thermal(thermal_sampler: ThermalSampler):
+  temps = thermal_sampler.sample()
   dat = messaging.new_message('deviceState')
-  dat.deviceState.cpuTempC = [read_tz(z) / thermal_config.cpu[1] for z in thermal_config.cpu[0]]
-  dat.deviceState.gpuTempC = [read_tz(z) / thermal_config.gpu[1] for z in thermal_config.gpu[0]]
-  dat.deviceState.memoryTempC = read_tz(thermal_config.mem[0]) / thermal_config.mem[1]
-  dat.deviceState.ambientTempC = read_tz(thermal_config.ambient[0]) / thermal_config.ambient[1]
-  dat.deviceState.pmicTempC = [read_tz(z) / thermal_config.pmic[1] for z in thermal_config.pmic[0]]
+  dat.deviceState.cpuTempC = temps['cpu']
+  dat.deviceState.gpuTempC = temps['gpu']
+  dat.deviceState.memoryTempC = temps['mem'][0]
+  dat.deviceState.ambientTempC = temps['ambient'][0]
+  dat.deviceState.pmicTempC = temps['pmic']
   return dat
 
 
@@ -199,7 +176,7 @@ def thermald_thread(end_event, hw_queue):
   power_monitor = PowerMonitoring()
 
   HARDWARE.initialize_hardware()
-  thermal_config = HARDWARE.get_thermal_config()
+  thermal_sampler = ThermalSampler(HARDWARE.get_thermal_config())
 
   fan_controller = None
 
@@ -212,7 +189,7 @@ def thermald_thread(end_event, hw_queue):
     pandaStates = sm['pandaStates']
     peripheralState = sm['peripheralState']
 
-    msg = read_thermal(thermal_config)
+    msg = read_thermal(thermal_sampler)
 
     # neokii
     if sec_since_boot() - restart_triggered_ts < 5.: